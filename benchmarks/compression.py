@@ -0,0 +1,56 @@
+"""
+Bandwidth and latency of response compression on our biggest payloads: a full timeseries page and openapi.yaml.
+
+Usage: python -m benchmarks.compression [--snapshots 100] [--link-mbit 20]
+"""
+import argparse
+import json
+from pathlib import Path
+import statistics
+import time
+
+from vail_scraper.utils.compression import SUPPORTED_ENCODINGS, compress
+
+from .documents import build_timeseries_items
+
+_OPENAPI_PATH = Path(__file__).parent.parent / "vail_scraper" / "routers" / "api" / "v2" / "openapi.yaml"
+
+
+def build_timeseries_body(snapshots: int) -> bytes:
+    return json.dumps({"items": build_timeseries_items(snapshots)}).encode()
+
+
+def _time(function, *args, **kwargs) -> float:
+    timings = []
+    for _ in range(5):
+        started_at = time.perf_counter()
+        function(*args, **kwargs)
+        timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings)
+
+
+def report(name: str, body: bytes, link_bytes_per_second: float, best: bool) -> None:
+    print(f"{name}: {len(body) / 1024:.1f} KiB uncompressed, {len(body) / link_bytes_per_second * 1000:.1f} ms to send")
+    for encoding in SUPPORTED_ENCODINGS:
+        compressed = compress(body, encoding, best=best)
+        duration = _time(compress, body, encoding, best=best)
+        transfer = len(compressed) / link_bytes_per_second
+        print(
+            f"  {encoding:>8}: {len(compressed) / 1024:7.1f} KiB ({len(compressed) / len(body) * 100:4.1f}%),"
+            f" {duration * 1000:6.2f} ms to compress, {(duration + transfer) * 1000:6.1f} ms compress + send"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshots", type=int, default=100)
+    parser.add_argument("--link-mbit", type=float, default=20, help="client bandwidth used for the send times")
+    args = parser.parse_args()
+
+    link_bytes_per_second = args.link_mbit * 1_000_000 / 8
+    report(f"timeseries ({args.snapshots} snapshots, per request levels)", build_timeseries_body(args.snapshots), link_bytes_per_second, best=False)
+    report("openapi.yaml (precompressed once, best levels)", _OPENAPI_PATH.read_bytes(), link_bytes_per_second, best=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Realistic API and AccelByte payloads shared by the benchmarks, the API ones built with the same formatting code the routes use.
+"""
+import base64
+import json
+import random
+import time
+import typing
+
+from vail_scraper.models.accelbyte import AccelByteStatCode
+from vail_scraper.routers.api.v2.stats import format_user_stats
+
+
+def build_timeseries_items(snapshots: int) -> list[dict[str, typing.Any]]:
+    # What /api/v2/users/{user_id}/stats/timeseries returns for a user that has played a bit of everything
+    random.seed(0)
+    user_stats = build_user_stats()
+    items = []
+    timestamp = 1717260094.5
+    for _ in range(snapshots):
+        for stat_code in random.sample(list(user_stats), 10):
+            user_stats[stat_code] += random.randint(1, 20)
+        formatted = format_user_stats(user_stats)
+        formatted["timestamp"] = str(timestamp)
+        items.append(formatted)
+        timestamp += 600
+    return items
+
+
+def build_user_stats(seed: int = 0) -> dict[str, float]:
+    # Every stat code set, like a user that has played a bit of everything
+    generator = random.Random(seed)
+    return {str(stat_code): float(generator.randint(0, 5000)) for stat_code in AccelByteStatCode}
+
+
+def build_stat_items_payload(user_id: str, user_stats: dict[str, float]) -> bytes:
+    # What AccelByte's statitems endpoint returns, including fields we don't read and stat codes we don't know about
+    data = [
+        {
+            "namespace": "vailvr",
+            "userId": user_id,
+            "statCode": stat_code,
+            "statName": stat_code,
+            "value": value,
+            "tags": ["vail"],
+            "createdAt": "2023-06-01T12:00:00.000Z",
+            "updatedAt": "2024-06-01T16:41:34.500Z",
+        }
+        for stat_code, value in user_stats.items()
+    ]
+    data.append({**data[0], "statCode": "weapon-unreleased-kills", "statName": "weapon-unreleased-kills", "value": 0.0})
+    return json.dumps({"data": data, "paging": {}}).encode()
+
+
+def build_leaderboard_page_payload(offset: int, page_size: int) -> bytes:
+    # What AccelByte's leaderboard endpoint returns, highest points first
+    data = [
+        {"userId": f"{index:032x}", "point": max(1_000_000 - index * 7, 0), "hidden": False}
+        for index in range(offset, offset + page_size)
+    ]
+    return json.dumps({"data": data, "paging": {}}).encode()
+
+
+def build_access_token(expires_in: float) -> str:
+    # Shaped like an AccelByte access token, the signature isn't checked
+    def encode(data: dict[str, typing.Any]) -> str:
+        return base64.b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+    header = {"alg": "RS256", "kid": "0" * 40, "typ": "JWT"}
+    body = {
+        "bans": None,
+        "client_id": "0" * 32,
+        "country": "",
+        "display_name": "",
+        "exp": int(time.time() + expires_in),
+        "iat": int(time.time()),
+        "jflgs": 0,
+        "namespace": "vailvr",
+        "permissions": [],
+        "roles": ["0" * 32],
+        "scope": "account commerce social publishing analytics",
+    }
+    return f"{encode(header)}.{encode(body)}.{'0' * 342}"
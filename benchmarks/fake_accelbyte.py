@@ -0,0 +1,207 @@
+"""
+Local stand-in for the parts of AccelByte the scraper uses: the OAuth login, the leaderboard, statitems and IAM users.
+Serves synthetic players whose scores keep changing, with configurable latency, errors and 429s.
+Point [accelbyte] base_url at it to scrape without touching production.
+
+Usage: python -m benchmarks.fake_accelbyte [--port 8081] [--players 10000] [--latency 0.05] [--error-rate 0.01] [--rate-limit-rate 0.01]
+"""
+import argparse
+import asyncio
+from collections import Counter
+import json
+import random
+import typing
+from uuid import uuid4
+
+from aiohttp import web
+
+from vail_scraper.errors import AccelByteErrorCode
+from vail_scraper.models.accelbyte import AccelByteStatCode
+
+from .documents import build_access_token, build_stat_items_payload, build_user_stats
+from .fake_backends import serve
+
+# Players share one of this many stat sets, with their own score on top
+_STAT_TEMPLATES: typing.Final[int] = 16
+_PLAYER_NOT_FOUND_BODY: typing.Final[str] = json.dumps(
+    {"errorCode": AccelByteErrorCode.PLATFORM_USER_NOT_FOUND, "errorMessage": "user not found"}
+)
+_UNAUTHORIZED_BODY: typing.Final[str] = json.dumps({"errorCode": 20001, "errorMessage": "unauthorized access"})
+_RATE_LIMITED_BODY: typing.Final[str] = json.dumps({"errorCode": 20007, "errorMessage": "too many requests"})
+_INTERNAL_ERROR_BODY: typing.Final[str] = json.dumps({"errorCode": 20000, "errorMessage": "internal server error"})
+
+
+class FakeAccelByte:
+    def __init__(
+        self,
+        players: int,
+        *,
+        latency: float = 0.05,
+        latency_jitter: float = 0.02,
+        error_rate: float = 0,
+        rate_limit_rate: float = 0,
+        churn: float = 0.01,
+        token_lifetime: float = 3600,
+        seed: int = 0,
+    ) -> None:
+        self.latency: float = latency
+        self.latency_jitter: float = latency_jitter
+        # Chance of answering a data request with a 500 or a 429 instead
+        self.error_rate: float = error_rate
+        self.rate_limit_rate: float = rate_limit_rate
+        # Share of players that played a game since the last leaderboard pass
+        self.churn: float = churn
+        self.token_lifetime: float = token_lifetime
+        self._random: random.Random = random.Random(seed)
+
+        self._templates: list[dict[str, float]] = [build_user_stats(seed) for seed in range(_STAT_TEMPLATES)]
+        self._player_ids: list[str] = [f"{self._random.getrandbits(128):032x}" for _ in range(players)]
+        # Player id -> index into _player_ids, which picks the name and stat template
+        self._player_indexes: dict[str, int] = {player_id: index for index, player_id in enumerate(self._player_ids)}
+        self._scores: dict[str, int] = {player_id: self._random.randint(0, 1_000_000) for player_id in self._player_ids}
+        self._leaderboard: list[str] = sorted(self._player_ids, key=self._scores.__getitem__, reverse=True)
+
+        # Stats
+        self.requests: Counter[str] = Counter()
+        self.errors_served: int = 0
+        self.rate_limits_served: int = 0
+        self.leaderboard_passes: int = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/iam/v3/oauth/authorize", self._authorize)
+        app.router.add_post("/iam/v3/authenticate", self._authenticate)
+        app.router.add_post("/iam/v3/oauth/token", self._token)
+        app.router.add_get("/leaderboard/v3/public/namespaces/vailvr/leaderboards/{stat_code}/alltime", self._leaderboard_page)
+        app.router.add_get("/social/v1/public/namespaces/vailvr/users/{user_id}/statitems", self._stat_items)
+        app.router.add_get("/iam/v3/public/namespaces/vailvr/users/{user_id}", self._player_info)
+        app.router.add_get("/_fake/stats", self._stats)
+        return app
+
+    def get_stats(self) -> dict[str, typing.Any]:
+        return {
+            "players": len(self._player_ids),
+            "requests": dict(self.requests),
+            "errors_served": self.errors_served,
+            "rate_limits_served": self.rate_limits_served,
+            "leaderboard_passes": self.leaderboard_passes,
+        }
+
+    async def _respond_like_upstream(self, endpoint: str, request: web.Request, can_fail: bool) -> web.Response | None:
+        # Counts the request and waits like a request to AccelByte would. Returns the error to send instead, if any
+        self.requests[endpoint] += 1
+        await asyncio.sleep(max(self._random.gauss(self.latency, self.latency_jitter), 0))
+
+        if not can_fail:
+            return None
+        if "Authorization" not in request.headers:
+            return web.Response(status=401, text=_UNAUTHORIZED_BODY, content_type="application/json")
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            self.rate_limits_served += 1
+            return web.Response(status=429, text=_RATE_LIMITED_BODY, content_type="application/json")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.errors_served += 1
+            return web.Response(status=500, text=_INTERNAL_ERROR_BODY, content_type="application/json")
+        return None
+
+    async def _authorize(self, request: web.Request) -> web.StreamResponse:
+        await self._respond_like_upstream("oauth", request, False)
+        raise web.HTTPFound(f"/auth/?request_id={uuid4().hex}")
+
+    async def _authenticate(self, request: web.Request) -> web.StreamResponse:
+        await self._respond_like_upstream("oauth", request, False)
+        raise web.HTTPFound(f"/?code={uuid4().hex}")
+
+    async def _token(self, request: web.Request) -> web.StreamResponse:
+        await self._respond_like_upstream("oauth", request, False)
+        return web.json_response(
+            {
+                "access_token": build_access_token(self.token_lifetime),
+                "refresh_token": build_access_token(self.token_lifetime * 24),
+                "expires_in": int(self.token_lifetime),
+                "token_type": "Bearer",
+            }
+        )
+
+    def _play_games(self) -> None:
+        for player_id in self._random.sample(self._player_ids, int(len(self._player_ids) * self.churn)):
+            self._scores[player_id] += self._random.randint(100, 5000)
+        self._leaderboard.sort(key=self._scores.__getitem__, reverse=True)
+
+    async def _leaderboard_page(self, request: web.Request) -> web.StreamResponse:
+        if error := await self._respond_like_upstream("leaderboard", request, True):
+            return error
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query.get("limit", 100))
+        if offset == 0:
+            self.leaderboard_passes += 1
+            self._play_games()
+
+        data = [
+            {"userId": player_id, "point": self._scores[player_id], "hidden": False}
+            for player_id in self._leaderboard[offset : offset + limit]
+        ]
+        return web.json_response({"data": data, "paging": {}})
+
+    async def _stat_items(self, request: web.Request) -> web.StreamResponse:
+        if error := await self._respond_like_upstream("statitems", request, True):
+            return error
+        user_id = request.match_info["user_id"]
+        index = self._player_indexes.get(user_id)
+        if index is None:
+            return web.Response(status=404, text=_PLAYER_NOT_FOUND_BODY, content_type="application/json")
+
+        user_stats = {**self._templates[index % _STAT_TEMPLATES], AccelByteStatCode.SCORE: float(self._scores[user_id])}
+        return web.Response(body=build_stat_items_payload(user_id, user_stats), content_type="application/json")
+
+    async def _player_info(self, request: web.Request) -> web.StreamResponse:
+        if error := await self._respond_like_upstream("users", request, True):
+            return error
+        user_id = request.match_info["user_id"]
+        index = self._player_indexes.get(user_id)
+        if index is None:
+            return web.Response(status=404, text=_PLAYER_NOT_FOUND_BODY, content_type="application/json")
+        return web.json_response({"userId": user_id, "displayName": f"player{index}", "namespace": "vailvr"})
+
+    async def _stats(self, request: web.Request) -> web.StreamResponse:
+        return web.json_response(self.get_stats())
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--players", type=int, default=10_000)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean seconds per request")
+    parser.add_argument("--latency-jitter", type=float, default=0.02, help="standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of data requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0, help="share of data requests answered with a 429")
+    parser.add_argument("--churn", type=float, default=0.01, help="share of players whose score changes every leaderboard pass")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def from_arguments(args: argparse.Namespace) -> FakeAccelByte:
+    return FakeAccelByte(
+        args.players,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        churn=args.churn,
+        seed=args.seed,
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081, help="0 picks a free port")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    _, url = await serve(from_arguments(args).build_app(), args.host, args.port)
+    # First line of output, read by benchmarks.scraper_throughput to find the port
+    print(f"listening on {url}", flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
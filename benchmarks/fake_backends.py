@@ -0,0 +1,82 @@
+"""
+In-process stand-ins for the QuestDB HTTP ingest and the Meilisearch endpoints we use.
+They accept everything and only count it, so harnesses can run the scraper and API without the real services.
+"""
+import gzip
+import typing
+
+from aiohttp import web
+
+
+class FakeQuestDB:
+    def __init__(self) -> None:
+        # Stats
+        self.ingests: int = 0
+        # Table name -> rows ingested
+        self.rows: dict[str, int] = {}
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/imp", self._import)
+        return app
+
+    async def _import(self, request: web.Request) -> web.StreamResponse:
+        table_name = request.query["name"]
+        rows = 0
+        async for part in await request.multipart():
+            if getattr(part, "name", None) == "data":
+                # Minus the header
+                rows += (await part.read()).count(b"\n") - 1  # type: ignore[union-attr]
+
+        self.ingests += 1
+        self.rows[table_name] = self.rows.get(table_name, 0) + rows
+        return web.json_response({"status": "OK", "location": table_name, "rowsImported": rows, "rowsRejected": 0})
+
+
+class FakeMeiliSearch:
+    def __init__(self) -> None:
+        # Task uid -> documents in it, every task has succeeded by the time it is asked about
+        self._tasks: dict[int, int] = {}
+
+        # Stats
+        self.documents: int = 0
+        self.searches: int = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/indexes/{index}/documents", self._add_documents)
+        app.router.add_get("/tasks/{task_uid}", self._get_task)
+        app.router.add_post("/indexes/{index}/search", self._search)
+        return app
+
+    async def _add_documents(self, request: web.Request) -> web.StreamResponse:
+        body = await request.read()
+        if body[:2] == b"\x1f\x8b":
+            body = gzip.decompress(body)
+        documents = body.count(b"\n")
+
+        task_uid = len(self._tasks)
+        self._tasks[task_uid] = documents
+        self.documents += documents
+        return web.json_response({"taskUid": task_uid, "indexUid": request.match_info["index"], "status": "enqueued"}, status=202)
+
+    async def _get_task(self, request: web.Request) -> web.StreamResponse:
+        task_uid = int(request.match_info["task_uid"])
+        documents = self._tasks.get(task_uid)
+        if documents is None:
+            return web.json_response({"message": f"Task `{task_uid}` not found.", "code": "task_not_found"}, status=404)
+        return web.json_response({"uid": task_uid, "status": "succeeded", "details": {"receivedDocuments": documents, "indexedDocuments": documents}})
+
+    async def _search(self, request: web.Request) -> web.StreamResponse:
+        self.searches += 1
+        query: dict[str, typing.Any] = await request.json()
+        return web.json_response({"hits": [], "query": query.get("q", ""), "estimatedTotalHits": 0, "processingTimeMs": 0})
+
+
+async def serve(app: web.Application, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+    # Returns the runner to clean up and the url it is listening on
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
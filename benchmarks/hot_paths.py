@@ -0,0 +1,260 @@
+"""
+Micro-benchmarks for the code every scraped user and API request goes through.
+Results can be saved as JSON and compared against a previous run to catch regressions between releases.
+
+Usage: python -m benchmarks.hot_paths [--filter name] [--json results.json] [--compare baseline.json] [--max-regression 0.2]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import inspect
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import typing
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+import pydantic
+
+from vail_scraper import app_keys
+from vail_scraper.client.base import get_token_expiry_in_seconds
+from vail_scraper.database.quest import build_ingest_csv
+from vail_scraper.models.accelbyte import AccelByteLeaderboardPage, AccelBytePlayerInfo, AccelBytePlayerStatItemsPage
+from vail_scraper.routers.api.v2.stats import format_user_stats
+from vail_scraper.utils import json_response as json_response_module
+from vail_scraper.utils.rate_limit import rate_limit_http
+from vail_scraper.utils.rate_limit_store import RateLimitStore
+from vail_scraper.utils.rw_lock import ReadWriteLock
+from vail_scraper.utils.unique_queue import UniqueQueue
+
+from .documents import build_access_token, build_leaderboard_page_payload, build_stat_items_payload, build_user_stats
+
+# Bump when the layout of the JSON results changes
+RESULTS_FORMAT_VERSION: typing.Final[int] = 1
+
+
+class Benchmark(typing.NamedTuple):
+    name: str
+    # Sync or async, does this many operations per call
+    function: typing.Callable[[], typing.Any]
+    operations: int = 1
+
+
+class Result(typing.NamedTuple):
+    name: str
+    median_ns: float
+    min_ns: float
+    stdev_ns: float
+    loops: int
+    samples: int
+
+
+def _rate_limited_handler(rate_limit_store: RateLimitStore) -> typing.Callable[[], typing.Awaitable[web.StreamResponse]]:
+    app = web.Application()
+    app[app_keys.RATE_LIMIT_STORE] = rate_limit_store
+    request = make_mocked_request("GET", "/api/v2/users/0/stats", app=app).clone(remote="203.0.113.1")
+    response = web.Response()
+
+    @rate_limit_http(cost=1)
+    async def handler(request: web.Request) -> web.StreamResponse:
+        return response
+
+    return lambda: handler(request)
+
+
+def _unique_queue_add_duplicate() -> typing.Callable[[], None]:
+    # Users already waiting for an update are seen again on every leaderboard they're on
+    queue: UniqueQueue[str] = UniqueQueue()
+    queue.add("0" * 32)
+    return lambda: queue.add("0" * 32)
+
+
+def _unique_queue_cycle(items: int) -> typing.Callable[[], typing.Awaitable[None]]:
+    # What the scraper does with it: the leaderboard pass adds users, the update workers take them out again
+    user_ids = [f"{index:032x}" for index in range(items)]
+
+    async def cycle() -> None:
+        queue: UniqueQueue[str] = UniqueQueue()
+        for user_id in user_ids:
+            queue.add(user_id)
+        for _ in range(items):
+            await queue.get_item()
+
+    return cycle
+
+
+def _read_write_lock_cycle(exclusive: bool) -> typing.Callable[[], typing.Awaitable[None]]:
+    lock = ReadWriteLock()
+    acquire = lock.exclusive if exclusive else lock.shared
+
+    async def cycle() -> None:
+        async with acquire("benchmark"):
+            pass
+
+    return cycle
+
+
+def _read_write_lock_contended(readers: int) -> typing.Callable[[], typing.Awaitable[None]]:
+    # Readers arriving while a writer holds the lock, so every one of them has to queue. Includes creating the tasks
+    lock = ReadWriteLock()
+
+    async def hold(exclusive: bool) -> None:
+        async with (lock.exclusive if exclusive else lock.shared)("benchmark"):
+            await asyncio.sleep(0)
+
+    async def cycle() -> None:
+        await asyncio.gather(hold(True), *(hold(False) for _ in range(readers)), hold(True))
+
+    return cycle
+
+
+def build_benchmarks() -> list[Benchmark]:
+    user_stats = build_user_stats()
+    stat_items_payload = build_stat_items_payload("0" * 32, user_stats).decode()
+    leaderboard_page_payload = build_leaderboard_page_payload(0, 100).decode()
+    player_info_payload = json.dumps({"displayName": "benchmark", "userId": "0" * 32, "namespace": "vailvr"})
+    ingest_records = [
+        {"code": stat_code, "value": value, "user_id": "0" * 32, "timestamp": "2024-06-01T16:41:34.500000Z"}
+        for stat_code, value in user_stats.items()
+    ]
+    token = build_access_token(3600)
+
+    return [
+        Benchmark("format_user_stats", lambda: format_user_stats(user_stats)),
+        Benchmark("accelbyte.parse_stat_items_page", lambda: AccelBytePlayerStatItemsPage.model_validate_json(stat_items_payload)),
+        Benchmark("accelbyte.parse_leaderboard_page[100]", lambda: AccelByteLeaderboardPage.model_validate_json(leaderboard_page_payload)),
+        Benchmark("accelbyte.parse_player_info", lambda: AccelBytePlayerInfo.model_validate_json(player_info_payload)),
+        Benchmark("unique_queue.add_duplicate", _unique_queue_add_duplicate()),
+        Benchmark("unique_queue.add_get_item[per item]", _unique_queue_cycle(1000), 1000),
+        Benchmark(f"quest_db.build_ingest_csv[{len(ingest_records)} records]", lambda: build_ingest_csv(ingest_records)),
+        Benchmark("get_token_expiry_in_seconds", lambda: get_token_expiry_in_seconds(token)),
+        Benchmark("rate_limit_http.allowed", _rate_limited_handler(RateLimitStore(math.inf, 1, 100_000))),
+        Benchmark("rate_limit_http.limited", _rate_limited_handler(RateLimitStore(0, 1, 100_000))),
+        Benchmark("read_write_lock.shared", _read_write_lock_cycle(False)),
+        Benchmark("read_write_lock.exclusive", _read_write_lock_cycle(True)),
+        Benchmark("read_write_lock.contended[per acquire]", _read_write_lock_contended(8), 10),
+    ]
+
+
+async def _time_loops(function: typing.Callable[[], typing.Any], is_async: bool, loops: int) -> float:
+    started_at = time.perf_counter()
+    if is_async:
+        for _ in range(loops):
+            await function()
+    else:
+        for _ in range(loops):
+            function()
+    return time.perf_counter() - started_at
+
+
+async def run_benchmark(benchmark: Benchmark, samples: int, min_sample_time: float) -> Result:
+    first = benchmark.function()
+    is_async = inspect.isawaitable(first)
+    if is_async:
+        await first
+
+    # Doubles the loops until a sample takes long enough for the timer to not matter, which also warms up caches
+    loops = 1
+    while await _time_loops(benchmark.function, is_async, loops) < min_sample_time:
+        loops *= 2
+
+    timings = [
+        await _time_loops(benchmark.function, is_async, loops) / loops / benchmark.operations * 1e9 for _ in range(samples)
+    ]
+    return Result(
+        benchmark.name,
+        statistics.median(timings),
+        min(timings),
+        statistics.stdev(timings) if samples > 1 else 0,
+        loops,
+        samples,
+    )
+
+
+def _get_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format_duration(nanoseconds: float) -> str:
+    if nanoseconds >= 1_000_000:
+        return f"{nanoseconds / 1_000_000:.2f} ms"
+    if nanoseconds >= 1_000:
+        return f"{nanoseconds / 1_000:.2f} µs"
+    return f"{nanoseconds:.0f} ns"
+
+
+def compare(results: list[Result], baseline: dict[str, typing.Any], max_regression: float) -> list[str]:
+    # Returns the names of the benchmarks that got slower than allowed
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    print(f"\ncompared to {baseline['environment'].get('commit') or 'baseline'} (max regression {max_regression:.0%})")
+    for result in results:
+        baseline_result = baseline_results.get(result.name)
+        if baseline_result is None:
+            print(f"  {result.name:<42} new")
+            continue
+
+        ratio = result.median_ns / baseline_result["median_ns"]
+        regressed = ratio > 1 + max_regression
+        if regressed:
+            regressions.append(result.name)
+        print(f"  {result.name:<42} {ratio:6.2f}x{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filter", help="only run benchmarks with this in their name")
+    parser.add_argument("--samples", type=int, default=15)
+    parser.add_argument("--min-sample-time", type=float, default=0.05, help="seconds")
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--compare", help="results of a previous run, exits with 1 if anything got slower than allowed")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="how much slower a benchmark may get, 0.2 is 20%%")
+    args = parser.parse_args()
+
+    benchmarks = [benchmark for benchmark in build_benchmarks() if args.filter is None or args.filter in benchmark.name]
+    results = []
+    for benchmark in benchmarks:
+        result = await run_benchmark(benchmark, args.samples, args.min_sample_time)
+        results.append(result)
+        print(
+            f"{result.name:<42} {_format_duration(result.median_ns):>10} median"
+            f" {_format_duration(result.min_ns):>10} min  ±{result.stdev_ns / result.median_ns:5.1%}"
+        )
+
+    if args.json is not None:
+        output = {
+            "version": RESULTS_FORMAT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "environment": {
+                "commit": _get_commit(),
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "pydantic": pydantic.VERSION,
+                "orjson": json_response_module.orjson is not None,
+            },
+            "results": [result._asdict() for result in results],
+        }
+        with open(args.json, "w") as file:
+            json.dump(output, file, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("version") != RESULTS_FORMAT_VERSION:
+            sys.exit(f"{args.compare} is in results format {baseline.get('version')}, expected {RESULTS_FORMAT_VERSION}")
+        if len(compare(results, baseline, args.max_regression)) != 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""
+Time to turn real stats documents into a response: aiohttp's stdlib json_response vs our json_response and EncodedJSON.
+
+Usage: python -m benchmarks.json_encoding [--snapshots 100] [--batch-size 50]
+"""
+import argparse
+import statistics
+import time
+import typing
+
+from aiohttp import web
+
+from vail_scraper.utils import json_response as json_response_module
+from vail_scraper.utils.json_response import EncodedJSON, json_response
+
+from .documents import build_timeseries_items
+
+
+def _time(function: typing.Callable[[], typing.Any], repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings)
+
+
+def report(name: str, payload: typing.Any, repeats: int) -> None:
+    encoded = EncodedJSON(payload)
+    print(f"{name} ({len(encoded.body) / 1024:.1f} KiB)")
+
+    baseline = _time(lambda: web.json_response(payload), repeats)
+    candidates = [
+        ("web.json_response (stdlib)", baseline),
+        (f"json_response ({'orjson' if json_response_module.orjson is not None else 'stdlib fallback'})", _time(lambda: json_response(payload), repeats)),
+        ("EncodedJSON.to_response (cached)", _time(encoded.to_response, repeats)),
+    ]
+    for candidate_name, duration in candidates:
+        print(f"  {candidate_name:>36}: {duration * 1e6:9.1f} µs  {baseline / duration:6.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshots", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    items = build_timeseries_items(args.snapshots)
+    report("/users/{id}/stats", {key: value for key, value in items[-1].items() if key != "timestamp"}, args.repeats)
+    report(
+        f"/users/stats:batch ({args.batch_size} users)",
+        {"items": [{"id": str(index), "stats": item, "updated_at": 1717260094.5, "stale": False} for index, item in enumerate(items[: args.batch_size])], "missing": []},
+        args.repeats,
+    )
+    report(f"/users/{{id}}/stats/timeseries ({args.snapshots} snapshots)", {"items": items}, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Memory and speed of the API rate limit store under IP churn: every request comes from a new IP.
+
+Usage: python -m benchmarks.rate_limit_store [--keys 1000000] [--max-keys 100000] [--baseline-keys 100000]
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+import time
+import tracemalloc
+
+from slowstack.asynchronous.times_per import TimesPerRateLimiter
+
+from vail_scraper.utils.rate_limit_store import RateLimitStore
+
+
+def _ip(index: int) -> str:
+    return f"{index >> 24 & 255}.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+
+
+def bench_store(keys: int, max_keys: int) -> None:
+    ips = [_ip(index) for index in range(keys)]
+
+    store = RateLimitStore(60, 1, max_keys)
+    started_at = time.perf_counter()
+    for ip in ips:
+        store.acquire(ip, 10)
+    duration = time.perf_counter() - started_at
+    print(f"  {duration / keys * 1e9:.0f} ns per acquire")
+
+    store = RateLimitStore(60, 1, max_keys)
+    tracemalloc.start()
+    for index in range(keys):
+        store.acquire(_ip(index), 10)
+        if index + 1 in (keys // 4, keys // 2, keys * 3 // 4, keys):
+            current, _ = tracemalloc.get_traced_memory()
+            print(f"  {index + 1:>9} keys seen: {len(store):>7} stored, {current / 1024 / 1024:8.1f} MiB")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"  peak {peak / 1024 / 1024:.1f} MiB, {store.early_evictions} clients evicted while still limited")
+
+
+async def bench_baseline(keys: int) -> None:
+    # What rate_limit_http used to do: a TimesPerRateLimiter per IP per route that is never dropped
+    rate_limiters: defaultdict[str, TimesPerRateLimiter] = defaultdict(lambda: TimesPerRateLimiter(6, 60))
+
+    tracemalloc.start()
+    for index in range(keys):
+        async with rate_limiters[_ip(index)].acquire(wait=False):
+            pass
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"  {keys:>9} keys seen: {len(rate_limiters):>7} stored, {current / 1024 / 1024:8.1f} MiB, ~{current / keys:.0f} bytes per IP and growing")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--max-keys", type=int, default=100_000)
+    parser.add_argument("--baseline-keys", type=int, default=100_000, help="0 to skip, the old store needs a lot of memory")
+    args = parser.parse_args()
+
+    print(f"RateLimitStore (max_keys={args.max_keys})")
+    bench_store(args.keys, args.max_keys)
+
+    if args.baseline_keys != 0:
+        print("defaultdict of TimesPerRateLimiter")
+        asyncio.run(bench_baseline(args.baseline_keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Serves AccelByte traffic recorded with [accelbyte] record_path back to the scraper, so performance runs use the real
+mix of payload shapes, unknown stat codes and error responses, and are repeatable.
+
+Requests are answered with the recorded responses to the same method and url, in recorded order, starting over when
+they run out. Requests that were never recorded get the next recorded response of the same endpoint, with user ids
+and stat codes ignored, and a 404 if there is none. Each response waits for its recorded latency divided by --speed,
+--speed inf answers immediately. The login isn't recorded, it is answered with fresh tokens.
+Point [accelbyte] base_url at it, or run benchmarks.scraper_throughput with --replay.
+
+Usage: python -m benchmarks.replay_accelbyte accelbyte.jsonl.gz [--port 8081] [--speed 1]
+"""
+import argparse
+import asyncio
+from collections import Counter
+import json
+import re
+import sys
+import typing
+from uuid import uuid4
+
+from aiohttp import web
+
+from vail_scraper.client.recording import Exchange, read_recording
+
+from .documents import build_access_token
+from .fake_backends import serve
+
+_USER_ID: typing.Final[re.Pattern[str]] = re.compile(r"[0-9a-f]{32}")
+_LEADERBOARD_STAT_CODE: typing.Final[re.Pattern[str]] = re.compile(r"/leaderboards/[^/]+")
+_NOT_RECORDED_BODY: typing.Final[str] = json.dumps({"errorCode": 20008, "errorMessage": "not in the recording"})
+
+
+def endpoint_of(method: str, url: str) -> str:
+    # What a request is matched on when its exact url wasn't recorded
+    path = url.partition("?")[0]
+    path = _LEADERBOARD_STAT_CODE.sub("/leaderboards/{stat_code}", _USER_ID.sub("{user_id}", path))
+    return f"{method} {path}"
+
+
+class ReplayAccelByte:
+    def __init__(self, exchanges: list[Exchange], *, speed: float = 1, token_lifetime: float = 3600) -> None:
+        self.speed: float = speed
+        self.token_lifetime: float = token_lifetime
+
+        # Method and url -> recorded responses, and how many of them were served
+        self._by_url: dict[str, list[Exchange]] = {}
+        self._by_endpoint: dict[str, list[Exchange]] = {}
+        for exchange in exchanges:
+            self._by_url.setdefault(f"{exchange.method} {exchange.url}", []).append(exchange)
+            self._by_endpoint.setdefault(endpoint_of(exchange.method, exchange.url), []).append(exchange)
+        self._served: Counter[str] = Counter()
+        self._players: int = len({user_id for exchange in exchanges for user_id in _USER_ID.findall(exchange.url)})
+
+        # Stats
+        self.requests: Counter[str] = Counter()
+        self.exact_matches: int = 0
+        self.endpoint_matches: int = 0
+        self.misses: int = 0
+        self.errors_served: int = 0
+        self.rate_limits_served: int = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/iam/v3/oauth/authorize", self._authorize)
+        app.router.add_post("/iam/v3/authenticate", self._authenticate)
+        app.router.add_post("/iam/v3/oauth/token", self._token)
+        app.router.add_get("/_fake/stats", self._stats)
+        app.router.add_route("*", "/{path:.*}", self._replay)
+        return app
+
+    def get_stats(self) -> dict[str, typing.Any]:
+        # Same shape as FakeAccelByte.get_stats, plus how well the requests matched the recording
+        return {
+            "players": self._players,
+            "requests": dict(self.requests),
+            "errors_served": self.errors_served,
+            "rate_limits_served": self.rate_limits_served,
+            "exact_matches": self.exact_matches,
+            "endpoint_matches": self.endpoint_matches,
+            "misses": self.misses,
+        }
+
+    async def _authorize(self, request: web.Request) -> web.StreamResponse:
+        self.requests["oauth"] += 1
+        raise web.HTTPFound(f"/auth/?request_id={uuid4().hex}")
+
+    async def _authenticate(self, request: web.Request) -> web.StreamResponse:
+        self.requests["oauth"] += 1
+        raise web.HTTPFound(f"/?code={uuid4().hex}")
+
+    async def _token(self, request: web.Request) -> web.StreamResponse:
+        self.requests["oauth"] += 1
+        return web.json_response(
+            {
+                "access_token": build_access_token(self.token_lifetime),
+                "refresh_token": build_access_token(self.token_lifetime * 24),
+                "expires_in": int(self.token_lifetime),
+                "token_type": "Bearer",
+            }
+        )
+
+    def _next_exchange(self, key: str, exchanges: list[Exchange]) -> Exchange:
+        exchange = exchanges[self._served[key] % len(exchanges)]
+        self._served[key] += 1
+        return exchange
+
+    async def _replay(self, request: web.Request) -> web.StreamResponse:
+        url = request.rel_url.path_qs
+        endpoint = endpoint_of(request.method, url)
+        self.requests[endpoint] += 1
+
+        key = f"{request.method} {url}"
+        if (exchanges := self._by_url.get(key)) is not None:
+            self.exact_matches += 1
+        elif (exchanges := self._by_endpoint.get(endpoint)) is not None:
+            self.endpoint_matches += 1
+            key = endpoint
+        else:
+            self.misses += 1
+            return web.Response(status=404, text=_NOT_RECORDED_BODY, content_type="application/json")
+
+        exchange = self._next_exchange(key, exchanges)
+        await asyncio.sleep(exchange.latency / self.speed)
+        if exchange.status == 429:
+            self.rate_limits_served += 1
+        elif exchange.status >= 500:
+            self.errors_served += 1
+        return web.Response(status=exchange.status, text=exchange.body, content_type=exchange.content_type or None)
+
+    async def _stats(self, request: web.Request) -> web.StreamResponse:
+        return web.json_response(self.get_stats())
+
+
+def summarize(exchanges: list[Exchange]) -> str:
+    endpoints = Counter(endpoint_of(exchange.method, exchange.url) for exchange in exchanges)
+    statuses = Counter(exchange.status for exchange in exchanges)
+    duration = exchanges[-1].offset if len(exchanges) != 0 else 0
+    lines = [f"{len(exchanges)} exchanges over {duration:.0f}s"]
+    lines += [f"  {endpoint}: {count}" for endpoint, count in endpoints.most_common()]
+    lines.append("  statuses: " + ", ".join(f"{status} {count}" for status, count in sorted(statuses.items())))
+    return "\n".join(lines)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording", help="written by AccelByteClient with [accelbyte] record_path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081, help="0 picks a free port")
+    parser.add_argument("--speed", type=float, default=1, help="divides the recorded latencies, inf for none")
+    parser.add_argument("--summary", action="store_true", help="describe the recording and exit")
+    args = parser.parse_args()
+
+    exchanges = list(read_recording(args.recording))
+    if args.summary:
+        print(summarize(exchanges))
+        return
+    if len(exchanges) == 0:
+        sys.exit(f"{args.recording} has nothing recorded in it")
+
+    _, url = await serve(ReplayAccelByte(exchanges, speed=args.speed).build_app(), args.host, args.port)
+    # First line of output, read by benchmarks.scraper_throughput to find the port
+    print(f"listening on {url}", flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,228 @@
+"""
+End-to-end scraper throughput: runs VailScraper against benchmarks.fake_accelbyte, with a temporary SQLite database
+and the in-process QuestDB and Meilisearch stand-ins from benchmarks.fake_backends.
+Reports users updated per minute, leaderboard pass duration and upstream requests per updated user.
+
+The fake AccelByte runs in its own process, so building its responses doesn't take time from the scraper.
+The scraper's own rate limiter is set with --rate-limit-times/--rate-limit-per, production runs with 2 per 3 seconds.
+With --replay the scraper runs against recorded AccelByte traffic from benchmarks.replay_accelbyte instead, and
+--record writes what the scraper got to replay later.
+
+Usage: python -m benchmarks.scraper_throughput [--duration 120] [--players 10000] [--latency 0.05] [--error-rate 0.01]
+    [--rate-limit-rate 0.01] [--rate-limit-times 100] [--rate-limit-per 1] [--json results.json]
+    [--record accelbyte.jsonl.gz | --replay accelbyte.jsonl.gz [--replay-speed 1]]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import typing
+
+from aiohttp import ClientSession
+import aiosqlite
+
+from vail_scraper.client.accelbyte import AccelByteClient
+from vail_scraper.client.epic_games import EpicGamesClient
+from vail_scraper.config import ScraperConfig
+from vail_scraper.database.meilisearch import MeiliSearch
+from vail_scraper.database.migration_manager import do_migrations
+from vail_scraper.database.name_index import UserNameIndex
+from vail_scraper.database.quest import QuestDBWrapper
+from vail_scraper.database.rank_index import StatRankIndex
+from vail_scraper.database.sqlite_connection import QUERY_BUCKETS, connect as connect_sqlite
+from vail_scraper.scraper import VailScraper
+from vail_scraper.utils.histogram import Histogram
+from vail_scraper.utils.lru_cache import LRUCache
+from vail_scraper.utils.rw_lock import ReadWriteLock
+
+from . import fake_accelbyte
+from .fake_backends import FakeMeiliSearch, FakeQuestDB, serve
+
+# Seconds between progress lines
+_PROGRESS_INTERVAL: typing.Final[float] = 10
+
+
+async def start_fake_accelbyte(args: argparse.Namespace) -> tuple[asyncio.subprocess.Process, str]:
+    # Returns the process and the url it is listening on
+    if args.replay is not None:
+        module = "benchmarks.replay_accelbyte"
+        forwarded = [args.replay, "--speed", str(args.replay_speed)]
+    else:
+        module = "benchmarks.fake_accelbyte"
+        forwarded = []
+        for name in ("players", "latency", "latency_jitter", "error_rate", "rate_limit_rate", "churn", "seed"):
+            forwarded += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", module, "--port", "0", *forwarded, stdout=asyncio.subprocess.PIPE
+    )
+    assert process.stdout is not None
+    line = (await process.stdout.readline()).decode().strip()
+    if not line.startswith("listening on "):
+        process.kill()
+        raise RuntimeError(f"fake accelbyte didn't start: {line!r}")
+    return process, line.removeprefix("listening on ")
+
+
+def _histogram_mean(histograms: typing.Iterable[Histogram]) -> float | None:
+    histograms = list(histograms)
+    count = sum(histogram.count for histogram in histograms)
+    if count == 0:
+        return None
+    return sum(histogram.sum for histogram in histograms) / count
+
+
+async def run(args: argparse.Namespace, database_path: str) -> dict[str, typing.Any]:
+    fake_quest_db = FakeQuestDB()
+    fake_meilisearch = FakeMeiliSearch()
+    quest_db_runner, quest_db_url = await serve(fake_quest_db.build_app())
+    meilisearch_runner, meilisearch_url = await serve(fake_meilisearch.build_app())
+    accelbyte_process, accelbyte_url = await start_fake_accelbyte(args)
+
+    config = ScraperConfig.model_validate(
+        {
+            "user_agent": "vail-api scraper throughput benchmark",
+            "bans": {"accelbyte": False},
+            "accelbyte": {"base_url": accelbyte_url, "record_path": args.record},
+            "user": {"email": "benchmark@example.com", "password": "benchmark"},
+            "rate_limiter": {"times": args.rate_limit_times, "per": args.rate_limit_per},
+            "database": {
+                "sqlite": {"url": database_path},
+                "quest": {"http_url": quest_db_url, "postgres_url": "postgres://unused"},
+                "meilisearch": {"url": meilisearch_url},
+            },
+        }
+    )
+    # Same setup as __main__
+    database = await connect_sqlite(database_path, Histogram(QUERY_BUCKETS))
+    database.row_factory = aiosqlite.Row
+    await database.execute("pragma journal_mode=wal")
+    await database.execute("pragma synchronous=normal")
+    await do_migrations(database)
+
+    quest_db = QuestDBWrapper(quest_db_url)
+    meilisearch = MeiliSearch(meilisearch_url, config.database.meilisearch.max_pending_tasks)
+    accel_byte_client = AccelByteClient(config)
+    scraper = VailScraper(
+        database,
+        ReadWriteLock(),
+        quest_db,
+        accel_byte_client,
+        EpicGamesClient(config),
+        meilisearch,
+        StatRankIndex(config.rank_index.memory_budget),
+        LRUCache(config.cache.user_names),
+        UserNameIndex(),
+        config,
+    )
+
+    started_at = time.perf_counter()
+    scraper_task = asyncio.create_task(scraper.run())
+    try:
+        while (elapsed := time.perf_counter() - started_at) < args.duration and not scraper_task.done():
+            await asyncio.wait([scraper_task], timeout=min(_PROGRESS_INTERVAL, args.duration - elapsed))
+            print(
+                f"  {time.perf_counter() - started_at:6.0f}s: {scraper.users_updated} users updated,"
+                f" {scraper.leaderboard_pages_fetched} leaderboard pages, {scraper.pending_updates} pending",
+                flush=True,
+            )
+        elapsed = time.perf_counter() - started_at
+        if scraper_task.done():
+            # Only stops on its own by crashing
+            scraper_task.result()
+
+        async with ClientSession() as session:
+            async with session.get(f"{accelbyte_url}/_fake/stats") as response:
+                upstream = await response.json()
+    finally:
+        scraper_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await scraper_task
+        await scraper.close()
+        await accel_byte_client.close()
+        await quest_db.close()
+        await meilisearch.close()
+        await database.close()
+        accelbyte_process.terminate()
+        await accelbyte_process.wait()
+        await quest_db_runner.cleanup()
+        await meilisearch_runner.cleanup()
+
+    upstream_requests = sum(upstream["requests"].values())
+    pass_duration = scraper.leaderboard_pass_duration
+    return {
+        "duration": elapsed,
+        "players": upstream["players"],
+        "users_updated": scraper.users_updated,
+        "users_per_minute": scraper.users_updated / elapsed * 60,
+        "user_update_failures": scraper.user_update_failures,
+        "leaderboard_passes": pass_duration.count,
+        "leaderboard_pass_duration": pass_duration.sum / pass_duration.count if pass_duration.count != 0 else None,
+        "leaderboard_pages_fetched": scraper.leaderboard_pages_fetched,
+        "leaderboard_page_failures": scraper.leaderboard_page_failures,
+        "upstream_requests": upstream["requests"],
+        "upstream_requests_per_updated_user": upstream_requests / scraper.users_updated if scraper.users_updated != 0 else None,
+        "upstream_errors_served": upstream["errors_served"],
+        "upstream_rate_limits_served": upstream["rate_limits_served"],
+        "rate_limiter_wait_mean": _histogram_mean(accel_byte_client.rate_limiter_wait.values()),
+        "sqlite_statements": database.query_duration.count,
+        "sqlite_statement_mean": _histogram_mean([database.query_duration]),
+        "replay_matches": {name: upstream[name] for name in ("exact_matches", "endpoint_matches", "misses") if name in upstream},
+        "quest_db_rows": fake_quest_db.rows,
+        "meilisearch_documents": fake_meilisearch.documents,
+    }
+
+
+def report(results: dict[str, typing.Any]) -> None:
+    def optional(value: float | None, unit: str, scale: float = 1) -> str:
+        return "n/a" if value is None else f"{value * scale:.2f}{unit}"
+
+    print(f"\n{results['users_updated']} users updated in {results['duration']:.0f}s: {results['users_per_minute']:.1f} users/minute")
+    print(f"  update failures: {results['user_update_failures']}")
+    if results["leaderboard_passes"] == 0:
+        pages = results["leaderboard_pages_fetched"]
+        print(f"  leaderboard pass: none finished, {pages} pages in ({min(pages * 100 / results['players'], 1):.0%} of the players)")
+    else:
+        print(f"  leaderboard pass: {optional(results['leaderboard_pass_duration'], 's')} over {results['leaderboard_passes']} passes")
+    print(f"  leaderboard page failures: {results['leaderboard_page_failures']}")
+    requests = ", ".join(f"{endpoint} {count}" for endpoint, count in sorted(results["upstream_requests"].items()))
+    print(f"  upstream requests: {requests}")
+    print(f"  upstream requests per updated user: {optional(results['upstream_requests_per_updated_user'], '')}")
+    print(f"  upstream 500s/429s served: {results['upstream_errors_served']}/{results['upstream_rate_limits_served']}")
+    if len(results["replay_matches"]) != 0:
+        print("  replayed: " + ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in results["replay_matches"].items()))
+    print(f"  mean rate limiter wait: {optional(results['rate_limiter_wait_mean'], 'ms', 1000)}")
+    print(f"  sqlite: {results['sqlite_statements']} statements, {optional(results['sqlite_statement_mean'], 'ms', 1000)} mean")
+    print(f"  questdb rows: {results['quest_db_rows']}, meilisearch documents: {results['meilisearch_documents']}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=120, help="seconds to scrape for")
+    parser.add_argument("--rate-limit-times", type=int, default=100, help="scraper rate limiter, requests per --rate-limit-per")
+    parser.add_argument("--rate-limit-per", type=float, default=1, help="seconds")
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--log-level", default="CRITICAL", help="failures are counted in the report either way")
+    parser.add_argument("--record", help="record the AccelByte traffic to this file")
+    parser.add_argument("--replay", help="scrape a recording made with --record or [accelbyte] record_path instead of the fake")
+    parser.add_argument("--replay-speed", type=float, default=1, help="divides the recorded latencies, inf for none")
+    fake_accelbyte.add_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = await run(args, os.path.join(directory, "db.sqlite"))
+    report(results)
+
+    if args.json is not None:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
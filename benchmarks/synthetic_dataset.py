@@ -0,0 +1,222 @@
+"""
+Fills a new SQLite database with millions of synthetic players and their stats, plus QuestDB user_stats snapshots
+for some of them, to load test the API (benchmarks.api_load) at and beyond production scale.
+
+The snapshots are sent to QuestDB with --quest-http-url. Otherwise they are written next to the database as
+<database>.user_stats.csv, in the format QuestDB's /imp takes:
+    curl -F data=@db.sqlite.user_stats.csv 'http://questdb:9000/imp?name=user_stats&timestamp=timestamp'
+
+Usage: python -m benchmarks.synthetic_dataset db.sqlite [--players 2000000] [--stats-per-player 40]
+    [--snapshot-players 1000] [--snapshots 50] [--quest-http-url http://localhost:9000]
+"""
+import argparse
+import asyncio
+import csv
+from datetime import datetime, timezone
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+import typing
+
+import aiosqlite
+
+from vail_scraper.database.migration_manager import do_migrations
+from vail_scraper.database.quest import QuestDBWrapper
+from vail_scraper.models.accelbyte import AccelByteStatCode
+
+# Players written per transaction
+_BATCH_SIZE: typing.Final[int] = 10_000
+# Snapshot rows sent to QuestDB per ingest
+_INGEST_SIZE: typing.Final[int] = 100_000
+# Every player has these, the rest of their stats are a random pick weighted towards the general ones
+_ALWAYS_SET: typing.Final[tuple[str, ...]] = ("score", "xp", "prestige", "kills", "deaths", "assists", "games-won", "games-lost", "game-seconds")
+_NAME_PARTS: typing.Final[tuple[tuple[str, ...], tuple[str, ...]]] = (
+    ("Shadow", "Vex", "Kryo", "Nova", "Ghost", "Iron", "Blitz", "Echo", "Rogue", "Vail", "Storm", "Hex", "Zero", "Ash", "Viper"),
+    ("hunter", "fox", "byte", "wolf", "blade", "shot", "raven", "core", "strike", "VR", "king", "lynx", "_", "", "x"),
+)
+
+
+class Player(typing.NamedTuple):
+    id: str
+    name: str
+    stats: dict[str, float]
+    updated_at: float
+
+
+class PlayerGenerator:
+    # Deterministic for a seed, players come out in id order so they are appended to the stats primary key instead of inserted all over it
+    def __init__(self, players: int, stats_per_player: int, seed: int, now: float) -> None:
+        self._random: random.Random = random.Random(seed)
+        self._now: float = now
+        self._id_step: int = 2**128 // players
+        self._stats_per_player: int = stats_per_player
+
+        stat_codes = [str(stat_code) for stat_code in AccelByteStatCode]
+        self._always_set: list[str] = [stat_code for stat_code in _ALWAYS_SET if stat_code in stat_codes]
+        self._optional: list[str] = [stat_code for stat_code in stat_codes if stat_code not in self._always_set]
+        # How much of a stat an average player has, game-seconds in the hours and headshots on a pistol in the tens
+        self._scales: dict[str, float] = {stat_code: math.exp(self._random.uniform(1, 8)) for stat_code in stat_codes}
+        self._scales.update({"score": 200_000, "xp": 40_000, "prestige": 3, "game-seconds": 200_000})
+
+    def generate(self, index: int) -> Player:
+        generator = self._random
+        user_id = f"{index * self._id_step + generator.randrange(self._id_step):032x}"
+        name = f"{generator.choice(_NAME_PARTS[0])}{generator.choice(_NAME_PARTS[1])}"
+        if generator.random() < 0.6:
+            name += str(generator.randint(0, 9999))
+
+        # Most players played a few games, a few played thousands
+        activity = generator.lognormvariate(0, 1.2)
+        optional = min(max(self._stats_per_player - len(self._always_set), 0), len(self._optional))
+        stat_codes = self._always_set + generator.sample(self._optional, optional)
+        stats = {stat_code: float(round(self._scales[stat_code] * activity * generator.uniform(0.5, 1.5))) for stat_code in stat_codes}
+        # Scraped somewhere in the last month
+        updated_at = self._now - generator.random() * 30 * 24 * 60 * 60
+        return Player(user_id, name, stats, updated_at)
+
+
+def _to_questtime(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def generate_snapshots(player: Player, snapshots: int, now: float, generator: random.Random) -> typing.Iterator[dict[str, typing.Any]]:
+    # What the scraper ingests every time the player's score changed: all their stats, growing towards today's values
+    timestamp = now - snapshots * 6 * 60 * 60
+    for snapshot in range(1, snapshots + 1):
+        timestamp += generator.uniform(1, 11) * 60 * 60
+        progress = snapshot / snapshots
+        for stat_code, value in player.stats.items():
+            yield {"code": stat_code, "value": float(round(value * progress)), "user_id": player.id, "timestamp": _to_questtime(min(timestamp, now))}
+
+
+async def _migrate(path: str) -> None:
+    database = await aiosqlite.connect(path)
+    try:
+        await do_migrations(database)
+        await database.commit()
+    finally:
+        await database.close()
+
+
+def fill_database(path: str, player_generator: PlayerGenerator, players: int, snapshot_players: int) -> list[Player]:
+    # Returns the players that get snapshots
+    asyncio.run(_migrate(path))
+
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute("pragma journal_mode=off")
+    connection.execute("pragma synchronous=off")
+    connection.execute("pragma cache_size=-262144")
+
+    # Secondary indexes are much faster to build once at the end than to keep up to date row by row
+    indexes = connection.execute(
+        "select name, sql from sqlite_master where type = 'index' and sql is not null and tbl_name in ('users', 'stats')"
+    ).fetchall()
+    for name, _ in indexes:
+        connection.execute(f"drop index {name}")
+
+    snapshotted: list[Player] = []
+    started_at = time.perf_counter()
+    for batch_start in range(0, players, _BATCH_SIZE):
+        batch = [player_generator.generate(index) for index in range(batch_start, min(batch_start + _BATCH_SIZE, players))]
+        snapshotted.extend(batch[: max(snapshot_players - len(snapshotted), 0)])
+
+        connection.execute("begin")
+        connection.executemany("insert into users (id, name, updated_at) values (?, ?, ?)", [(player.id, player.name, player.updated_at) for player in batch])
+        connection.executemany(
+            "insert into stats (code, user_id, value, updated_at) values (?, ?, ?, ?)",
+            [(stat_code, player.id, value, player.updated_at) for player in batch for stat_code, value in player.stats.items()],
+        )
+        connection.execute("commit")
+
+        written = batch_start + len(batch)
+        print(f"\r  {written}/{players} players, {written / (time.perf_counter() - started_at):.0f}/s", end="", flush=True)
+    print()
+
+    for name, sql in indexes:
+        print(f"  creating index {name}", flush=True)
+        connection.execute(sql)
+    print("  totalling game_stats", flush=True)
+    connection.execute(
+        "insert or replace into game_stats (code, total, users, updated_at) select code, sum(value), count(*), max(updated_at) from stats group by code"
+    )
+    # Sampling is plenty for the query planner, a full analyze of stats takes as long as building an index
+    connection.execute("pragma analysis_limit=1000")
+    connection.execute("analyze")
+    # Back to what the API runs with
+    connection.execute("pragma journal_mode=wal")
+    connection.close()
+    return snapshotted
+
+
+def write_snapshots_csv(path: str, players: list[Player], snapshots: int, seed: int) -> int:
+    generator = random.Random(seed)
+    now = time.time()
+    rows = 0
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, ["code", "value", "user_id", "timestamp"])
+        writer.writeheader()
+        for player in players:
+            for row in generate_snapshots(player, snapshots, now, generator):
+                writer.writerow(row)
+                rows += 1
+    return rows
+
+
+async def ingest_snapshots(quest_http_url: str, players: list[Player], snapshots: int, seed: int) -> int:
+    # Through QuestDBWrapper.ingest, like the scraper does, in bigger chunks
+    generator = random.Random(seed)
+    now = time.time()
+    quest_db = QuestDBWrapper(quest_http_url)
+    rows = 0
+    records: list[dict[str, typing.Any]] = []
+    try:
+        for player in players:
+            records.extend(generate_snapshots(player, snapshots, now, generator))
+            if len(records) >= _INGEST_SIZE:
+                await quest_db.ingest("user_stats", records)
+                rows += len(records)
+                records = []
+        if len(records) != 0:
+            await quest_db.ingest("user_stats", records)
+            rows += len(records)
+    finally:
+        await quest_db.close()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("database", help="path of the SQLite database to create")
+    parser.add_argument("--players", type=int, default=2_000_000)
+    parser.add_argument("--stats-per-player", type=int, default=40, help="production players have between ~20 and ~260")
+    parser.add_argument("--snapshot-players", type=int, default=1000, help="the first this many players get timeseries snapshots")
+    parser.add_argument("--snapshots", type=int, default=50, help="snapshots per snapshotted player")
+    parser.add_argument("--quest-http-url", help="send the snapshots here instead of writing a csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        sys.exit(f"{args.database} already exists, refusing to add to it")
+
+    started_at = time.perf_counter()
+    print(f"generating {args.players} players into {args.database}")
+    player_generator = PlayerGenerator(args.players, args.stats_per_player, args.seed, time.time())
+    snapshotted = fill_database(args.database, player_generator, args.players, args.snapshot_players)
+
+    if args.snapshots != 0 and len(snapshotted) != 0:
+        if args.quest_http_url is not None:
+            rows = asyncio.run(ingest_snapshots(args.quest_http_url, snapshotted, args.snapshots, args.seed))
+            print(f"ingested {rows} user_stats rows into {args.quest_http_url}")
+        else:
+            csv_path = f"{args.database}.user_stats.csv"
+            rows = write_snapshots_csv(csv_path, snapshotted, args.snapshots, args.seed)
+            print(f"wrote {rows} user_stats rows to {csv_path}")
+
+    print(f"done in {time.perf_counter() - started_at:.0f}s, {os.path.getsize(args.database) / 1024 / 1024:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
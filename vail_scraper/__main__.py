@@ -1,5 +1,10 @@
+import argparse
 import asyncio
+import contextlib
 import logging
+import sys
+import time
+import typing
 
 import aiosqlite
 from aiohttp import web
@@ -9,15 +14,22 @@ from vail_scraper.database.meilisearch import MeiliSearch
 
 from .client.accelbyte import AccelByteClient
 from .client.epic_games import EpicGamesClient
-from .database.quest import QuestDBWrapper
-from .utils.exclusive_lock import ExclusiveLock
-from .config import load_config
+from .database.quest import InstrumentedQuestConnection, QuestDBWrapper
+from .database.rank_index import StatRankIndex
+from .database.name_index import UserNameIndex
+from .database.sqlite_connection import QUERY_BUCKETS, connect as connect_sqlite
+from .database.sqlite_pool import SqliteReadPool
+from .database.snapshot import DatabaseSnapshotter
+from .utils.rw_lock import ReadWriteLock
+from .utils.histogram import Histogram
+from .utils.lru_cache import LRUCache
+from .utils.rate_limit_store import RateLimitStore
+from .config import NameIndexConfig, RateLimitConfig, ScraperConfig, load_config
 from .database.migration_manager import do_migrations
 from . import app_keys
 from .scraper import VailScraper
-from .routers.raw import router as raw_router
-from .routers.api.v1 import router as api_v1_router
-from .routers.api.v2 import router as api_v2_router
+from .app import create_app
+from .supervisor import Supervisor
 
 logging.basicConfig(level=logging.WARNING)
 _logger = logging.getLogger(__name__)
@@ -25,46 +37,254 @@ _logger = logging.getLogger(__name__)
 logging.getLogger("vail_scraper").setLevel(logging.DEBUG)
 logging.getLogger("aiohttp").setLevel(logging.DEBUG)
 
-app = web.Application()
+_HOST: typing.Final[str] = "0.0.0.0"
+_PORT: typing.Final[int] = 8000
+# Names saved a little before the last sync are read again, in case their transaction committed after it
+_NAME_SYNC_OVERLAP: typing.Final[float] = 60
+_INDEX_READY_POLL_INTERVAL: typing.Final[float] = 0.1
 
-# Register routers
-app.add_routes(raw_router)
-app.add_routes(api_v1_router)
-app.add_routes(api_v2_router)
+app = create_app()
 
 
-async def main() -> None:
-    config = load_config()
-    database_lock = ExclusiveLock()
+async def build_user_name_index(user_name_index: UserNameIndex, database_read_pool: SqliteReadPool) -> None:
+    async with database_read_pool.acquire() as connection:
+        await user_name_index.build(connection)
+
+
+async def sync_user_names(
+    user_name_index: UserNameIndex,
+    user_name_cache: LRUCache[str, str],
+    database_read_pool: SqliteReadPool,
+    interval: float,
+) -> None:
+    # API worker processes don't see the names the scraper process saves, so they catch up from users.updated_at
+    since = time.time()
+    await build_user_name_index(user_name_index, database_read_pool)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with database_read_pool.acquire() as connection:
+                rows = await user_name_index.sync(connection, since - _NAME_SYNC_OVERLAP)
+        except aiosqlite.Error:
+            _logger.exception("failed to sync user names")
+            continue
+        for user_id, name, updated_at in rows:
+            if user_id in user_name_cache:
+                user_name_cache.set(user_id, name)
+            since = max(since, updated_at)
+
+
+def with_upstream_share(config: ScraperConfig, share: float) -> ScraperConfig:
+    # Stretches the period instead of cutting the request count, so small limits like 2 per 3 seconds still split evenly
+    rate_limiter = RateLimitConfig(times=config.rate_limiter.times, per=config.rate_limiter.per / share)
+    return config.model_copy(update={"rate_limiter": rate_limiter})
 
-    database = await aiosqlite.connect(config.database.sqlite.url)
+
+async def open_database(config: ScraperConfig, *, migrate: bool) -> SqliteReadPool:
+    database = await connect_sqlite(
+        config.database.sqlite.url, Histogram(QUERY_BUCKETS), config.slow_query_log.threshold_or_none
+    )
     database.row_factory = aiosqlite.Row
-    _logger.info("doing migrations")
-    await do_migrations(database)
+    # WAL lets the read pool keep reading while the scraper writes
+    await database.execute("pragma journal_mode=wal")
+    await database.execute("pragma synchronous=normal")
+    if migrate:
+        _logger.info("doing migrations")
+        await do_migrations(database)
+    database_read_pool = await SqliteReadPool.open(
+        config.database.sqlite.url, config.database.sqlite.read_connections, database
+    )
 
-    app[app_keys.CONFIG] = config
     app[app_keys.DATABASE] = database
-    app[app_keys.QUEST_DB] = QuestDBWrapper(config.database.quest.http_url)
-    app[app_keys.QUEST_DB_POSTGRES] = await asyncpg.create_pool(config.database.quest.postgres_url)
-    app[app_keys.MEILISEARCH] = MeiliSearch(config.database.meilisearch.url)
+    app[app_keys.DATABASE_READ_POOL] = database_read_pool
+    return database_read_pool
+
+
+async def setup_app(config: ScraperConfig, *, migrate: bool) -> SqliteReadPool:
+    # Everything but the scraper
+    app[app_keys.CONFIG] = config
+    app[app_keys.DATABASE_LOCK] = ReadWriteLock()
+    database_read_pool = await open_database(config, migrate=migrate)
+
+    app[app_keys.DATABASE_SNAPSHOTTER] = DatabaseSnapshotter(
+        config.database.sqlite.url, config.snapshot.compress
+    )
+    app[app_keys.QUEST_DB] = QuestDBWrapper(
+        config.database.quest.http_url, config.slow_query_log.threshold_or_none
+    )
+    app[app_keys.QUEST_DB_POSTGRES] = await asyncpg.create_pool(
+        config.database.quest.postgres_url,
+        connection_class=InstrumentedQuestConnection,
+        init=app[app_keys.QUEST_DB].setup_postgres_connection,
+    )
+    app[app_keys.MEILISEARCH] = MeiliSearch(
+        config.database.meilisearch.url,
+        config.database.meilisearch.max_pending_tasks,
+    )
     app[app_keys.ACCEL_BYTE_CLIENT] = AccelByteClient(config)
     app[app_keys.EPIC_GAMES_CLIENT] = EpicGamesClient(config)
+    app[app_keys.RANK_INDEX] = StatRankIndex(config.rank_index.memory_budget)
+    app[app_keys.USER_NAME_CACHE] = LRUCache(config.cache.user_names)
+    app[app_keys.USER_NAME_INDEX] = UserNameIndex()
+    app[app_keys.RATE_LIMIT_STORE] = RateLimitStore(
+        config.api_rate_limit.capacity,
+        config.api_rate_limit.refill_rate,
+        config.api_rate_limit.max_clients,
+    )
+
+    if config.rank_index.enabled:
+        asyncio.create_task(
+            app[app_keys.RANK_INDEX].run_periodic_rebuilds(
+                database_read_pool, config.rank_index.rebuild_interval
+            )
+        )
+    return database_read_pool
+
+
+def setup_scraper(config: ScraperConfig, database_read_pool: SqliteReadPool) -> None:
     app[app_keys.SCRAPER] = VailScraper(
-        database,
-        database_lock,
+        app[app_keys.DATABASE],
+        app[app_keys.DATABASE_LOCK],
         app[app_keys.QUEST_DB],
         app[app_keys.ACCEL_BYTE_CLIENT],
         app[app_keys.EPIC_GAMES_CLIENT],
         app[app_keys.MEILISEARCH],
+        app[app_keys.RANK_INDEX],
+        app[app_keys.USER_NAME_CACHE],
+        app[app_keys.USER_NAME_INDEX],
         config,
     )
-    app[app_keys.DATABASE_LOCK] = database_lock
 
     if config.enabled:
         asyncio.create_task(app[app_keys.SCRAPER].run())
+    if config.snapshot.enabled and config.database.sqlite.url != ":memory:":
+        asyncio.create_task(
+            app[app_keys.DATABASE_SNAPSHOTTER].run_periodic_snapshots(
+                database_read_pool, app[app_keys.DATABASE], app[app_keys.DATABASE_LOCK], config.snapshot.interval
+            )
+        )
+
+
+async def close_app() -> None:
+    # Background work goes first, so nothing is using the connections by the time they close
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    if app_keys.SCRAPER in app:
+        await app[app_keys.SCRAPER].close()
+    await app[app_keys.ACCEL_BYTE_CLIENT].close()
+    await app[app_keys.EPIC_GAMES_CLIENT].close()
+    await app[app_keys.QUEST_DB].close()
+    await app[app_keys.MEILISEARCH].close()
+    await app[app_keys.QUEST_DB_POSTGRES].close()
+    await app[app_keys.DATABASE_READ_POOL].close()
+    await app[app_keys.DATABASE].close()
+
+
+async def run_single_process(config: ScraperConfig) -> None:
+    database_read_pool = await setup_app(config, migrate=True)
+    setup_scraper(config, database_read_pool)
+    if config.name_index.enabled:
+        asyncio.create_task(build_user_name_index(app[app_keys.USER_NAME_INDEX], database_read_pool))
 
     _logger.info("starting listening")
-    await web._run_app(app, host="0.0.0.0", port=8000)
+    await web._run_app(app, host=_HOST, port=_PORT)
+
+
+async def run_api_worker(config: ScraperConfig, socket_path: str) -> None:
+    # One of several processes serving the API on the same port, the scraper process keeps the database up to date
+    workers = config.workers
+    config = with_upstream_share(config, workers.api_upstream_share / workers.api_workers)
+    # Every worker keeps its own buckets and a client's connections can land on any of them, so each gets its share
+    # of the limit. A client on a single keep-alive connection stays on one worker and gets 1/api_workers of it
+    api_rate_limit = config.api_rate_limit.model_copy(
+        update={
+            "capacity": config.api_rate_limit.capacity / workers.api_workers,
+            "refill_rate": config.api_rate_limit.refill_rate / workers.api_workers,
+        }
+    )
+    # Only the scraper process records upstream traffic, several writers appending to one gzip file would corrupt it
+    accelbyte = config.accelbyte.model_copy(update={"record_path": None})
+    config = config.model_copy(update={"api_rate_limit": api_rate_limit, "accelbyte": accelbyte})
+    database_read_pool = await setup_app(config, migrate=False)
+    if config.name_index.enabled:
+        asyncio.create_task(
+            sync_user_names(
+                app[app_keys.USER_NAME_INDEX],
+                app[app_keys.USER_NAME_CACHE],
+                database_read_pool,
+                workers.name_sync_interval,
+            )
+        )
+    # The kernel hands new connections to any process listening on the port, so only listen once this one can answer
+    # everything instead of 503ing until its indexes are built
+    while (config.name_index.enabled and not app[app_keys.USER_NAME_INDEX].ready) or (
+        config.rank_index.enabled and not app[app_keys.RANK_INDEX].ready
+    ):
+        await asyncio.sleep(_INDEX_READY_POLL_INTERVAL)
+
+    try:
+        await web._run_app(
+            app,
+            host=_HOST,
+            port=_PORT,
+            path=socket_path,
+            reuse_port=True,
+            handle_signals=True,
+            shutdown_timeout=workers.shutdown_timeout,
+            print=None,
+        )
+    finally:
+        await close_app()
+
+
+async def run_scraper_worker(config: ScraperConfig, socket_path: str) -> None:
+    # The API workers serve from their own indexes, so this process doesn't build any and only listens for the
+    # supervisor's health checks and its own /metrics
+    workers = config.workers
+    config = with_upstream_share(config, 1 - workers.api_upstream_share)
+    config = config.model_copy(
+        update={
+            "name_index": NameIndexConfig(enabled=False),
+            "rank_index": config.rank_index.model_copy(update={"enabled": False}),
+        }
+    )
+    database_read_pool = await setup_app(config, migrate=True)
+    setup_scraper(config, database_read_pool)
+
+    try:
+        await web._run_app(app, path=socket_path, handle_signals=True, shutdown_timeout=workers.shutdown_timeout, print=None)
+    finally:
+        await close_app()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    # Set by the supervisor for the processes it starts
+    parser.add_argument("--role", choices=["api", "scraper"])
+    parser.add_argument("--name")
+    parser.add_argument("--socket")
+    args = parser.parse_args()
+    config = load_config()
+
+    if args.role is None:
+        if config.workers.api_workers == 0:
+            asyncio.run(run_single_process(config))
+            return
+        if config.database.sqlite.url == ":memory:":
+            sys.exit("an in-memory database can't be shared between worker processes, set workers.api_workers = 0")
+        asyncio.run(Supervisor(config.workers).run())
+        return
+
+    logging.basicConfig(format=f"{args.name} %(levelname)s:%(name)s:%(message)s", level=logging.WARNING, force=True)
+    # SIGTERM from the supervisor ends in GracefulExit once the requests in flight are done
+    with contextlib.suppress(web.GracefulExit):
+        if args.role == "api":
+            asyncio.run(run_api_worker(config, args.socket))
+        else:
+            asyncio.run(run_scraper_worker(config, args.socket))
 
 
-asyncio.run(main())
+main()
@@ -0,0 +1,38 @@
+from aiohttp import web
+
+from .utils.compression import compression_middleware
+from .utils.http_cache import conditional_request_middleware
+from .utils.metrics import RequestMetrics, request_metrics_middleware
+from .utils.request_timing import request_timing_middleware
+from . import app_keys
+from .routers.raw import router as raw_router
+from .routers.health import router as health_router
+from .routers.metrics import router as metrics_router
+from .routers.api.v1 import router as api_v1_router
+from .routers.api.v2 import router as api_v2_router
+from .routers.api.v2.openapi import load_openapi
+
+
+def create_app() -> web.Application:
+    # The routes and middlewares, the databases and clients the routes use are up to the caller to add
+    request_metrics = RequestMetrics()
+    # Metrics and timing go first so the time spent compressing is counted too.
+    # Compression goes before conditional requests so it wraps, and compresses, what the conditional request middleware returns
+    app = web.Application(
+        middlewares=[
+            request_metrics_middleware(request_metrics),
+            request_timing_middleware,
+            compression_middleware,
+            conditional_request_middleware,
+        ]
+    )
+    app[app_keys.REQUEST_METRICS] = request_metrics
+    app.on_startup.append(load_openapi)
+
+    # Register routers
+    app.add_routes(raw_router)
+    app.add_routes(health_router)
+    app.add_routes(metrics_router)
+    app.add_routes(api_v1_router)
+    app.add_routes(api_v2_router)
+    return app
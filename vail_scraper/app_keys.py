@@ -1,4 +1,3 @@
-import aiosqlite
 from aiohttp.web import AppKey
 import asyncpg
 
@@ -6,14 +5,25 @@ from .database.meilisearch import MeiliSearch
 from .client.accelbyte import AccelByteClient
 from .client.epic_games import EpicGamesClient
 from .database.quest import QuestDBWrapper
-from .utils.exclusive_lock import ExclusiveLock
+from .database.rank_index import StatRankIndex
+from .database.name_index import UserNameIndex
+from .database.sqlite_connection import InstrumentedConnection
+from .database.sqlite_pool import SqliteReadPool
+from .database.snapshot import DatabaseSnapshotter
+from .utils.rw_lock import ReadWriteLock
+from .utils.lru_cache import LRUCache
+from .utils.rate_limit_store import RateLimitStore
+from .utils.metrics import RequestMetrics
+from .utils.compression import PrecompressedBody
 from .config import ScraperConfig
 from .scraper import VailScraper
 
 CONFIG: AppKey[ScraperConfig] = AppKey("config", ScraperConfig)
-DATABASE: AppKey[aiosqlite.Connection] = AppKey("database", aiosqlite.Connection)
+DATABASE: AppKey[InstrumentedConnection] = AppKey("database", InstrumentedConnection)
+DATABASE_READ_POOL: AppKey[SqliteReadPool] = AppKey("database_read_pool", SqliteReadPool)
+DATABASE_SNAPSHOTTER: AppKey[DatabaseSnapshotter] = AppKey("database_snapshotter", DatabaseSnapshotter)
 SCRAPER: AppKey[VailScraper] = AppKey("scraper", VailScraper)
-DATABASE_LOCK: AppKey[ExclusiveLock] = AppKey("database_lock", ExclusiveLock)
+DATABASE_LOCK: AppKey[ReadWriteLock] = AppKey("database_lock", ReadWriteLock)
 ACCEL_BYTE_CLIENT: AppKey[AccelByteClient] = AppKey(
     "accel_byte_client", AccelByteClient
 )
@@ -23,3 +33,9 @@ EPIC_GAMES_CLIENT: AppKey[EpicGamesClient] = AppKey(
 QUEST_DB: AppKey[QuestDBWrapper] = AppKey("quest_db", QuestDBWrapper)
 QUEST_DB_POSTGRES: AppKey[asyncpg.Pool] = AppKey("quest_db_postgres", asyncpg.Pool)
 MEILISEARCH: AppKey[MeiliSearch] = AppKey("meilisearch", MeiliSearch)
+RANK_INDEX: AppKey[StatRankIndex] = AppKey("rank_index", StatRankIndex)
+USER_NAME_CACHE: AppKey[LRUCache[str, str]] = AppKey("user_name_cache", LRUCache)
+USER_NAME_INDEX: AppKey[UserNameIndex] = AppKey("user_name_index", UserNameIndex)
+RATE_LIMIT_STORE: AppKey[RateLimitStore] = AppKey("rate_limit_store", RateLimitStore)
+REQUEST_METRICS: AppKey[RequestMetrics] = AppKey("request_metrics", RequestMetrics)
+OPENAPI_BODY: AppKey[PrecompressedBody] = AppKey("openapi_body", PrecompressedBody)
@@ -21,6 +21,7 @@ from ..models.accelbyte import (
 from ..enums import RequestPriority
 from ..config import ScraperConfig
 from .base import BaseService, TOKEN_MARGIN_SECONDS, get_token_expiry_in_seconds
+from .recording import TrafficRecorder
 
 _logger = getLogger(__name__)
 
@@ -28,11 +29,17 @@ _CLIENT_ID: str = "8e1fbe68aef14404882e88358be5536b"
 
 
 class AccelByteClient(BaseService):
+    SERVICE_NAME = "accelbyte"
+
     def __init__(self, config: ScraperConfig) -> None:
         super().__init__(config)
         self._token_lock: asyncio.Lock = asyncio.Lock()
         self._refresh_token: str | None = None
         self._access_token: str | None = None
+        self._base_url: str = config.accelbyte.base_url.rstrip("/")
+        # Only the data requests are recorded, the login would need real credentials to replay anyway
+        if config.accelbyte.record_path is not None:
+            self._recorder = TrafficRecorder(config.accelbyte.record_path, self.SERVICE_NAME)
 
     async def _get_refresh_token(self) -> tuple[str, str]:
         session = await self.get_session()
@@ -60,9 +67,9 @@ class AccelByteClient(BaseService):
 
         # Get request id
         with self._circuit_breaker:
-            async with self._rate_limiter.acquire(priority=RequestPriority.HIGH):
+            async with self._acquire_rate_limiter(RequestPriority.HIGH):
                 response = await session.get(
-                    "https://login.vailvr.com/iam/v3/oauth/authorize",
+                    f"{self._base_url}/iam/v3/oauth/authorize",
                     params={
                         "response_type": "code",
                         "client_id": _CLIENT_ID,
@@ -83,7 +90,7 @@ class AccelByteClient(BaseService):
 
         session.cookie_jar.update_cookies({"request_id": request_id})
         response = await session.post(
-            "https://login.vailvr.com/iam/v3/authenticate",
+            f"{self._base_url}/iam/v3/authenticate",
             data={
                 "request_id": request_id,
                 "redirect_uri": "https://login.vailvr.com",
@@ -101,9 +108,9 @@ class AccelByteClient(BaseService):
         _logger.debug("got code: %s", code)
 
         with self._circuit_breaker:
-            async with self._rate_limiter.acquire(priority=RequestPriority.HIGH):
+            async with self._acquire_rate_limiter(RequestPriority.HIGH):
                 response = await session.post(
-                    "https://login.vailvr.com/iam/v3/oauth/token",
+                    f"{self._base_url}/iam/v3/oauth/token",
                     data={
                         "grant_type": "authorization_code",
                         "code": code,
@@ -159,12 +166,12 @@ class AccelByteClient(BaseService):
 
         async def _do_request():
             with self._circuit_breaker:
-                async with self._rate_limiter.acquire(priority=priority):
+                async with self._acquire_rate_limiter(priority):
                     acquired_rate_limiter_event.set()
                     session = await self.get_session()
                     mixed_headers = {"Authorization": f"Bearer {token}", **headers}
-                    return await session.request(
-                        method, *args, **kwargs, headers=mixed_headers
+                    return await self._timed_request(
+                        session, method, *args, **kwargs, headers=mixed_headers
                     )
 
         while True:
@@ -201,7 +208,7 @@ class AccelByteClient(BaseService):
     ) -> list[AccelByteLeaderboardPlayer]:
         response = await self._do_authenticated_request(
             "GET",
-            f"https://login.vailvr.com/leaderboard/v3/public/namespaces/vailvr/leaderboards/{quote(stat_code)}/alltime",
+            f"{self._base_url}/leaderboard/v3/public/namespaces/vailvr/leaderboards/{quote(stat_code)}/alltime",
             params={"limit": page_size, "offset": page_id * page_size},
             priority=priority,
         )
@@ -215,7 +222,7 @@ class AccelByteClient(BaseService):
     ) -> dict[str, float] | None:
         response = await self._do_authenticated_request(
             "GET",
-            f"https://login.vailvr.com/social/v1/public/namespaces/vailvr/users/{quote(user_id)}/statitems",
+            f"{self._base_url}/social/v1/public/namespaces/vailvr/users/{quote(user_id)}/statitems",
             params={"limit": 1000},
             priority=priority,
         )
@@ -240,7 +247,7 @@ class AccelByteClient(BaseService):
     ) -> AccelBytePlayerInfo | None:
         response = await self._do_authenticated_request(
             "GET",
-            f"https://login.vailvr.com/iam/v3/public/namespaces/vailvr/users/{quote(user_id)}",
+            f"{self._base_url}/iam/v3/public/namespaces/vailvr/users/{quote(user_id)}",
             priority=priority,
         )
         if not response.ok and response.content_type == "application/json":
@@ -1,5 +1,6 @@
 import json
 import base64
+from contextlib import asynccontextmanager
 import time
 import typing
 
@@ -8,6 +9,9 @@ from slowstack.asynchronous.times_per import TimesPerRateLimiter
 
 from ..config import ScraperConfig
 from ..utils.circuit_breaker import CircuitBreaker
+from ..utils.histogram import Histogram
+from ..utils.request_timing import record_span
+from .recording import TrafficRecorder
 from ..errors import ExternalServiceError, Service
 
 TOKEN_MARGIN_SECONDS: float = 2
@@ -23,6 +27,9 @@ def get_token_expiry_in_seconds(token: str) -> float:
 
 
 class BaseService:
+    # Name used for the service in Server-Timing
+    SERVICE_NAME: str = "upstream"
+
     def __init__(self, config: ScraperConfig) -> None:
         self._config: ScraperConfig = config
         self._http_session: aiohttp.ClientSession | None = None
@@ -30,6 +37,37 @@ class BaseService:
         self._rate_limiter: TimesPerRateLimiter = TimesPerRateLimiter(
             config.rate_limiter.times, config.rate_limiter.per
         )
+        # Priority -> how long requests waited for the rate limiter
+        self.rate_limiter_wait: dict[int, Histogram] = {}
+        # Set by services that can record their traffic, see benchmarks.replay_accelbyte
+        self._recorder: TrafficRecorder | None = None
+
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        return self._circuit_breaker
+
+    @asynccontextmanager
+    async def _acquire_rate_limiter(self, priority: int) -> typing.AsyncGenerator[None, None]:
+        started_at = time.perf_counter()
+        async with self._rate_limiter.acquire(priority=priority):
+            waited = time.perf_counter() - started_at
+            wait = self.rate_limiter_wait.get(priority)
+            if wait is None:
+                wait = self.rate_limiter_wait[priority] = Histogram()
+            wait.observe(waited)
+            record_span(f"{self.SERVICE_NAME}_wait", waited)
+            yield
+
+    async def _timed_request(self, session: aiohttp.ClientSession, method: str, url: str, **kwargs: typing.Any) -> aiohttp.ClientResponse:
+        # Until the response headers are in, reading the body is up to the caller
+        started_at = time.perf_counter()
+        try:
+            response = await session.request(method, url, **kwargs)
+        finally:
+            record_span(self.SERVICE_NAME, time.perf_counter() - started_at)
+        if self._recorder is not None:
+            await self._recorder.record(method, response, started_at)
+        return response
 
     async def get_session(self) -> aiohttp.ClientSession:
         if self._http_session is None:
@@ -38,6 +76,14 @@ class BaseService:
             )
         return self._http_session
 
+    async def close(self) -> None:
+        if self._http_session is not None:
+            await self._http_session.close()
+            self._http_session = None
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+
     async def request(
         self,
         method: typing.Literal["GET", "POST", "PATCH", "DELETE"],
@@ -48,8 +94,8 @@ class BaseService:
     ) -> aiohttp.ClientResponse:
         session = await self.get_session()
         with self._circuit_breaker:
-            async with self._rate_limiter.acquire(priority=priority):
-                return await session.request(method, url, **kwargs)
+            async with self._acquire_rate_limiter(priority):
+                return await self._timed_request(session, method, url, **kwargs)
 
     async def raise_for_status(self, response: aiohttp.ClientResponse):
         if not response.ok:
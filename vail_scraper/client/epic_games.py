@@ -5,20 +5,26 @@ from slowstack.asynchronous.times_per import TimesPerRateLimiter
 
 from vail_scraper.config import ScraperConfig
 from vail_scraper.utils.circuit_breaker import CircuitBreaker
+from vail_scraper.utils.histogram import Histogram
 from .base import BaseService, get_token_expiry_in_seconds, TOKEN_MARGIN_SECONDS
+from .recording import TrafficRecorder
 
 _EPIC_DEPLOYMENT_ID: str = "db1cb57993ef44bab8084fb3c4ecb334"
 
 
 class EpicGamesClient(BaseService):
+    SERVICE_NAME = "epic_games"
+
     def __init__(self, config: ScraperConfig) -> None:
         self._config: typing.Final[ScraperConfig] = config
-        self._session: aiohttp.ClientSession | None = None
+        self._http_session: aiohttp.ClientSession | None = None
         self._rate_limiter: TimesPerRateLimiter = TimesPerRateLimiter(
             config.rate_limiter.times, config.rate_limiter.per
         )
         self._circuit_breaker: CircuitBreaker = CircuitBreaker(5, 60)
+        self.rate_limiter_wait: dict[int, Histogram] = {}
         self._access_token: str | None = None
+        self._recorder: TrafficRecorder | None = None
 
     async def _get_token(self) -> str:
         session = await self.get_session()
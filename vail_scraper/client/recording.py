@@ -0,0 +1,124 @@
+import gzip
+import json
+from logging import getLogger
+import time
+import typing
+
+import aiohttp
+from yarl import URL
+
+_logger = getLogger(__name__)
+
+RECORDING_FORMAT_VERSION: typing.Final[int] = 1
+# Left out of recorded query strings and JSON bodies, wherever they are nested
+_REDACTED_FIELDS: typing.Final[frozenset[str]] = frozenset(
+    {
+        "access_token",
+        "refresh_token",
+        "id_token",
+        "code",
+        "password",
+        "emailAddress",
+        "newEmailAddress",
+        "oldEmailAddress",
+        "phoneNumber",
+        "dateOfBirth",
+    }
+)
+_REDACTED: typing.Final[str] = "<redacted>"
+
+
+class Exchange(typing.NamedTuple):
+    # Seconds since the recording started
+    offset: float
+    method: str
+    # Path and query, without the host so it can be replayed against any base url
+    url: str
+    status: int
+    content_type: str
+    # Seconds until the whole body was in
+    latency: float
+    body: str
+
+
+def _redact(value: typing.Any) -> typing.Any:
+    if isinstance(value, dict):
+        return {key: _REDACTED if key in _REDACTED_FIELDS else _redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    return value
+
+
+def sanitize_url(url: URL) -> str:
+    relative = url.relative()
+    if not any(key in _REDACTED_FIELDS for key in relative.query):
+        return str(relative)
+    return str(relative.with_query({key: _REDACTED if key in _REDACTED_FIELDS else value for key, value in relative.query.items()}))
+
+
+def sanitize_body(body: bytes, content_type: str) -> str:
+    text = body.decode("utf-8", "replace")
+    if content_type != "application/json":
+        return text
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text
+    # Re-encoded compactly, most payloads shrink a little
+    return json.dumps(_redact(data), separators=(",", ":"))
+
+
+class TrafficRecorder:
+    # Appends sanitized request/response pairs to a gzipped JSON lines file. Request headers, and so tokens and cookies,
+    # are never written. Every open starts a new gzip member with its own header line, so a restarted scraper can keep
+    # appending to the same file
+    def __init__(self, path: str, service_name: str) -> None:
+        self._file: typing.TextIO = gzip.open(path, "at", encoding="utf-8")
+        self._started_at: float = time.perf_counter()
+        self._file.write(
+            json.dumps({"version": RECORDING_FORMAT_VERSION, "service": service_name, "started_at": time.time()}) + "\n"
+        )
+
+        # Stats
+        self.exchanges_recorded: int = 0
+
+    async def record(self, method: str, response: aiohttp.ClientResponse, started_at: float) -> None:
+        # Reads the body, the response can still be read by the caller afterwards
+        body = await response.read()
+        latency = time.perf_counter() - started_at
+        exchange = Exchange(
+            offset=started_at - self._started_at,
+            method=method,
+            url=sanitize_url(response.url),
+            status=response.status,
+            content_type=response.content_type,
+            latency=latency,
+            body=sanitize_body(body, response.content_type),
+        )
+        self._file.write(json.dumps(exchange._asdict(), separators=(",", ":")) + "\n")
+        self.exchanges_recorded += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def read_recording(path: str) -> typing.Iterator[Exchange]:
+    # Offsets are made relative to the first header, so appended recordings play one after the other
+    first_started_at: float | None = None
+    member_offset = 0.0
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                data = json.loads(line)
+                if "version" in data:
+                    if data["version"] != RECORDING_FORMAT_VERSION:
+                        raise ValueError(f"{path} is recording format {data['version']}, expected {RECORDING_FORMAT_VERSION}")
+                    if first_started_at is None:
+                        first_started_at = data["started_at"]
+                    member_offset = data["started_at"] - first_started_at
+                    continue
+                data["offset"] += member_offset
+                yield Exchange(**data)
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+            # The recording process was killed before it could finish the file, everything up to there is still good
+            _logger.warning("%s ends early, replaying what was recorded before that", path)
@@ -11,6 +11,12 @@ class RateLimitConfig(BaseModel):
     per: float
 
 
+class APIRateLimitConfig(BaseModel):
+    capacity: float = 60
+    refill_rate: float = 1
+    max_clients: int = 100_000
+
+
 class ScraperUserConfig(BaseModel):
     email: str
     password: str
@@ -19,8 +25,13 @@ class ScraperUserConfig(BaseModel):
 class BansConfig(BaseModel):
     accelbyte: bool = False
 
+class AccelByteConfig(BaseModel):
+    base_url: str = "https://login.vailvr.com"
+    record_path: str | None = None
+
 class SqliteConfig(BaseModel):
     url: str
+    read_connections: int = 4
 
 class QuestConfig(BaseModel):
     http_url: str
@@ -28,12 +39,58 @@ class QuestConfig(BaseModel):
 
 class MeiliSearchConfig(BaseModel):
     url: str
+    max_pending_tasks: int = 4
 
 class DatabaseConfig(BaseModel):
     sqlite: SqliteConfig
     quest: QuestConfig
     meilisearch: MeiliSearchConfig
 
+class RankIndexConfig(BaseModel):
+    enabled: bool = True
+    memory_budget: int = 256 * 1024 * 1024
+    rebuild_interval: float = 60 * 60
+
+class NameIndexConfig(BaseModel):
+    enabled: bool = True
+
+class SnapshotConfig(BaseModel):
+    enabled: bool = True
+    interval: float = 15 * 60
+    compress: bool = True
+
+class MetricsConfig(BaseModel):
+    enabled: bool = True
+
+class SlowQueryLogConfig(BaseModel):
+    enabled: bool = True
+    threshold: float = 0.5
+
+    @property
+    def threshold_or_none(self) -> float | None:
+        return self.threshold if self.enabled else None
+
+class CacheConfig(BaseModel):
+    user_names: int = 100_000
+
+class WorkersConfig(BaseModel):
+    # 0 runs the API and the scraper together in this process. Anything more starts a supervisor that runs this many
+    # API processes sharing the port, plus one scraper process
+    api_workers: int = 0
+    # Part of the upstream rate limit the API processes split between them for live lookups, the scraper gets the rest
+    api_upstream_share: float = 0.25
+    socket_directory: str = "/tmp/vail-api"
+    health_check_interval: float = 5
+    health_check_timeout: float = 5
+    # Consecutive failed health checks before a worker is restarted
+    unhealthy_after: int = 3
+    # How long a new worker gets to build its indexes and pass a health check
+    startup_timeout: float = 15 * 60
+    # How long a stopping worker gets to finish the requests it is handling
+    shutdown_timeout: float = 30
+    # How often API processes pick up the names the scraper process saved
+    name_sync_interval: float = 30
+
 class WebhookAlertConfig(BaseModel):
     id: int
     token: str
@@ -45,10 +102,19 @@ class ScraperConfig(BaseModel):
     user_agent: str
 
     bans: BansConfig
+    accelbyte: AccelByteConfig = AccelByteConfig()
     user: ScraperUserConfig
     rate_limiter: RateLimitConfig
     database: DatabaseConfig
     alert_webhook: WebhookAlertConfig | None = None
+    rank_index: RankIndexConfig = RankIndexConfig()
+    cache: CacheConfig = CacheConfig()
+    name_index: NameIndexConfig = NameIndexConfig()
+    snapshot: SnapshotConfig = SnapshotConfig()
+    api_rate_limit: APIRateLimitConfig = APIRateLimitConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    slow_query_log: SlowQueryLogConfig = SlowQueryLogConfig()
+    workers: WorkersConfig = WorkersConfig()
 
 
 def load_config() -> ScraperConfig:
@@ -1,20 +1,63 @@
+import asyncio
+import gzip
+import json
+from logging import getLogger
+import time
 import typing
-from aiohttp import ClientResponse, ClientSession
+from aiohttp import ClientError, ClientResponse, ClientSession
 from urllib.parse import quote
 from vail_scraper.errors import ExternalServiceError, Service
 
 from vail_scraper.models.meilisearch import SearchResults
+from vail_scraper.utils.histogram import Histogram
+from vail_scraper.utils.request_timing import record_span
+
+_logger = getLogger(__name__)
+
+# Meilisearch tasks usually finish within a second, so start polling fast and back off for the big ones
+_TASK_POLL_INITIAL_DELAY: typing.Final[float] = 0.1
+_TASK_POLL_MAX_DELAY: typing.Final[float] = 5
+
+
+def _encode_documents(documents: list[typing.Any]) -> bytes:
+    ndjson = "".join(
+        json.dumps(document, separators=(",", ":")) + "\n" for document in documents
+    )
+    return gzip.compress(ndjson.encode(), compresslevel=5)
+
 
 class MeiliSearch:
-    def __init__(self, base_url: str) -> None:
+    def __init__(self, base_url: str, max_pending_tasks: int = 4) -> None:
         self._base_url: str = base_url
         self._session: ClientSession | None = None
+        # Stops ingestion from queueing up more work than meilisearch can index
+        self._pending_task_slots: asyncio.Semaphore = asyncio.Semaphore(max_pending_tasks)
+        self._pending_tasks: set[asyncio.Task[None]] = set()
+
+        # Stats
+        self.documents_sent: int = 0
+        self.documents_indexed: int = 0
+        self.bytes_sent: int = 0
+        self.failed_tasks: int = 0
+        self.indexing_seconds: float = 0
+        self.search_duration: Histogram = Histogram()
+        # Only the upload, indexing itself is tracked by indexing_seconds
+        self.ingest_duration: Histogram = Histogram()
+
+    @property
+    def pending_tasks(self) -> int:
+        return len(self._pending_tasks)
 
     async def _get_session(self) -> ClientSession:
         if self._session is None:
             self._session = ClientSession(base_url=self._base_url)
         return self._session
 
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
     async def _raise_for_status(self, response: ClientResponse):
         if not response.ok:
             raise ExternalServiceError(
@@ -22,16 +65,80 @@ class MeiliSearch:
                 response.status,
                 await response.text(),
             )
-    
+
     async def ingest_documents(self, index_name: str, primary_key: str, documents: list[typing.Any]) -> None:
         session = await self._get_session()
-        response = await session.post(f"/indexes/{quote(index_name)}/documents", params={"primaryKey": primary_key}, json=documents)
-        response.raise_for_status()
+        body = _encode_documents(documents)
+
+        await self._pending_task_slots.acquire()
+        started_at = time.perf_counter()
+        try:
+            async with session.post(
+                f"/indexes/{quote(index_name)}/documents",
+                params={"primaryKey": primary_key},
+                data=body,
+                headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+            ) as response:
+                await self._raise_for_status(response)
+                data = await response.json()
+            # Read in here so a response without it gives the slot back too
+            task_uid: int = data["taskUid"]
+        except:
+            self._pending_task_slots.release()
+            raise
+        finally:
+            self.ingest_duration.observe(time.perf_counter() - started_at)
+
+        self.documents_sent += len(documents)
+        self.bytes_sent += len(body)
+
+        # Indexing happens in the background on meilisearch's side, so track it without blocking the caller
+        task = asyncio.create_task(self._wait_for_task(task_uid))
+        self._pending_tasks.add(task)
+        task.add_done_callback(self._pending_tasks.discard)
+
+    async def _wait_for_task(self, task_uid: int) -> None:
+        started_at = time.perf_counter()
+        delay = _TASK_POLL_INITIAL_DELAY
+        try:
+            session = await self._get_session()
+            while True:
+                async with session.get(f"/tasks/{task_uid}") as response:
+                    await self._raise_for_status(response)
+                    task = await response.json()
+
+                status = task["status"]
+                if status == "succeeded":
+                    self.documents_indexed += task.get("details", {}).get("indexedDocuments") or 0
+                    return
+                if status in ("failed", "canceled"):
+                    self.failed_tasks += 1
+                    _logger.error("meilisearch task %s %s: %s", task_uid, status, task.get("error"))
+                    return
+
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _TASK_POLL_MAX_DELAY)
+        except (ExternalServiceError, ClientError, asyncio.TimeoutError, KeyError):
+            # Nothing awaits this task except wait_for_pending_tasks, so errors are counted here instead of raised
+            self.failed_tasks += 1
+            _logger.exception("failed to check the status of meilisearch task %s", task_uid)
+        finally:
+            self.indexing_seconds += time.perf_counter() - started_at
+            self._pending_task_slots.release()
+
+    async def wait_for_pending_tasks(self) -> None:
+        await asyncio.gather(*self._pending_tasks)
 
     async def search(self, index_name: str, query: str) -> SearchResults:
         session = await self._get_session()
-        response = await session.post(f"/indexes/{quote(index_name)}/search", json={"q": query})
-        await self._raise_for_status(response)
+        started_at = time.perf_counter()
+        try:
+            async with session.post(f"/indexes/{quote(index_name)}/search", json={"q": query}) as response:
+                await self._raise_for_status(response)
+                raw_data = await response.text()
+        finally:
+            duration = time.perf_counter() - started_at
+            self.search_duration.observe(duration)
+            record_span("meilisearch", duration)
 
-        raw_data = await response.text()
         return SearchResults.model_validate_json(raw_data)
@@ -8,6 +8,9 @@ from .migrations.add_cto_scores import AddCTOScoresMigration
 from .migrations.cto_scores_missing_pkey import CTOScoresMissingPKeyMigration
 from .migrations.save_stats_independently import SaveStatsIndependentlyMigration
 from .migrations.add_indexes import AddIndexesMigration
+from .migrations.add_leaderboard_index import AddLeaderboardIndexMigration
+from .migrations.create_game_stats_table import CreateGameStatsTableMigration
+from .migrations.add_change_tracking import AddChangeTrackingMigration
 
 _logger = getLogger(__name__)
 
@@ -17,7 +20,10 @@ MIGRATIONS: list[BaseMigration] = [
     AddCTOScoresMigration(),
     CTOScoresMissingPKeyMigration(),
     SaveStatsIndependentlyMigration(),
-    AddIndexesMigration()
+    AddIndexesMigration(),
+    AddLeaderboardIndexMigration(),
+    CreateGameStatsTableMigration(),
+    AddChangeTrackingMigration(),
 ]
 
 
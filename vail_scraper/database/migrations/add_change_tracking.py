@@ -0,0 +1,30 @@
+import aiosqlite
+
+from .base import BaseMigration
+
+
+class AddChangeTrackingMigration(BaseMigration):
+    @property
+    def migration_id(self) -> str:
+        return "add-change-tracking"
+
+    async def upgrade(self, connection: aiosqlite.Connection) -> None:
+        # Lets /api/v2/changes find everything written after a timestamp without scanning the whole database.
+        # Removed stats leave a row in deleted_stats so mirrors can delete them too
+        await connection.executescript("""
+            alter table users add column updated_at real not null default 0;
+            update users set updated_at = latest.updated_at
+                from (select cast(user_id as text) as user_id, max(updated_at) as updated_at from stats group by user_id) as latest
+                where latest.user_id = users.id;
+            create index users_updated_at on users(updated_at);
+            create index stats_updated_at on stats(updated_at);
+
+            create table deleted_stats (
+                code text not null,
+                user_id text not null,
+                deleted_at real not null,
+
+                primary key (code, user_id)
+            );
+            create index deleted_stats_deleted_at on deleted_stats(deleted_at);
+        """)
@@ -0,0 +1,16 @@
+import aiosqlite
+
+from .base import BaseMigration
+
+
+class AddLeaderboardIndexMigration(BaseMigration):
+    @property
+    def migration_id(self) -> str:
+        return "add-leaderboard-index"
+
+    async def upgrade(self, connection: aiosqlite.Connection) -> None:
+        # Lets leaderboards walk the index in order instead of sorting every user with a stat code.
+        # user_id is included to break ties in a stable order for cursor pagination
+        await connection.execute(
+            "create index stats_code_value on stats(code, value desc, user_id)"
+        )
@@ -0,0 +1,28 @@
+import time
+
+import aiosqlite
+
+from .base import BaseMigration
+
+
+class CreateGameStatsTableMigration(BaseMigration):
+    @property
+    def migration_id(self) -> str:
+        return "create-game-stats-table"
+
+    async def upgrade(self, connection: aiosqlite.Connection) -> None:
+        # Game wide totals per stat code. After this backfill the scraper keeps it up to date by applying the difference of every user update
+        await connection.execute(
+            """
+            create table game_stats (
+                code text primary key,
+                total real not null,
+                users integer not null,
+                updated_at real not null
+            )
+         """
+        )
+        await connection.execute(
+            "insert into game_stats (code, total, users, updated_at) select code, sum(value), count(*), ? from stats group by code",
+            [time.time()],
+        )
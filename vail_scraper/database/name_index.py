@@ -0,0 +1,175 @@
+import asyncio
+from bisect import bisect_left, insort
+from collections import Counter
+import heapq
+from logging import getLogger
+import sys
+import time
+
+import aiosqlite
+
+_logger = getLogger(__name__)
+
+
+def _get_trigrams(name: str) -> set[str]:
+    # Padded so short names and the start/end of names still get trigrams
+    padded = f"  {name} "
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+class UserNameIndex:
+    # In-process search over users.name. Prefix matches come from a sorted array, anything else is matched by shared trigrams.
+    # Used for autocomplete and as a fallback when meilisearch is unavailable
+    def __init__(self) -> None:
+        self.memory_usage: int = 0
+        self.last_build_duration: float | None = None
+        self.last_built_at: float | None = None
+        self._names: dict[str, str] = {}
+        self._sorted_names: list[tuple[str, str]] = []
+        self._trigrams: dict[str, set[str]] = {}
+        self._building: bool = False
+        self._pending_upserts: list[tuple[str, str]] = []
+
+    @property
+    def ready(self) -> bool:
+        return self.last_built_at is not None
+
+    async def build(self, connection: aiosqlite.Connection) -> None:
+        started_at = time.perf_counter()
+        self._building = True
+
+        names: dict[str, str] = {}
+        trigrams: dict[str, set[str]] = {}
+        try:
+            cursor = await connection.execute("select id, name from users")
+            while True:
+                rows = await cursor.fetchmany(10_000)
+                if len(rows) == 0:
+                    break
+
+                for user_id, name in rows:
+                    names[user_id] = name
+                    for trigram in _get_trigrams(name.lower()):
+                        trigrams.setdefault(trigram, set()).add(user_id)
+
+                await asyncio.sleep(0)  # Allow context switch
+            await cursor.close()
+        except:
+            self._building = False
+            self._pending_upserts.clear()
+            raise
+
+        self._names = names
+        self._trigrams = trigrams
+        self._sorted_names = sorted(
+            (name.lower(), user_id) for user_id, name in names.items()
+        )
+        self._building = False
+
+        # Users the scraper saved while this was building might have been missed by the query
+        for user_id, name in self._pending_upserts:
+            self.upsert(user_id, name)
+        self._pending_upserts.clear()
+
+        self.memory_usage = self._estimate_memory_usage()
+        self.last_built_at = time.time()
+        self.last_build_duration = time.perf_counter() - started_at
+        _logger.info(
+            "built user name index for %s users in %.2fs (~%s bytes)",
+            len(names),
+            self.last_build_duration,
+            self.memory_usage,
+        )
+
+    async def sync(self, connection: aiosqlite.Connection, since: float) -> list[aiosqlite.Row]:
+        # Picks up users saved by another process since a time, for API workers that don't run the scraper.
+        # Returns the rows it read so callers can update their caches too
+        cursor = await connection.execute("select id, name, updated_at from users where updated_at >= ?", [since])
+        rows = list(await cursor.fetchall())
+        await cursor.close()
+        for user_id, name, _ in rows:
+            self.upsert(user_id, name)
+        return rows
+
+    def _estimate_memory_usage(self) -> int:
+        # Rough, but good enough to spot the index growing out of hand. Names and ids are shared between the structures
+        memory_usage = sys.getsizeof(self._names) + sys.getsizeof(self._sorted_names)
+        for user_id, name in self._names.items():
+            memory_usage += sys.getsizeof(user_id) + sys.getsizeof(name)
+        for lowercase_name, _ in self._sorted_names:
+            memory_usage += sys.getsizeof(lowercase_name) + 56  # 2-tuple
+        memory_usage += sys.getsizeof(self._trigrams)
+        for trigram, user_ids in self._trigrams.items():
+            memory_usage += sys.getsizeof(trigram) + sys.getsizeof(user_ids)
+        return memory_usage
+
+    def upsert(self, user_id: str, name: str) -> None:
+        if self._building:
+            self._pending_upserts.append((user_id, name))
+            return
+        if not self.ready:
+            return
+
+        old_name = self._names.get(user_id)
+        if old_name == name:
+            return
+
+        if old_name is not None:
+            index = bisect_left(self._sorted_names, (old_name.lower(), user_id))
+            if index < len(self._sorted_names) and self._sorted_names[index] == (old_name.lower(), user_id):
+                del self._sorted_names[index]
+            for trigram in _get_trigrams(old_name.lower()):
+                user_ids = self._trigrams.get(trigram)
+                if user_ids is not None:
+                    user_ids.discard(user_id)
+
+        self._names[user_id] = name
+        insort(self._sorted_names, (name.lower(), user_id))
+        for trigram in _get_trigrams(name.lower()):
+            self._trigrams.setdefault(trigram, set()).add(user_id)
+
+    def prefix_search(self, prefix: str, limit: int) -> list[dict[str, str]]:
+        prefix = prefix.lower()
+        results: list[dict[str, str]] = []
+
+        index = bisect_left(self._sorted_names, (prefix,))
+        while index < len(self._sorted_names) and len(results) < limit:
+            lowercase_name, user_id = self._sorted_names[index]
+            if not lowercase_name.startswith(prefix):
+                break
+            results.append({"id": user_id, "name": self._names[user_id]})
+            index += 1
+        return results
+
+    def search(self, query: str, limit: int) -> list[dict[str, str]]:
+        results = self.prefix_search(query, limit)
+        if len(results) == limit:
+            return results
+        found_user_ids = {result["id"] for result in results}
+
+        # Rank the rest by how many trigrams they share with the query, rarest trigrams first
+        trigram_user_ids = sorted(
+            (self._trigrams.get(trigram, set()) for trigram in _get_trigrams(query.lower())), key=len
+        )
+        # Typos break up to 3 trigrams, so require at least half of them to match
+        minimum_matches = max(1, len(trigram_user_ids) // 2)
+
+        # A user sharing minimum_matches trigrams has to have one of the rarest len - minimum_matches + 1 of them.
+        # Only those are counted, the common ones like "  a" are just looked up for the users found that way
+        rare_trigrams = len(trigram_user_ids) - minimum_matches + 1
+        matches: Counter[str] = Counter()
+        for user_ids in trigram_user_ids[:rare_trigrams]:
+            matches.update(user_ids)
+        for user_ids in trigram_user_ids[rare_trigrams:]:
+            for user_id in matches:
+                if user_id in user_ids:
+                    matches[user_id] += 1
+
+        candidates = (
+            (user_id, match_count)
+            for user_id, match_count in matches.items()
+            if match_count >= minimum_matches and user_id not in found_user_ids
+        )
+        for user_id, _ in heapq.nlargest(limit - len(results), candidates, key=lambda candidate: candidate[1]):
+            results.append({"id": user_id, "name": self._names[user_id]})
+        return results
@@ -2,23 +2,60 @@ import csv
 import io
 from datetime import datetime
 from logging import getLogger
+import time
 from typing import Any
 from aiohttp import ClientSession, FormData
 from datetime import datetime
+import asyncpg
+
+from ..utils.histogram import Histogram
+from ..utils.request_timing import record_query
 
 _logger = getLogger(__name__)
 
 
+def build_ingest_csv(records: list[dict[str, Any]]) -> str:
+    # Every record has the same keys as the first one
+    file = io.StringIO()
+    writer = csv.DictWriter(file, records[0].keys())
+    writer.writeheader()
+    writer.writerows(records)
+    return file.getvalue()
+
+
 class QuestDBWrapper:
-    def __init__(self, base_url: str) -> None:
+    def __init__(self, base_url: str, slow_query_threshold: float | None = None) -> None:
         self._base_url: str = base_url
         self._session: ClientSession | None = None
+        # Queries slower than this many seconds go to the slow query log
+        self.slow_query_threshold: float | None = slow_query_threshold
+
+        # Stats
+        self.ingest_duration: Histogram = Histogram()
+        # Queries the API runs on the postgres interface, see InstrumentedQuestConnection
+        self.query_duration: Histogram = Histogram()
+        self.query_errors: int = 0
+
+    async def setup_postgres_connection(self, connection: "InstrumentedQuestConnection") -> None:
+        # Passed as init to asyncpg.create_pool, so every pooled connection reports its queries here
+        connection.quest_db = self
+
+    def record_query(self, query: str, args: tuple[Any, ...], duration: float, failed: bool) -> None:
+        self.query_duration.observe(duration)
+        if failed:
+            self.query_errors += 1
+        record_query("questdb", duration, query, args, self.slow_query_threshold)
 
     async def _get_session(self) -> ClientSession:
         if self._session is None:
             self._session = ClientSession(base_url=self._base_url)
         return self._session
 
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
     async def ingest(self, table_name: str, records: list[dict[str, Any]]) -> None:
         _logger.info("ingesting %s records into %s", len(records), table_name)
         if len(records) == 0:
@@ -33,29 +70,28 @@ class QuestDBWrapper:
         session = await self._get_session()
 
         _logger.debug("creating ingest csv")
-        file = io.StringIO()
-        writer = csv.DictWriter(file, records[0].keys())
-        writer.writeheader()
-        writer.writerows(records)
+        text = build_ingest_csv(records)
         _logger.debug("created ingest csv")
-        file.seek(0)
-        text = file.read()
 
         form = FormData()
         form.add_field("data", text, content_type="text/csv", filename="data.csv")
 
-        response = await session.post(
-            "/imp",
-            params={
-                "name": table_name,
-                "timestamp": "timestamp",
-                "fmt": "json",
-            },
-            data=form,
-        )
-        response.raise_for_status()
-
-        data = await response.json()
+        started_at = time.perf_counter()
+        try:
+            response = await session.post(
+                "/imp",
+                params={
+                    "name": table_name,
+                    "timestamp": "timestamp",
+                    "fmt": "json",
+                },
+                data=form,
+            )
+            response.raise_for_status()
+
+            data = await response.json()
+        finally:
+            self.ingest_duration.observe(time.perf_counter() - started_at)
         if data["status"] != "OK":
             raise UploadError(data["status"])
         _logger.debug("ingested successfully")
@@ -79,3 +115,30 @@ class QuestDBWrapper:
 
 class UploadError(Exception):
     pass
+
+
+class InstrumentedQuestConnection(asyncpg.Connection):
+    # Pass as connection_class to asyncpg.create_pool. Times queries right where they run, unlike asyncpg's query loggers
+    # which are called on a later loop iteration, when the request that ran the query might already have been answered.
+    # execute isn't timed since asyncpg uses it itself, to reset connections going back into the pool
+    quest_db: QuestDBWrapper | None = None
+
+    async def _timed(self, method: Any, query: str, args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+        started_at = time.perf_counter()
+        failed = True
+        try:
+            result = await method(query, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            if self.quest_db is not None:
+                self.quest_db.record_query(query, args, time.perf_counter() - started_at, failed)
+
+    async def fetch(self, query: str, *args: Any, **kwargs: Any) -> list[Any]:
+        return await self._timed(super().fetch, query, args, kwargs)
+
+    async def fetchrow(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        return await self._timed(super().fetchrow, query, args, kwargs)
+
+    async def fetchval(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        return await self._timed(super().fetchval, query, args, kwargs)
@@ -0,0 +1,225 @@
+import asyncio
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import accumulate
+from logging import getLogger
+import time
+import typing
+
+import aiosqlite
+
+from .sqlite_pool import SqliteReadPool
+
+_logger = getLogger(__name__)
+
+# Size of one value in an array("d")
+_VALUE_SIZE: typing.Final[int] = 8
+# Values per chunk of a _SortedColumn after a rebuild, a chunk is split in two once it has grown to twice this
+_CHUNK_SIZE: typing.Final[int] = 1024
+
+
+class StatRank(typing.NamedTuple):
+    rank: int
+    percentile: float
+    total: int
+
+
+class _SortedColumn:
+    # The values of one stat code, sorted and split into chunks. An insert or removal only moves the values of one chunk
+    # around instead of everything above it, which for popular stat codes is hundreds of kilobytes per changed value
+    def __init__(self, values: "array[float]") -> None:
+        self._chunks: list[array[float]] = [values[start:start + _CHUNK_SIZE] for start in range(0, len(values), _CHUNK_SIZE)]
+        self._maxes: list[float] = [chunk[-1] for chunk in self._chunks]
+        # Values in the chunks before each chunk, None until a rank needs it after a change
+        self._offsets: list[int] | None = None
+        self.length: int = len(values)
+
+    def add(self, value: float) -> None:
+        if len(self._chunks) == 0:
+            self._chunks.append(array("d", [value]))
+            self._maxes.append(value)
+        else:
+            # First chunk that doesn't end below it, or the last one if it is above everything
+            index = min(bisect_left(self._maxes, value), len(self._chunks) - 1)
+            chunk = self._chunks[index]
+            insort(chunk, value)
+            self._maxes[index] = chunk[-1]
+            if len(chunk) >= 2 * _CHUNK_SIZE:
+                self._chunks[index:index + 1] = [chunk[:_CHUNK_SIZE], chunk[_CHUNK_SIZE:]]
+                self._maxes[index:index + 1] = [chunk[_CHUNK_SIZE - 1], chunk[-1]]
+        self.length += 1
+        self._offsets = None
+
+    def remove(self, value: float) -> bool:
+        index = bisect_left(self._maxes, value)
+        if index == len(self._chunks):
+            return False
+        chunk = self._chunks[index]
+        position = bisect_left(chunk, value)
+        if chunk[position] != value:
+            return False
+
+        del chunk[position]
+        # Chunks that shrank aren't merged back together, the next rebuild evens them out
+        if len(chunk) == 0:
+            del self._chunks[index]
+            del self._maxes[index]
+        else:
+            self._maxes[index] = chunk[-1]
+        self.length -= 1
+        self._offsets = None
+        return True
+
+    def count_at_or_below(self, value: float) -> int:
+        if self._offsets is None:
+            self._offsets = list(accumulate((len(chunk) for chunk in self._chunks), initial=0))
+        # Every chunk before index is entirely at or below it, and every chunk after it entirely above
+        index = bisect_right(self._maxes, value)
+        count = self._offsets[index]
+        if index < len(self._chunks):
+            count += bisect_right(self._chunks[index], value)
+        return count
+
+
+class StatRankIndex:
+    # Keeps every value of every stat code sorted in memory, so a rank is two binary searches instead of a count(*) over the stats table.
+    # The scraper keeps it updated as it writes, and it is periodically rebuilt from the database to correct any drift.
+    def __init__(self, memory_budget: int) -> None:
+        self.memory_budget: typing.Final[int] = memory_budget
+        self.memory_usage: int = 0
+        self.last_rebuild_duration: float | None = None
+        self.last_rebuilt_at: float | None = None
+        self._values: dict[str, _SortedColumn] = {}
+        # Codes are loaded in order, so when the memory budget runs out every code from this one onwards is left out
+        self._unindexed_from: str | None = None
+        self._rebuild_lock: asyncio.Lock = asyncio.Lock()
+        self._rebuilding: bool = False
+        self._pending_updates: list[tuple[dict[str, float], dict[str, float]]] = []
+
+    @property
+    def ready(self) -> bool:
+        return self.last_rebuilt_at is not None
+
+    async def rebuild(self, connection: aiosqlite.Connection) -> None:
+        async with self._rebuild_lock:
+            started_at = time.perf_counter()
+            values: dict[str, array[float]] = {}
+            memory_usage = 0
+            over_budget_code: str | None = None
+            self._rebuilding = True
+
+            try:
+                # Walks the stats_code_value index, so the values come out pre-sorted (descending) per code
+                cursor = await connection.execute(
+                    "select code, value from stats order by code, value desc"
+                )
+                while True:
+                    rows = await cursor.fetchmany(10_000)
+                    if len(rows) == 0:
+                        break
+
+                    for stat_code, value in rows:
+                        column = values.get(stat_code)
+                        if column is None:
+                            column = values[stat_code] = array("d")
+                        column.append(value)
+
+                    memory_usage += len(rows) * _VALUE_SIZE
+                    if memory_usage > self.memory_budget:
+                        # The last code is only partially loaded, so it can't be used for ranks
+                        over_budget_code = rows[-1][0]
+                        memory_usage -= len(values.pop(over_budget_code)) * _VALUE_SIZE
+                        break
+
+                    await asyncio.sleep(0)  # Allow context switch
+                await cursor.close()
+            except:
+                self._rebuilding = False
+                self._pending_updates.clear()
+                raise
+
+            for column in values.values():
+                column.reverse()
+
+            self._values = {stat_code: _SortedColumn(column) for stat_code, column in values.items()}
+            self.memory_usage = memory_usage
+            self._unindexed_from = over_budget_code
+            self._rebuilding = False
+
+            # Users the scraper saved while this was reading might have been missed by the query.
+            # One saved right as the query started can end up counted twice, until the next rebuild
+            for old_user_stats, new_user_stats in self._pending_updates:
+                self._apply_update(old_user_stats, new_user_stats)
+            self._pending_updates.clear()
+            self.last_rebuilt_at = time.time()
+            self.last_rebuild_duration = time.perf_counter() - started_at
+
+            if over_budget_code is not None:
+                _logger.warning(
+                    "rank index hit its memory budget of %s bytes, stat codes from %s onwards are not indexed",
+                    self.memory_budget,
+                    over_budget_code,
+                )
+            _logger.info(
+                "rebuilt rank index for %s stat codes in %.2fs (%s bytes)",
+                len(values),
+                self.last_rebuild_duration,
+                self.memory_usage,
+            )
+
+    async def run_periodic_rebuilds(
+        self, database_read_pool: SqliteReadPool, interval: float
+    ) -> None:
+        while True:
+            try:
+                async with database_read_pool.acquire() as connection:
+                    await self.rebuild(connection)
+            except aiosqlite.Error:
+                _logger.exception("failed to rebuild the rank index")
+            await asyncio.sleep(interval)
+
+    def update(
+        self, old_user_stats: dict[str, float], new_user_stats: dict[str, float]
+    ) -> None:
+        if self._rebuilding:
+            self._pending_updates.append((old_user_stats, new_user_stats))
+        if not self.ready:
+            return
+        self._apply_update(old_user_stats, new_user_stats)
+
+    def _apply_update(
+        self, old_user_stats: dict[str, float], new_user_stats: dict[str, float]
+    ) -> None:
+        for stat_code in old_user_stats.keys() | new_user_stats.keys():
+            old_value = old_user_stats.get(stat_code)
+            new_value = new_user_stats.get(stat_code)
+            if old_value == new_value:
+                continue
+
+            column = self._values.get(stat_code)
+            if column is None:
+                # Only a code nobody had yet gets a column, for one left out by the memory budget a column with just
+                # this user's value would rank them first
+                if old_value is not None or new_value is None or self.memory_usage + _VALUE_SIZE > self.memory_budget:
+                    continue
+                if self._unindexed_from is not None and stat_code >= self._unindexed_from:
+                    continue
+                column = self._values[stat_code] = _SortedColumn(array("d"))
+
+            if old_value is not None and column.remove(old_value):
+                self.memory_usage -= _VALUE_SIZE
+            if new_value is not None:
+                column.add(new_value)
+                self.memory_usage += _VALUE_SIZE
+
+    def get_rank(self, stat_code: str, value: float) -> StatRank | None:
+        column = self._values.get(stat_code)
+        if column is None or column.length == 0:
+            return None
+
+        at_or_below = column.count_at_or_below(value)
+        return StatRank(
+            rank=column.length - at_or_below + 1,
+            percentile=at_or_below / column.length * 100,
+            total=column.length,
+        )
@@ -0,0 +1,101 @@
+import asyncio
+import gzip
+from logging import getLogger
+import os
+import shutil
+import time
+import typing
+
+import aiosqlite
+
+from ..errors import LockTimeoutError
+from ..utils.rw_lock import ReadWriteLock
+from .sqlite_pool import SqliteReadPool
+
+_logger = getLogger(__name__)
+
+# Seconds the checkpoint waits for the scraper's transaction in progress before skipping this round
+CHECKPOINT_LOCK_TIMEOUT: typing.Final[float] = 60
+
+
+def _compress_file(source_path: str, destination_path: str) -> None:
+    with open(source_path, "rb") as source, gzip.open(destination_path, "wb", compresslevel=6) as destination:
+        shutil.copyfileobj(source, destination, 1024 * 1024)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class DatabaseSnapshotter:
+    # Keeps a consistent copy of the database next to it for /db.sqlite, so downloads never hold a lock on the live database.
+    # Snapshots are swapped in with a rename, so a download that is already running keeps reading the old file
+    def __init__(self, database_path: str, compress: bool) -> None:
+        self.path: str = f"{database_path}.snapshot"
+        # FileResponse serves this instead when the client accepts gzip
+        self.compressed_path: str = f"{self.path}.gz"
+        self.compress: bool = compress
+        self.last_snapshot_at: float | None = None
+        self.last_snapshot_duration: float | None = None
+        self._snapshot_lock: asyncio.Lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.last_snapshot_at is not None or os.path.isfile(self.path)
+
+    async def take_snapshot(self, connection: aiosqlite.Connection) -> None:
+        async with self._snapshot_lock:
+            started_at = time.perf_counter()
+            temporary_path = f"{self.path}.tmp"
+            temporary_compressed_path = f"{self.compressed_path}.tmp"
+
+            # VACUUM INTO refuses to overwrite, so clean up after snapshots that were interrupted
+            await asyncio.to_thread(_remove_file, temporary_path)
+            # This only needs a read transaction, which doesn't block the writer in WAL mode
+            await connection.execute("vacuum into ?", [temporary_path])
+
+            if self.compress:
+                await asyncio.to_thread(_compress_file, temporary_path, temporary_compressed_path)
+                os.replace(temporary_compressed_path, self.compressed_path)
+            else:
+                await asyncio.to_thread(_remove_file, self.compressed_path)
+            os.replace(temporary_path, self.path)
+
+            self.last_snapshot_at = time.time()
+            self.last_snapshot_duration = time.perf_counter() - started_at
+            _logger.info("took database snapshot in %.2fs", self.last_snapshot_duration)
+
+    async def checkpoint(self, database: aiosqlite.Connection, database_lock: ReadWriteLock) -> None:
+        # A snapshot's read transaction keeps sqlite from checkpointing the WAL past it, so the WAL keeps growing while
+        # one runs. Truncating it afterwards can't be done with a transaction open on the connection, so this waits for
+        # the scraper's writes, which hold the lock shared, to commit
+        try:
+            async with database_lock.exclusive("snapshot.checkpoint", CHECKPOINT_LOCK_TIMEOUT):
+                cursor = await database.execute("pragma wal_checkpoint(truncate)")
+                busy, _, _ = await cursor.fetchone()  # type: ignore[misc]
+                await cursor.close()
+        except LockTimeoutError:
+            _logger.warning("timed out waiting for the database lock, skipping the WAL checkpoint")
+            return
+        except aiosqlite.OperationalError:
+            # The discoverer's reads go through this connection without the lock, they are short so it waits for the next one
+            _logger.debug("a statement is still running on the writer connection, skipping the WAL checkpoint")
+            return
+        if busy:
+            # Read pool connections in the middle of a query still need part of the WAL, the next checkpoint gets it
+            _logger.debug("WAL checkpoint couldn't finish, readers are still using it")
+
+    async def run_periodic_snapshots(
+        self, database_read_pool: SqliteReadPool, database: aiosqlite.Connection, database_lock: ReadWriteLock, interval: float
+    ) -> None:
+        while True:
+            try:
+                async with database_read_pool.acquire() as connection:
+                    await self.take_snapshot(connection)
+                await self.checkpoint(database, database_lock)
+            except (aiosqlite.Error, OSError):
+                _logger.exception("failed to take a database snapshot")
+            await asyncio.sleep(interval)
@@ -0,0 +1,56 @@
+import sqlite3
+import time
+import typing
+
+import aiosqlite
+from aiosqlite.context import contextmanager
+
+from ..utils.histogram import Histogram
+from ..utils.request_timing import record_query
+
+# Most queries are index lookups that finish well under a millisecond
+QUERY_BUCKETS: typing.Final[tuple[float, ...]] = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+
+
+class InstrumentedConnection(aiosqlite.Connection):
+    # Times every statement. Only the execute call is timed, that is where sqlite does the work for the queries we run
+    # (index lookups, sorting, aggregating), fetching the rows afterwards isn't included
+    def __init__(
+        self,
+        connector: typing.Callable[[], sqlite3.Connection],
+        iter_chunk_size: int,
+        query_duration: Histogram,
+        slow_query_threshold: float | None = None,
+    ) -> None:
+        super().__init__(connector, iter_chunk_size)
+        self.query_duration: Histogram = query_duration
+        # Statements slower than this many seconds go to the slow query log
+        self.slow_query_threshold: float | None = slow_query_threshold
+
+    @contextmanager
+    async def execute(self, sql: str, parameters: typing.Iterable[typing.Any] | None = None) -> aiosqlite.Cursor:
+        started_at = time.perf_counter()
+        try:
+            return await super().execute(sql, parameters)
+        finally:
+            self._record(sql, parameters, time.perf_counter() - started_at)
+
+    @contextmanager
+    async def executemany(self, sql: str, parameters: typing.Iterable[typing.Iterable[typing.Any]]) -> aiosqlite.Cursor:
+        started_at = time.perf_counter()
+        try:
+            return await super().executemany(sql, parameters)
+        finally:
+            self._record(sql, parameters, time.perf_counter() - started_at)
+
+    def _record(self, sql: str, parameters: typing.Any, duration: float) -> None:
+        self.query_duration.observe(duration)
+        record_query("sqlite", duration, sql, parameters, self.slow_query_threshold)
+
+
+def connect(database: str, query_duration: Histogram, slow_query_threshold: float | None = None, **kwargs: typing.Any) -> InstrumentedConnection:
+    # aiosqlite.connect, but for an InstrumentedConnection
+    def connector() -> sqlite3.Connection:
+        return sqlite3.connect(database, **kwargs)
+
+    return InstrumentedConnection(connector, 64, query_duration, slow_query_threshold)
@@ -0,0 +1,71 @@
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+import time
+from typing import AsyncGenerator
+
+import aiosqlite
+
+from ..utils.histogram import Histogram
+from ..utils.request_timing import record_span
+from .sqlite_connection import QUERY_BUCKETS, InstrumentedConnection, connect
+
+
+class SqliteReadPool:
+    # Read only connections for the API, so reads don't queue up behind the scraper's writes on the writer connection's thread.
+    # This relies on the database being in WAL mode, where readers and the writer don't block each other
+    def __init__(self, connections: list[aiosqlite.Connection], query_duration: Histogram, owns_connections: bool = True) -> None:
+        self.size: int = len(connections)
+        self._owns_connections: bool = owns_connections
+        self._connections: list[aiosqlite.Connection] = connections
+        self._idle_connections: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        for connection in connections:
+            self._idle_connections.put_nowait(connection)
+
+        # Stats
+        # Shared by every connection in the pool
+        self.query_duration: Histogram = query_duration
+        self.acquisitions: int = 0
+        self.wait_seconds: float = 0
+        self.max_wait_seconds: float = 0
+
+    @classmethod
+    async def open(cls, url: str, size: int, writer: InstrumentedConnection) -> "SqliteReadPool":
+        if url == ":memory:":
+            # In-memory databases can't be shared between connections
+            return cls([writer], writer.query_duration, owns_connections=False)
+
+        uri = Path(url).absolute().as_uri() + "?mode=ro"
+        query_duration = Histogram(QUERY_BUCKETS)
+        connections: list[aiosqlite.Connection] = []
+        for _ in range(size):
+            connection = await connect(uri, query_duration, writer.slow_query_threshold, uri=True)
+            connection.row_factory = aiosqlite.Row
+            connections.append(connection)
+        return cls(connections, query_duration)
+
+    @property
+    def idle(self) -> int:
+        return self._idle_connections.qsize()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncGenerator[aiosqlite.Connection, None]:
+        started_at = time.perf_counter()
+        connection = await self._idle_connections.get()
+
+        waited = time.perf_counter() - started_at
+        self.acquisitions += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        record_span("sqlite_wait", waited)
+
+        try:
+            yield connection
+        finally:
+            self._idle_connections.put_nowait(connection)
+
+    async def close(self) -> None:
+        if not self._owns_connections:
+            return
+        for connection in self._connections:
+            await connection.close()
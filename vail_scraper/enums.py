@@ -1,6 +1,13 @@
-from enum import IntEnum
+from enum import IntEnum, StrEnum
 
 
 class RequestPriority(IntEnum):
     NORMAL = 0
     HIGH = -10
+
+
+class SampleFill(StrEnum):
+    NONE = "none"
+    NULL = "null"
+    PREV = "prev"
+    LINEAR = "linear"
@@ -13,12 +13,22 @@ class NoContentPageBug(Exception):
         super().__init__("204 from page!")
 
 
+class LockTimeoutError(TimeoutError):
+    def __init__(self, site: str, timeout: float) -> None:
+        self.site: str = site
+        super().__init__(f"{site} could not get the lock within {timeout}s")
+
+
 class APIErrorCode(StrEnum):
     USER_NOT_FOUND = "user_not_found"
     RATE_LIMITED = "rate_limited"
     QUERY_PARAMETER_INVALID = "query_parameter_invalid"
     MUTUALLY_EXCLUSIVE_QUERY_PARAMETERS = "mutually_exclusive_query_parameters"
     MISSING_QUERY_PARAMETER = "missing_query_parameter"
+    RANKS_UNAVAILABLE = "ranks_unavailable"
+    BODY_INVALID = "body_invalid"
+    SEARCH_UNAVAILABLE = "search_unavailable"
+    SNAPSHOT_UNAVAILABLE = "snapshot_unavailable"
 
 
 class AccelByteErrorCode(IntEnum):
@@ -0,0 +1,7 @@
+import typing
+from pydantic import BaseModel, Field
+
+MAX_BATCH_SIZE: typing.Final[int] = 100
+
+class BatchUserIdsRequest(BaseModel):
+    ids: list[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
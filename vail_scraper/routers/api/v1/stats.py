@@ -1,13 +1,13 @@
 import time
 
 from aiohttp import web
-from slowstack.asynchronous.times_per import TimesPerRateLimiter
 
 from ....models.accelbyte import AccelByteStatCode
 from ....errors import APIErrorCode
 from .... import app_keys
 from ....utils.rate_limit import rate_limit_http
 from ....utils.cors import api_cors
+from ....utils.json_response import json_response
 
 
 router = web.RouteTableDef()
@@ -15,7 +15,8 @@ router = web.RouteTableDef()
 
 @router.get("/api/v1/users/{user_id}/stats")
 @api_cors
-@rate_limit_http(lambda: TimesPerRateLimiter(5, 5))
+# A live AccelByte lookup like /api/v2/users/{user_id}/stats, so it costs the same
+@rate_limit_http(12)
 async def get_stats_for_user(request: web.Request) -> web.StreamResponse:
     vail_client = request.app[app_keys.ACCEL_BYTE_CLIENT]
 
@@ -23,13 +24,13 @@ async def get_stats_for_user(request: web.Request) -> web.StreamResponse:
 
     user_stats = await vail_client.get_user_stats(user_id)
     if user_stats is None:
-        return web.json_response(
+        return json_response(
             {"detail": "user not found", "code": APIErrorCode.USER_NOT_FOUND}
         )
 
     updated_at = time.time()
 
-    return web.json_response(
+    return json_response(
         {
             "general": {
                 "stats": {
@@ -3,6 +3,9 @@ from .users import router as users_router
 from .stats import router as stats_router
 from .game_stats import router as game_stats_router
 from .openapi import router as openapi_router
+from .exports import router as exports_router
+from .leaderboards import router as leaderboards_router
+from .changes import router as changes_router
 
 router = CombinerRouteTableDef()
 
@@ -10,3 +13,6 @@ router.add_router(users_router)
 router.add_router(stats_router)
 router.add_router(game_stats_router)
 router.add_router(openapi_router)
+router.add_router(exports_router)
+router.add_router(leaderboards_router)
+router.add_router(changes_router)
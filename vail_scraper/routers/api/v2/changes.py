@@ -0,0 +1,135 @@
+import time
+import typing
+
+from aiohttp import web
+
+from ....errors import APIErrorCode
+from .... import app_keys
+from ....utils.cursor import decode_cursor, encode_cursor
+from ....utils.ndjson import NDJSONWriter, prepare_ndjson_response
+from ....utils.rate_limit import rate_limit_http
+from ....utils.cors import api_cors
+from ....utils.json_response import json_response
+
+router = web.RouteTableDef()
+
+DEFAULT_CHANGES_LIMIT: typing.Final[int] = 10_000
+MAX_CHANGES_LIMIT: typing.Final[int] = 100_000
+# Rows are timestamped right before they are committed, this gives those writes time to land before a cursor moves past them
+CHANGES_SETTLE_SECONDS: typing.Final[float] = 5
+
+_KIND_USER: typing.Final[int] = 0
+_KIND_STAT: typing.Final[int] = 1
+_KIND_STAT_DELETED: typing.Final[int] = 2
+
+
+@router.get("/api/v2/changes")
+@api_cors
+@rate_limit_http(10)
+async def export_changes(request: web.Request) -> web.StreamResponse:
+    database_read_pool = request.app[app_keys.DATABASE_READ_POOL]
+
+    raw_cursor = request.query.getone("cursor", None)
+    raw_since = request.query.getone("since", None)
+
+    if raw_cursor is not None and raw_since is not None:
+        return json_response({"code": APIErrorCode.MUTUALLY_EXCLUSIVE_QUERY_PARAMETERS, "detail": "you can only pass cursor or since, not both"}, status=400)
+
+    # Position of the last row sent, rows are ordered by (updated_at, kind, user_id, code).
+    # Starting after the last kind of a timestamp means everything after it
+    if raw_cursor is not None:
+        try:
+            cursor = decode_cursor(raw_cursor)
+            position = (float(cursor["updated_at"]), int(cursor["kind"]), str(cursor["user_id"]), str(cursor["code"]))
+        except (ValueError, KeyError, TypeError) as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the cursor parameter: {error}", "field": "cursor"}, status=400)
+    elif raw_since is not None:
+        try:
+            position = (float(raw_since), _KIND_STAT_DELETED + 1, "", "")
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the since parameter: {error}", "field": "since"}, status=400)
+    else:
+        position = (-1.0, _KIND_STAT_DELETED + 1, "", "")
+
+    # Limit
+    try:
+        limit = int(request.query.getone("limit"))
+    except KeyError:
+        limit = DEFAULT_CHANGES_LIMIT
+    except ValueError as error:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the limit parameter: {error}", "field": "limit"}, status=400)
+
+    if limit <= 0:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must be more than 0", "field": "limit"}, status=400)
+    if limit > MAX_CHANGES_LIMIT:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"the limit parameter must not be more than {MAX_CHANGES_LIMIT}", "field": "limit"}, status=400)
+
+    since = position[0]
+    until = time.time() - CHANGES_SETTLE_SECONDS
+
+    response = await prepare_ndjson_response(request)
+    writer = NDJSONWriter(response)
+
+    row_count = 0
+    done = True
+
+    async with database_read_pool.acquire() as database:
+        # The rows have to be sorted, so only look at the range the next page can come from instead of everything after since.
+        # stats is by far the biggest table, so end the range where it has limit rows
+        window_start_operator = ">" if position[1] > _KIND_STAT_DELETED else ">="
+        result = await database.execute(
+            f"select updated_at from stats where updated_at {window_start_operator} ? and updated_at <= ? order by updated_at limit 1 offset ?",
+            [since, until, limit],
+        )
+        row = await result.fetchone()
+        window_end = until if row is None else row[0]
+
+        # Every branch has its own range condition so each one walks its updated_at index
+        result = await database.execute(
+            """
+            select * from (
+                select updated_at, 0 as kind, id as user_id, '' as code, name, null as value from users where updated_at >= ? and updated_at <= ?
+                union all
+                select updated_at, 1, cast(user_id as text), code, null, value from stats where updated_at >= ? and updated_at <= ?
+                union all
+                select deleted_at, 2, user_id, code, null, null from deleted_stats where deleted_at >= ? and deleted_at <= ?
+            )
+            where (updated_at, kind, user_id, code) > (?, ?, ?, ?)
+            order by updated_at, kind, user_id, code
+            limit ?
+            """,
+            [since, window_end, since, window_end, since, window_end, *position, limit + 1],
+        )
+        while True:
+            rows = await result.fetchmany(1000)
+            if len(rows) == 0:
+                break
+
+            for row in rows:
+                if row_count == limit:
+                    done = False
+                    break
+
+                updated_at, kind, user_id, stat_code, name, value = row
+                if kind == _KIND_USER:
+                    await writer.write({"type": "user", "id": user_id, "name": name, "updated_at": updated_at})
+                elif kind == _KIND_STAT:
+                    await writer.write({"type": "stat", "user_id": user_id, "code": stat_code, "value": value, "updated_at": updated_at})
+                else:
+                    await writer.write({"type": "stat_deleted", "user_id": user_id, "code": stat_code, "updated_at": updated_at})
+                position = (updated_at, kind, user_id, stat_code)
+                row_count += 1
+
+            if not done:
+                break
+        await result.close()
+
+    if done:
+        # Everything up to the end of the range was sent, so the next request can start from there even if the last rows were older
+        position = max(position, (window_end, _KIND_STAT_DELETED + 1, "", ""))
+        done = window_end == until
+
+    next_cursor = encode_cursor({"updated_at": position[0], "kind": position[1], "user_id": position[2], "code": position[3]})
+    await writer.write({"cursor": next_cursor, "done": done})
+    await writer.close()
+    return response
@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta
+import typing
+
+from aiohttp import web
+
+from ....errors import APIErrorCode
+from .... import app_keys
+from ....utils.cursor import decode_cursor, encode_cursor
+from ....utils.ndjson import NDJSONWriter, prepare_ndjson_response
+from ....utils.rate_limit import rate_limit_http
+from ....utils.cors import api_cors
+from ....utils.json_response import json_response
+
+router = web.RouteTableDef()
+
+DEFAULT_EXPORT_LIMIT: typing.Final[int] = 10_000
+MAX_EXPORT_LIMIT: typing.Final[int] = 100_000
+# How many rows asyncpg fetches from the cursor at a time
+_PREFETCH: typing.Final[int] = 1000
+_EPOCH: typing.Final[datetime] = datetime(1970, 1, 1)
+
+
+def _to_cursor(timestamp: datetime) -> str:
+    # QuestDB timestamps are microsecond precision, keep them exact so resuming never skips or repeats a row
+    return encode_cursor({"after": (timestamp - _EPOCH) // timedelta(microseconds=1)})
+
+
+def _from_cursor(cursor: str) -> datetime:
+    data = decode_cursor(cursor)
+    after = data.get("after")
+    if not isinstance(after, int):
+        raise ValueError("malformed cursor")
+    return _EPOCH + timedelta(microseconds=after)
+
+
+def _parse_export_range(request: web.Request) -> tuple[datetime | None, datetime | None, int] | web.Response:
+    raw_cursor = request.query.getone("cursor", None)
+    raw_after_timestamp = request.query.getone("after", None)
+    raw_before_timestamp = request.query.getone("before", None)
+
+    if raw_cursor is not None and raw_after_timestamp is not None:
+        return json_response({"code": APIErrorCode.MUTUALLY_EXCLUSIVE_QUERY_PARAMETERS, "detail": "you can only pass cursor or after, not both"}, status=400)
+
+    after_timestamp: datetime | None = None
+    before_timestamp: datetime | None = None
+
+    if raw_cursor is not None:
+        try:
+            after_timestamp = _from_cursor(raw_cursor)
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the cursor parameter: {error}", "field": "cursor"}, status=400)
+    elif raw_after_timestamp is not None:
+        try:
+            after_timestamp = datetime.fromtimestamp(float(raw_after_timestamp))
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the after parameter: {error}", "field": "after"}, status=400)
+
+    if raw_before_timestamp is not None:
+        try:
+            before_timestamp = datetime.fromtimestamp(float(raw_before_timestamp))
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the before parameter: {error}", "field": "before"}, status=400)
+
+    # Limit
+    try:
+        limit = int(request.query.getone("limit"))
+    except KeyError:
+        limit = DEFAULT_EXPORT_LIMIT
+    except ValueError as error:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the limit parameter: {error}", "field": "limit"}, status=400)
+
+    if limit <= 0:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must be more than 0", "field": "limit"}, status=400)
+    if limit > MAX_EXPORT_LIMIT:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"the limit parameter must not be more than {MAX_EXPORT_LIMIT}", "field": "limit"}, status=400)
+
+    return after_timestamp, before_timestamp, limit
+
+
+def _build_where_clause(conditions: list[str], arguments: list[typing.Any], after_timestamp: datetime | None, before_timestamp: datetime | None) -> str:
+    if after_timestamp is not None:
+        arguments.append(after_timestamp)
+        conditions.append(f"timestamp > ${len(arguments)}")
+    if before_timestamp is not None:
+        arguments.append(before_timestamp)
+        conditions.append(f"timestamp < ${len(arguments)}")
+
+    if len(conditions) == 0:
+        return ""
+    return "where " + " and ".join(conditions)
+
+
+@router.get("/api/v2/users/{user_id}/stats/timeseries/export")
+@api_cors
+@rate_limit_http(10)
+async def export_timeseries_stats_for_user(request: web.Request) -> web.StreamResponse:
+    database_read_pool = request.app[app_keys.DATABASE_READ_POOL]
+    quest_db = request.app[app_keys.QUEST_DB_POSTGRES]
+
+    user_id = request.match_info["user_id"]
+
+    parsed_range = _parse_export_range(request)
+    if isinstance(parsed_range, web.Response):
+        return parsed_range
+    after_timestamp, before_timestamp, limit = parsed_range
+
+    # Check if user exists
+    async with database_read_pool.acquire() as database:
+        result = await database.execute("select count(*) from users where id = ?", [user_id])
+        row = await result.fetchone()
+    assert row is not None
+    if row[0] == 0:
+        return json_response({"code": APIErrorCode.USER_NOT_FOUND, "detail": "user not found/not scraped yet."}, status=404)
+
+    arguments: list[typing.Any] = [user_id]
+    where_clause = _build_where_clause(["user_id = $1"], arguments, after_timestamp, before_timestamp)
+
+    response = await prepare_ndjson_response(request)
+    writer = NDJSONWriter(response)
+
+    # Rows of the same scrape share a timestamp, so they are grouped into one line per snapshot as they come off the cursor
+    snapshot_count = 0
+    snapshot_timestamp: datetime | None = None
+    snapshot_stats: dict[str, float] = {}
+    last_timestamp = after_timestamp
+    done = True
+
+    async with quest_db.acquire() as connection:
+        async with connection.transaction():
+            async for record in connection.cursor(f"select timestamp, code, value from user_stats {where_clause} order by timestamp asc", *arguments, prefetch=_PREFETCH):
+                timestamp = record[0]
+
+                if timestamp != snapshot_timestamp:
+                    if snapshot_timestamp is not None:
+                        await writer.write({"timestamp": str(snapshot_timestamp.timestamp()), "stats": snapshot_stats})
+                        last_timestamp = snapshot_timestamp
+                        snapshot_count += 1
+                    if snapshot_count == limit:
+                        done = False
+                        break
+                    snapshot_timestamp = timestamp
+                    snapshot_stats = {}
+
+                snapshot_stats[record[1]] = record[2]
+            else:
+                if snapshot_timestamp is not None:
+                    await writer.write({"timestamp": str(snapshot_timestamp.timestamp()), "stats": snapshot_stats})
+                    last_timestamp = snapshot_timestamp
+
+    await writer.write({"cursor": None if last_timestamp is None else _to_cursor(last_timestamp), "done": done})
+    await writer.close()
+    return response
+
+
+@router.get("/api/v2/game/user-count/timeseries/export")
+@api_cors
+@rate_limit_http(10)
+async def export_user_count_time_series(request: web.Request) -> web.StreamResponse:
+    quest_db = request.app[app_keys.QUEST_DB_POSTGRES]
+
+    parsed_range = _parse_export_range(request)
+    if isinstance(parsed_range, web.Response):
+        return parsed_range
+    after_timestamp, before_timestamp, limit = parsed_range
+
+    arguments: list[typing.Any] = []
+    where_clause = _build_where_clause([], arguments, after_timestamp, before_timestamp)
+
+    response = await prepare_ndjson_response(request)
+    writer = NDJSONWriter(response)
+
+    row_count = 0
+    last_timestamp = after_timestamp
+    done = True
+
+    async with quest_db.acquire() as connection:
+        async with connection.transaction():
+            # Fetch one extra row to know if there is more after this page
+            async for record in connection.cursor(f"select timestamp, count from user_count {where_clause} order by timestamp asc limit {limit + 1}", *arguments, prefetch=_PREFETCH):
+                if row_count == limit:
+                    done = False
+                    break
+                await writer.write({"timestamp": str(record[0].timestamp()), "count": record[1]})
+                last_timestamp = record[0]
+                row_count += 1
+
+    await writer.write({"cursor": None if last_timestamp is None else _to_cursor(last_timestamp), "done": done})
+    await writer.close()
+    return response
@@ -1,35 +1,75 @@
 from datetime import datetime
+import typing
 from aiohttp import web
 
 from vail_scraper.errors import APIErrorCode
 
 from .... import app_keys
+from ....enums import SampleFill
 from ....utils.cors import api_cors
+from ....utils.http_cache import cache_control
+from ....utils.sample_by import parse_fill, parse_resolution, sample_by_clause
+from ....utils.json_response import EncodedJSON, json_response
+from .stats import format_user_stats
 
 router = web.RouteTableDef()
+_game_stats_payload: tuple[tuple[tuple[typing.Any, ...], ...], float, EncodedJSON] | None = None
 
 
 @router.get("/api/v2/game/user-count")
 @api_cors
+@cache_control(60)
 async def get_user_count(request: web.Request) -> web.StreamResponse:
-    db = request.app[app_keys.DATABASE]
+    database_read_pool = request.app[app_keys.DATABASE_READ_POOL]
 
-    result = await db.execute("select count(*) from users")
-    row = await result.fetchone()
+    async with database_read_pool.acquire() as db:
+        result = await db.execute("select count(*) from users")
+        row = await result.fetchone()
     assert row is not None, "missing result from count(*) query"
     
-    return web.json_response({"count": row[0]})
+    return json_response({"count": row[0]})
+
+@router.get("/api/v2/game/stats")
+@api_cors
+@cache_control(60)
+async def get_game_stats(request: web.Request) -> web.StreamResponse:
+    database_read_pool = request.app[app_keys.DATABASE_READ_POOL]
+
+    # game_stats is kept up to date by the scraper, so this only reads one row per stat code
+    async with database_read_pool.acquire() as db:
+        result = await db.execute("select code, total, users, updated_at from game_stats")
+        rows = await result.fetchall()
+
+    # game_stats only changes when the scraper writes, so the encoded response is reused until the rows change
+    global _game_stats_payload
+    rows_key = tuple(tuple(row) for row in rows)
+    if _game_stats_payload is None or _game_stats_payload[0] != rows_key:
+        totals: dict[str, float] = {}
+        stats = {}
+        updated_at = 0
+        for row in rows:
+            totals[row[0]] = row[1]
+            stats[row[0]] = {"total": row[1], "users": row[2], "average": row[1] / row[2] if row[2] != 0 else 0}
+            updated_at = max(updated_at, row[3])
+        _game_stats_payload = (rows_key, updated_at, EncodedJSON({"totals": format_user_stats(totals), "stats": stats, "updated_at": updated_at}))
+
+    _, updated_at, payload = _game_stats_payload
+    response = payload.to_response()
+    if updated_at != 0:
+        response.last_modified = updated_at
+    return response
 
 @router.get("/api/v2/game/user-count/timeseries")
 @api_cors
+@cache_control(60)
 async def get_user_count_time_series(request: web.Request) -> web.StreamResponse:
     db = request.app[app_keys.QUEST_DB_POSTGRES]
 
-    raw_before_timestamp = request.query.getone("before")
-    raw_after_timestamp = request.query.getone("after")
+    raw_before_timestamp = request.query.getone("before", None)
+    raw_after_timestamp = request.query.getone("after", None)
 
     if raw_before_timestamp is not None and raw_after_timestamp is not None:
-        return web.json_response({"code": APIErrorCode.MUTUALLY_EXCLUSIVE_QUERY_PARAMETERS, "detail": "you can only pass before or after, not both"}, status=400)
+        return json_response({"code": APIErrorCode.MUTUALLY_EXCLUSIVE_QUERY_PARAMETERS, "detail": "you can only pass before or after, not both"}, status=400)
     
     # Limit
     try:
@@ -37,35 +77,59 @@ async def get_user_count_time_series(request: web.Request) -> web.StreamResponse
     except KeyError:
         limit = 100
     except ValueError as error:
-        return web.json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the limit parameter: {error}", "field": "limit"}, status=400)
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the limit parameter: {error}", "field": "limit"}, status=400)
 
     if limit <= 0:
-        return web.json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must be more than 0", "field": "limit"}, status=400)
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must be more than 0", "field": "limit"}, status=400)
     if limit > 100:
-        return web.json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must not be more than 100", "field": "limit"}, status=400)
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must not be more than 100", "field": "limit"}, status=400)
+
+    # Downsampling
+    raw_resolution = request.query.getone("resolution", None)
+    raw_fill = request.query.getone("fill", None)
+
+    if raw_fill is not None and raw_resolution is None:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the fill parameter can only be used together with resolution", "field": "fill"}, status=400)
+
+    # Every query below selects (timestamp, count) from this
+    source = "user_count"
+    if raw_resolution is not None:
+        try:
+            resolution_amount, resolution_unit = parse_resolution(raw_resolution)
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the resolution parameter: {error}", "field": "resolution"}, status=400)
+        try:
+            fill = parse_fill(raw_fill or SampleFill.NONE)
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the fill parameter: {error}", "field": "fill"}, status=400)
+
+        source = f"(select timestamp, last(count) as count from user_count {{where}} {sample_by_clause(resolution_amount, resolution_unit, fill)})"
 
     if raw_before_timestamp is not None:
         try:
             before_timestamp = datetime.fromtimestamp(float(raw_before_timestamp))
         except ValueError as error:
-            return web.json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the before parameter: {error}", "field": "before"}, status=400)
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the before parameter: {error}", "field": "before"}, status=400)
 
-        rows = await db.fetch("select timestamp, count from user_count where timestamp < $1 order by timestamp desc limit $2", before_timestamp, limit)
+        source = source.format(where="where timestamp < $1")
+        rows = await db.fetch(f"select timestamp, count from {source} where timestamp < $1 order by timestamp desc limit $2", before_timestamp, limit)
     elif raw_after_timestamp is not None:
         try:
             after_timestamp = datetime.fromtimestamp(float(raw_after_timestamp))
         except ValueError as error:
-            return web.json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the after parameter: {error}", "field": "before"}, status=400)
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the after parameter: {error}", "field": "before"}, status=400)
 
-        rows = await db.fetch("select timestamp, count from user_count where timestamp > $1 order by timestamp asc limit $2", after_timestamp, limit)
+        source = source.format(where="where timestamp > $1")
+        rows = await db.fetch(f"select timestamp, count from {source} where timestamp > $1 order by timestamp asc limit $2", after_timestamp, limit)
     else:
-        rows = await db.fetch("select timestamp, count from user_count order by timestamp desc limit $1", limit)
+        source = source.format(where="")
+        rows = await db.fetch(f"select timestamp, count from {source} order by timestamp desc limit $1", limit)
     
 
     items = []
 
     for row in rows:
-        items.append({"timestamp": str(row[0].timestamp()), "count": row[1]})
+        items.append({"timestamp": str(row[0].timestamp()), "count": None if row[1] is None else int(row[1])})
 
-    return web.json_response({"items": items})
+    return json_response({"items": items})
     
@@ -0,0 +1,131 @@
+import typing
+
+from aiohttp import web
+
+from ....errors import APIErrorCode
+from .... import app_keys
+from ....utils.cursor import decode_cursor, encode_cursor
+from ....utils.cors import api_cors
+from ....utils.http_cache import cache_control
+from ....utils.json_response import json_response
+from ....utils.rate_limit import rate_limit_http
+
+router = web.RouteTableDef()
+
+DEFAULT_LEADERBOARD_LIMIT: typing.Final[int] = 50
+MAX_LEADERBOARD_LIMIT: typing.Final[int] = 100
+# Offsets make sqlite step over every rank before them, past this cursors have to be used
+MAX_LEADERBOARD_OFFSET: typing.Final[int] = 10_000
+
+
+@router.get("/api/v2/leaderboards/{stat_code}")
+@api_cors
+@cache_control(60)
+@rate_limit_http(1)
+async def get_leaderboard(request: web.Request) -> web.StreamResponse:
+    database_read_pool = request.app[app_keys.DATABASE_READ_POOL]
+
+    stat_code = request.match_info["stat_code"]
+
+    raw_offset = request.query.getone("offset", None)
+    raw_cursor = request.query.getone("cursor", None)
+
+    if raw_offset is not None and raw_cursor is not None:
+        return json_response({"code": APIErrorCode.MUTUALLY_EXCLUSIVE_QUERY_PARAMETERS, "detail": "you can only pass offset or cursor, not both"}, status=400)
+
+    # Limit
+    try:
+        limit = int(request.query.getone("limit"))
+    except KeyError:
+        limit = DEFAULT_LEADERBOARD_LIMIT
+    except ValueError as error:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the limit parameter: {error}", "field": "limit"}, status=400)
+
+    if limit <= 0:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must be more than 0", "field": "limit"}, status=400)
+    if limit > MAX_LEADERBOARD_LIMIT:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"the limit parameter must not be more than {MAX_LEADERBOARD_LIMIT}", "field": "limit"}, status=400)
+
+    # Both queries walk the stats_code_value index, the cursor one seeks straight to where the last page stopped.
+    # stats.user_id doesn't have text affinity, so it has to be cast for the join to use the users primary key
+    if raw_cursor is not None:
+        try:
+            cursor = decode_cursor(raw_cursor)
+            last_value = float(cursor["value"])
+            last_user_id = str(cursor["user_id"])
+            last_rank = int(cursor["rank"])
+        except (ValueError, KeyError, TypeError) as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the cursor parameter: {error}", "field": "cursor"}, status=400)
+
+        query = """
+            select stats.user_id, stats.value, users.name from stats
+            left join users on users.id = cast(stats.user_id as text)
+            where stats.code = ? and stats.value <= ? and (stats.value < ? or stats.user_id > ?)
+            order by stats.value desc, stats.user_id asc
+            limit ?
+            """
+        arguments = [stat_code, last_value, last_value, last_user_id, limit]
+    else:
+        try:
+            offset = int(raw_offset or 0)
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the offset parameter: {error}", "field": "offset"}, status=400)
+        if offset < 0:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the offset parameter must not be negative", "field": "offset"}, status=400)
+        if offset > MAX_LEADERBOARD_OFFSET:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"the offset parameter must not be more than {MAX_LEADERBOARD_OFFSET}, use the cursor parameter to go further", "field": "offset"}, status=400)
+        last_rank = offset
+
+        query = """
+            select stats.user_id, stats.value, users.name from stats
+            left join users on users.id = cast(stats.user_id as text)
+            where stats.code = ?
+            order by stats.value desc, stats.user_id asc
+            limit ? offset ?
+            """
+        arguments = [stat_code, limit, offset]
+
+    async with database_read_pool.acquire() as database:
+        result = await database.execute(query, arguments)
+        rows = await result.fetchall()
+
+    items = []
+    for row in rows:
+        last_rank += 1
+        items.append({"rank": last_rank, "user": {"id": row[0], "name": row[2]}, "value": row[1]})
+
+    next_cursor = None
+    if len(items) == limit:
+        last_item = items[-1]
+        next_cursor = encode_cursor({"value": last_item["value"], "user_id": last_item["user"]["id"], "rank": last_item["rank"]})
+
+    return json_response({"items": items, "cursor": next_cursor})
+
+
+@router.get("/api/v2/users/{user_id}/stats/ranks")
+@api_cors
+@cache_control(60)
+async def get_stat_ranks_for_user(request: web.Request) -> web.StreamResponse:
+    database_read_pool = request.app[app_keys.DATABASE_READ_POOL]
+    rank_index = request.app[app_keys.RANK_INDEX]
+
+    user_id = request.match_info["user_id"]
+
+    if not rank_index.ready:
+        return json_response({"code": APIErrorCode.RANKS_UNAVAILABLE, "detail": "ranks are still being calculated, try again later"}, status=503)
+
+    async with database_read_pool.acquire() as database:
+        result = await database.execute("select code, value from stats where user_id = ?", [user_id])
+        rows = await result.fetchall()
+    if len(rows) == 0:
+        return json_response({"code": APIErrorCode.USER_NOT_FOUND, "detail": "user not found/not scraped yet"}, status=404)
+
+    stats = {}
+    for row in rows:
+        stat_rank = rank_index.get_rank(row[0], row[1])
+        if stat_rank is None:
+            # Not indexed, most likely due to the memory budget
+            continue
+        stats[row[0]] = {"value": row[1], "rank": stat_rank.rank, "percentile": stat_rank.percentile, "total": stat_rank.total}
+
+    return json_response({"stats": stats, "calculated_at": rank_index.last_rebuilt_at})
@@ -1,17 +1,28 @@
+import asyncio
 from pathlib import Path
 
 from aiohttp import web
 import yaml
 
+from .... import app_keys
+from ....utils.compression import PrecompressedBody
 from ....utils.cors import api_cors
+from ....utils.http_cache import cache_control
 
 router = web.RouteTableDef()
 
+_OPENAPI_PATH = Path(__file__).parent / "openapi.yaml"
+
+
+async def load_openapi(app: web.Application) -> None:
+    # Only changes on deploy, so it is read and compressed once at startup. In a thread, the best levels take a while
+    app[app_keys.OPENAPI_BODY] = await asyncio.to_thread(
+        PrecompressedBody, _OPENAPI_PATH.read_bytes(), "application/yaml"
+    )
+
+
 @router.get("/api/v2/openapi.yaml")
 @api_cors
+@cache_control(3600)
 async def get_openapi(request: web.Request) -> web.StreamResponse:
-    del request # Unused
-    current_directory = Path(__file__).parent
-
-    openapi_file = current_directory / "openapi.yaml"
-    return web.FileResponse(openapi_file)
+    return request.app[app_keys.OPENAPI_BODY].to_response(request)
@@ -6,18 +6,27 @@ import typing
 import asyncio
 
 from aiohttp import web
-from slowstack.asynchronous.times_per import TimesPerRateLimiter
+from pydantic import ValidationError
 
 from ....models.accelbyte import AccelByteStatCode
+from ....models.api import BatchUserIdsRequest
 from ....errors import APIErrorCode
 from .... import app_keys
-from ....enums import RequestPriority
+from ....enums import RequestPriority, SampleFill
 from ....utils.rate_limit import rate_limit_http
 from ....utils.cors import api_cors
+from ....utils.http_cache import cache_control
+from ....utils.sample_by import parse_fill, parse_resolution, sample_by_clause
+from ....utils.json_response import json_response
 
 router = web.RouteTableDef()
 _logger = getLogger(__name__)
 
+MAX_COLUMNAR_STAT_CODES: typing.Final[int] = 20
+MAX_COLUMNAR_LIMIT: typing.Final[int] = 1000
+# Users are re-scraped as soon as their score changes, so this is mostly users that haven't played in a while
+STALE_AFTER_SECONDS: typing.Final[float] = 24 * 60 * 60
+
 def format_user_stats(user_stats: dict[str, float]):
     weapons: dict[str, Any] = {
         "kanto": {
@@ -446,7 +455,10 @@ def format_user_stats(user_stats: dict[str, float]):
 
 @router.get("/api/v2/users/{user_id}/stats")
 @api_cors
-@rate_limit_http(lambda: TimesPerRateLimiter(5, 5))
+@cache_control(60)
+# Every request is a live AccelByte lookup. A fifth of the default bucket keeps the burst of 5 the old 5 per 5 seconds
+# limit allowed, instead of letting one ip spend the whole bucket on upstream requests
+@rate_limit_http(12)
 async def get_stats_for_user(request: web.Request) -> web.StreamResponse:
     vail_client = request.app[app_keys.ACCEL_BYTE_CLIENT]
 
@@ -456,36 +468,76 @@ async def get_stats_for_user(request: web.Request) -> web.StreamResponse:
         user_id, priority=RequestPriority.HIGH
     )
     if user_stats is None:
-        return web.json_response(
+        return json_response(
             {"detail": "user not found", "code": APIErrorCode.USER_NOT_FOUND},
             status=410,
         )
 
     # Generate stats
-    return web.json_response(format_user_stats(user_stats))
+    return json_response(format_user_stats(user_stats))
+
+@router.post("/api/v2/users/stats:batch")
+@api_cors
+@rate_limit_http(1)
+async def get_stats_for_users(request: web.Request) -> web.StreamResponse:
+    database_read_pool = request.app[app_keys.DATABASE_READ_POOL]
+
+    try:
+        body = BatchUserIdsRequest.model_validate_json(await request.read())
+    except ValidationError as error:
+        return json_response({"code": APIErrorCode.BODY_INVALID, "detail": f"failed to parse the request body: {error}"}, status=400)
+
+    # dict.fromkeys to dedupe while keeping the order the client asked for
+    user_ids = list(dict.fromkeys(body.ids))
+
+    placeholders = ", ".join("?" for _ in user_ids)
+    async with database_read_pool.acquire() as database:
+        result = await database.execute(f"select user_id, code, value, updated_at from stats where user_id in ({placeholders})", user_ids)
+        rows = await result.fetchall()
+
+    user_stats: dict[str, dict[str, float]] = {}
+    user_updated_at: dict[str, float] = {}
+    for row in rows:
+        user_stats.setdefault(row[0], {})[row[1]] = row[2]
+        user_updated_at[row[0]] = max(user_updated_at.get(row[0], 0), row[3])
+
+    now = time.time()
+    items = []
+    missing = []
+    for user_id in user_ids:
+        stats = user_stats.get(user_id)
+        if stats is None:
+            missing.append(user_id)
+            continue
+        updated_at = user_updated_at[user_id]
+        items.append({"id": user_id, "stats": format_user_stats(stats), "updated_at": updated_at, "stale": now - updated_at > STALE_AFTER_SECONDS})
+
+    return json_response({"items": items, "missing": missing})
 
 @router.get("/api/v2/users/{user_id}/stats/timeseries")
 @api_cors
+@cache_control(60)
 async def get_timeseries_stats_for_user(request: web.Request) -> web.StreamResponse:
-    database = request.app[app_keys.DATABASE]
+    database_read_pool = request.app[app_keys.DATABASE_READ_POOL]
     quest_db = request.app[app_keys.QUEST_DB_POSTGRES]
 
 
     user_id = request.match_info["user_id"]
 
     # Check if user exists
-    result = await database.execute("select count(*) from users where id = ?", [user_id])
-    row = await result.fetchone()
+    async with database_read_pool.acquire() as database:
+        result = await database.execute("select count(*) from users where id = ?", [user_id])
+        row = await result.fetchone()
     assert row is not None
     if row[0] == 0:
-        return web.json_response({"code": APIErrorCode.USER_NOT_FOUND, "detail": "user not found/not scraped yet."})
+        return json_response({"code": APIErrorCode.USER_NOT_FOUND, "detail": "user not found/not scraped yet."})
 
 
     raw_before_timestamp = request.query.getone("before", None)
     raw_after_timestamp = request.query.getone("after", None)
 
     if raw_before_timestamp is not None and raw_after_timestamp is not None:
-        return web.json_response({"code": APIErrorCode.MUTUALLY_EXCLUSIVE_QUERY_PARAMETERS, "detail": "you can only pass before or after, not both"}, status=400)
+        return json_response({"code": APIErrorCode.MUTUALLY_EXCLUSIVE_QUERY_PARAMETERS, "detail": "you can only pass before or after, not both"}, status=400)
     
     # Limit
     try:
@@ -493,26 +545,50 @@ async def get_timeseries_stats_for_user(request: web.Request) -> web.StreamRespo
     except KeyError:
         limit = 100
     except ValueError as error:
-        return web.json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the limit parameter: {error}", "field": "limit"}, status=400)
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the limit parameter: {error}", "field": "limit"}, status=400)
 
     if limit <= 0:
-        return web.json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must be more than 0", "field": "limit"}, status=400)
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must be more than 0", "field": "limit"}, status=400)
     if limit > 100:
-        return web.json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must not be more than 100", "field": "limit"}, status=400)
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must not be more than 100", "field": "limit"}, status=400)
+
+    # Downsampling
+    raw_resolution = request.query.getone("resolution", None)
+    raw_fill = request.query.getone("fill", None)
+
+    if raw_fill is not None and raw_resolution is None:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the fill parameter can only be used together with resolution", "field": "fill"}, status=400)
 
+    before_timestamp: datetime | None = None
+    after_timestamp: datetime | None = None
     if raw_before_timestamp is not None:
         try:
             before_timestamp = datetime.fromtimestamp(float(raw_before_timestamp))
         except ValueError as error:
-            return web.json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the before parameter: {error}", "field": "before"}, status=400)
-
-        rows = await quest_db.fetch("select timestamp from user_stats where user_id = $1 and code = $2 and timestamp < $3 order by timestamp desc limit $4", user_id, "game-seconds", before_timestamp, limit)
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the before parameter: {error}", "field": "before"}, status=400)
     elif raw_after_timestamp is not None:
         try:
             after_timestamp = datetime.fromtimestamp(float(raw_after_timestamp))
         except ValueError as error:
-            return web.json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the after parameter: {error}", "field": "before"}, status=400)
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the after parameter: {error}", "field": "before"}, status=400)
+
+    if raw_resolution is not None:
+        try:
+            resolution_amount, resolution_unit = parse_resolution(raw_resolution)
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the resolution parameter: {error}", "field": "resolution"}, status=400)
+        try:
+            # Stats are counters, so a bucket without any value would just be a document full of zeroes
+            fill = parse_fill(raw_fill or SampleFill.NONE, allowed=(SampleFill.NONE, SampleFill.PREV, SampleFill.LINEAR))
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the fill parameter: {error}", "field": "fill"}, status=400)
 
+        items = await get_sampled_stat_snapshots(request, user_id, resolution_amount, resolution_unit, fill, limit, before_timestamp=before_timestamp, after_timestamp=after_timestamp)
+        return json_response({"items": items})
+
+    if before_timestamp is not None:
+        rows = await quest_db.fetch("select timestamp from user_stats where user_id = $1 and code = $2 and timestamp < $3 order by timestamp desc limit $4", user_id, "game-seconds", before_timestamp, limit)
+    elif after_timestamp is not None:
         rows = await quest_db.fetch("select timestamp from user_stats where user_id = $1 and code = $2 and timestamp > $3 order by timestamp asc limit $4", user_id, "game-seconds", after_timestamp, limit)
         rows = reversed(rows)
     else:
@@ -522,7 +598,38 @@ async def get_timeseries_stats_for_user(request: web.Request) -> web.StreamRespo
 
     items = await asyncio.gather(*[get_stat_snapshot(request, user_id, timestamp) for timestamp in timestamps])
 
-    return web.json_response({"items": items})
+    return json_response({"items": items})
+
+async def get_sampled_stat_snapshots(request: web.Request, user_id: str, resolution_amount: int, resolution_unit: str, fill: SampleFill, limit: int, *, before_timestamp: datetime | None = None, after_timestamp: datetime | None = None) -> list[dict[str, Any]]:
+    quest_db = request.app[app_keys.QUEST_DB_POSTGRES]
+    sample_by = sample_by_clause(resolution_amount, resolution_unit, fill)
+
+    # Find the buckets to return. game-seconds is present in every snapshot, so it is used as the clock like the un-sampled query does
+    if before_timestamp is not None:
+        bucket_rows = await quest_db.fetch(f"select timestamp from (select timestamp, last(value) from user_stats where user_id = $1 and code = $2 and timestamp < $3 {sample_by}) order by timestamp desc limit $4", user_id, "game-seconds", before_timestamp, limit)
+    elif after_timestamp is not None:
+        bucket_rows = await quest_db.fetch(f"select timestamp from (select timestamp, last(value) from user_stats where user_id = $1 and code = $2 and timestamp > $3 {sample_by}) order by timestamp asc limit $4", user_id, "game-seconds", after_timestamp, limit)
+    else:
+        bucket_rows = await quest_db.fetch(f"select timestamp from (select timestamp, last(value) from user_stats where user_id = $1 and code = $2 {sample_by}) order by timestamp desc limit $3", user_id, "game-seconds", limit)
+
+    buckets: dict[datetime, dict[str, float]] = {row[0]: {} for row in bucket_rows}
+    if len(buckets) == 0:
+        return []
+
+    # Fetch every stat for the whole bucket range in one go instead of one query per snapshot
+    rows = await quest_db.fetch(f"select timestamp, code, last(value) from user_stats where user_id = $1 and timestamp >= $2 and timestamp < dateadd('{resolution_unit}', {resolution_amount}, $3) {sample_by}", user_id, min(buckets.keys()), max(buckets.keys()))
+    for row in rows:
+        stats = buckets.get(row[0])
+        if stats is None or row[2] is None:
+            continue
+        stats[row[1]] = row[2]
+
+    items = []
+    for timestamp in sorted(buckets.keys(), reverse=after_timestamp is None):
+        formatted = format_user_stats(buckets[timestamp])
+        formatted["timestamp"] = str(timestamp.timestamp())
+        items.append(formatted)
+    return items
 
 async def get_stat_snapshot(request: web.Request, user_id: str, timestamp: datetime):
     quest_db = request.app[app_keys.QUEST_DB_POSTGRES]
@@ -537,3 +644,112 @@ async def get_stat_snapshot(request: web.Request, user_id: str, timestamp: datet
     formatted = format_user_stats(stats)
     formatted["timestamp"] = str(timestamp.timestamp())
     return formatted
+
+@router.get("/api/v2/users/{user_id}/stats/timeseries/columns")
+@api_cors
+@cache_control(60)
+async def get_columnar_timeseries_stats_for_user(request: web.Request) -> web.StreamResponse:
+    database_read_pool = request.app[app_keys.DATABASE_READ_POOL]
+    quest_db = request.app[app_keys.QUEST_DB_POSTGRES]
+
+    user_id = request.match_info["user_id"]
+
+    # Stat codes
+    raw_stat_codes = request.query.getone("codes", None)
+    if raw_stat_codes is None:
+        return json_response({"code": APIErrorCode.MISSING_QUERY_PARAMETER, "detail": "missing param codes", "parameter": "codes"}, status=400)
+
+    # dict.fromkeys to dedupe while keeping the order the client asked for
+    stat_codes = list(dict.fromkeys(stat_code.strip() for stat_code in raw_stat_codes.split(",") if stat_code.strip() != ""))
+    if len(stat_codes) == 0:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the codes parameter must contain at least one stat code", "field": "codes"}, status=400)
+    if len(stat_codes) > MAX_COLUMNAR_STAT_CODES:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"the codes parameter must not contain more than {MAX_COLUMNAR_STAT_CODES} stat codes", "field": "codes"}, status=400)
+
+    # Check if user exists
+    async with database_read_pool.acquire() as database:
+        result = await database.execute("select count(*) from users where id = ?", [user_id])
+        row = await result.fetchone()
+    assert row is not None
+    if row[0] == 0:
+        return json_response({"code": APIErrorCode.USER_NOT_FOUND, "detail": "user not found/not scraped yet."}, status=404)
+
+    raw_before_timestamp = request.query.getone("before", None)
+    raw_after_timestamp = request.query.getone("after", None)
+
+    if raw_before_timestamp is not None and raw_after_timestamp is not None:
+        return json_response({"code": APIErrorCode.MUTUALLY_EXCLUSIVE_QUERY_PARAMETERS, "detail": "you can only pass before or after, not both"}, status=400)
+
+    # Limit
+    try:
+        limit = int(request.query.getone("limit"))
+    except KeyError:
+        limit = MAX_COLUMNAR_LIMIT
+    except ValueError as error:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the limit parameter: {error}", "field": "limit"}, status=400)
+
+    if limit <= 0:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the limit parameter must be more than 0", "field": "limit"}, status=400)
+    if limit > MAX_COLUMNAR_LIMIT:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"the limit parameter must not be more than {MAX_COLUMNAR_LIMIT}", "field": "limit"}, status=400)
+
+    # Downsampling
+    raw_resolution = request.query.getone("resolution", None)
+    raw_fill = request.query.getone("fill", None)
+
+    if raw_fill is not None and raw_resolution is None:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": "the fill parameter can only be used together with resolution", "field": "fill"}, status=400)
+
+    sample_by = ""
+    if raw_resolution is not None:
+        try:
+            resolution_amount, resolution_unit = parse_resolution(raw_resolution)
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the resolution parameter: {error}", "field": "resolution"}, status=400)
+        try:
+            fill = parse_fill(raw_fill or SampleFill.NONE)
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the fill parameter: {error}", "field": "fill"}, status=400)
+        sample_by = sample_by_clause(resolution_amount, resolution_unit, fill)
+
+    # $1 is the user id, followed by the stat codes
+    code_placeholders = ", ".join(f"${index + 2}" for index in range(len(stat_codes)))
+    timestamp_placeholder = f"${len(stat_codes) + 2}"
+    # Every snapshot has one row per stat code, so this is enough rows to cover the limit
+    row_limit = limit * len(stat_codes)
+
+    if raw_before_timestamp is not None:
+        try:
+            before_timestamp = datetime.fromtimestamp(float(raw_before_timestamp))
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the before parameter: {error}", "field": "before"}, status=400)
+
+        rows = await quest_db.fetch(f"select * from (select timestamp, code, {'last(value)' if sample_by else 'value'} from user_stats where user_id = $1 and code in ({code_placeholders}) and timestamp < {timestamp_placeholder} {sample_by}) order by timestamp desc limit {row_limit}", user_id, *stat_codes, before_timestamp)
+    elif raw_after_timestamp is not None:
+        try:
+            after_timestamp = datetime.fromtimestamp(float(raw_after_timestamp))
+        except ValueError as error:
+            return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the after parameter: {error}", "field": "after"}, status=400)
+
+        rows = await quest_db.fetch(f"select * from (select timestamp, code, {'last(value)' if sample_by else 'value'} from user_stats where user_id = $1 and code in ({code_placeholders}) and timestamp > {timestamp_placeholder} {sample_by}) order by timestamp asc limit {row_limit}", user_id, *stat_codes, after_timestamp)
+    else:
+        rows = await quest_db.fetch(f"select * from (select timestamp, code, {'last(value)' if sample_by else 'value'} from user_stats where user_id = $1 and code in ({code_placeholders}) {sample_by}) order by timestamp desc limit {row_limit}", user_id, *stat_codes)
+
+    # Pivot the rows into one column per stat code
+    timestamp_indexes: dict[datetime, int] = {}
+    values: dict[str, list[float | None]] = {stat_code: [] for stat_code in stat_codes}
+
+    for row in rows:
+        timestamp, stat_code, value = row[0], row[1], row[2]
+
+        index = timestamp_indexes.get(timestamp)
+        if index is None:
+            if len(timestamp_indexes) == limit:
+                break
+            index = len(timestamp_indexes)
+            timestamp_indexes[timestamp] = index
+            for column in values.values():
+                column.append(None)
+        values[stat_code][index] = value
+
+    return json_response({"timestamps": [str(timestamp.timestamp()) for timestamp in timestamp_indexes.keys()], "values": values})
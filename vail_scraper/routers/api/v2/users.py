@@ -1,20 +1,78 @@
-from aiohttp import web
+import asyncio
+from logging import getLogger
+import math
+import typing
 
+from aiohttp import ClientError, web
+from pydantic import ValidationError
+
+from ....models.api import MAX_BATCH_SIZE, BatchUserIdsRequest
 from ....models.meilisearch import SearchIndex
-from ....errors import APIErrorCode
+from ....errors import APIErrorCode, ExternalServiceError
 from .... import app_keys
 from ....utils.cors import api_cors
+from ....utils.http_cache import cache_control
+from ....utils.json_response import json_response
+from ....utils.rate_limit import check_rate_limit
 
 router = web.RouteTableDef()
+_logger = getLogger(__name__)
+
+SEARCH_LIMIT: typing.Final[int] = 20
+MAX_AUTOCOMPLETE_LIMIT: typing.Final[int] = 50
+# Batch lookups take a rate limit token per this many ids, so a full batch of 100 costs 10 like an export
+IDS_PER_RATE_LIMIT_TOKEN: typing.Final[int] = 10
+
+
+async def get_user_names(request: web.Request, user_ids: list[str]) -> dict[str, str]:
+    database_read_pool = request.app[app_keys.DATABASE_READ_POOL]
+    user_name_cache = request.app[app_keys.USER_NAME_CACHE]
+
+    user_names: dict[str, str] = {}
+    uncached_user_ids: list[str] = []
+    for user_id in user_ids:
+        name = user_name_cache.get(user_id)
+        if name is None:
+            uncached_user_ids.append(user_id)
+        else:
+            user_names[user_id] = name
+
+    if len(uncached_user_ids) != 0:
+        placeholders = ", ".join("?" for _ in uncached_user_ids)
+        async with database_read_pool.acquire() as database:
+            result = await database.execute(
+                f"select id, name from users where id in ({placeholders})",
+                uncached_user_ids,
+            )
+            rows = await result.fetchall()
+        for row in rows:
+            user_names[row["id"]] = row["name"]
+            user_name_cache.set(row["id"], row["name"])
+
+    return user_names
+
+
+def _user_names_response(user_ids: list[str], user_names: dict[str, str]) -> web.Response:
+    items = []
+    missing = []
+    for user_id in user_ids:
+        name = user_names.get(user_id)
+        if name is None:
+            missing.append(user_id)
+        else:
+            items.append({"id": user_id, "name": name})
+    return json_response({"items": items, "missing": missing})
 
 
 @router.get("/api/v2/users/search")
 @api_cors
+@cache_control(60)
 async def search_user(request: web.Request) -> web.StreamResponse:
     meilisearch = request.app[app_keys.MEILISEARCH]
+    user_name_index = request.app[app_keys.USER_NAME_INDEX]
 
     if "name" not in request.query:
-        return web.json_response(
+        return json_response(
             {
                 "detail": "missing param name",
                 "code": APIErrorCode.MISSING_QUERY_PARAMETER,
@@ -24,28 +82,129 @@ async def search_user(request: web.Request) -> web.StreamResponse:
 
     name = request.query["name"]
 
-    results = await meilisearch.search(SearchIndex.USERS, name)
+    try:
+        results = await meilisearch.search(SearchIndex.USERS, name)
+    except (ExternalServiceError, ClientError, asyncio.TimeoutError):
+        if not user_name_index.ready:
+            raise
+        _logger.warning("meilisearch search failed, falling back to the local index", exc_info=True)
+        return json_response({"items": user_name_index.search(name, SEARCH_LIMIT)})
 
     data = {"items": results.hits}
 
-    return web.json_response(data)
+    return json_response(data)
+
+
+@router.get("/api/v2/users/autocomplete")
+@api_cors
+@cache_control(60)
+async def autocomplete_user(request: web.Request) -> web.StreamResponse:
+    user_name_index = request.app[app_keys.USER_NAME_INDEX]
+
+    if "prefix" not in request.query:
+        return json_response(
+            {
+                "detail": "missing param prefix",
+                "code": APIErrorCode.MISSING_QUERY_PARAMETER,
+                "parameter": "prefix",
+            },
+            status=400,
+        )
+
+    try:
+        limit = int(request.query.getone("limit"))
+    except KeyError:
+        limit = 10
+    except ValueError as error:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"failed to parse the limit parameter: {error}", "field": "limit"}, status=400)
+
+    if limit <= 0 or limit > MAX_AUTOCOMPLETE_LIMIT:
+        return json_response({"code": APIErrorCode.QUERY_PARAMETER_INVALID, "detail": f"the limit parameter must be between 1 and {MAX_AUTOCOMPLETE_LIMIT}", "field": "limit"}, status=400)
+
+    if not user_name_index.ready:
+        return json_response({"code": APIErrorCode.SEARCH_UNAVAILABLE, "detail": "the search index is still being built, try again later"}, status=503)
+
+    return json_response({"items": user_name_index.prefix_search(request.query["prefix"], limit)})
+
+
+@router.get("/api/v2/users")
+@api_cors
+@cache_control(300)
+async def get_users(request: web.Request) -> web.StreamResponse:
+    if "ids" not in request.query:
+        return json_response(
+            {
+                "detail": "missing param ids",
+                "code": APIErrorCode.MISSING_QUERY_PARAMETER,
+                "parameter": "ids",
+            },
+            status=400,
+        )
+
+    # Both ?ids=a,b and ?ids=a&ids=b work. dict.fromkeys to dedupe while keeping the order the client asked for
+    user_ids = list(
+        dict.fromkeys(
+            user_id.strip()
+            for raw_user_ids in request.query.getall("ids")
+            for user_id in raw_user_ids.split(",")
+            if user_id.strip() != ""
+        )
+    )
+    if len(user_ids) == 0 or len(user_ids) > MAX_BATCH_SIZE:
+        return json_response(
+            {
+                "detail": f"the ids parameter must contain between 1 and {MAX_BATCH_SIZE} ids",
+                "code": APIErrorCode.QUERY_PARAMETER_INVALID,
+                "field": "ids",
+            },
+            status=400,
+        )
+
+    rate_limited_response = check_rate_limit(request, math.ceil(len(user_ids) / IDS_PER_RATE_LIMIT_TOKEN))
+    if rate_limited_response is not None:
+        return rate_limited_response
+
+    user_names = await get_user_names(request, user_ids)
+    return _user_names_response(user_ids, user_names)
+
+
+@router.post("/api/v2/users:batch")
+@api_cors
+async def get_users_batch(request: web.Request) -> web.StreamResponse:
+    try:
+        body = BatchUserIdsRequest.model_validate_json(await request.read())
+    except ValidationError as error:
+        return json_response(
+            {
+                "detail": f"failed to parse the request body: {error}",
+                "code": APIErrorCode.BODY_INVALID,
+            },
+            status=400,
+        )
+
+    user_ids = list(dict.fromkeys(body.ids))
+    rate_limited_response = check_rate_limit(request, math.ceil(len(user_ids) / IDS_PER_RATE_LIMIT_TOKEN))
+    if rate_limited_response is not None:
+        return rate_limited_response
+
+    user_names = await get_user_names(request, user_ids)
+    return _user_names_response(user_ids, user_names)
 
 
 @router.get("/api/v2/users/{id}")
 @api_cors
+@cache_control(300)
 async def get_user(request: web.Request) -> web.StreamResponse:
-    database = request.app[app_keys.DATABASE]
+    user_id = request.match_info["id"]
 
-    result = await database.execute(
-        "select name from users where id = ? limit 1", [request.match_info["id"]]
-    )
-    row = await result.fetchone()
-    if row is None:
-        return web.json_response(
+    user_names = await get_user_names(request, [user_id])
+    name = user_names.get(user_id)
+    if name is None:
+        return json_response(
             {
                 "detail": "user not found/not scraped yet",
                 "code": APIErrorCode.USER_NOT_FOUND,
             },
             status=404,
         )
-    return web.json_response({"id": request.match_info["id"], "name": row["name"]})
+    return json_response({"id": user_id, "name": name})
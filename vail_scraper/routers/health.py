@@ -0,0 +1,34 @@
+import os
+
+import aiosqlite
+from aiohttp import web
+
+from ..utils.json_response import json_response
+from .. import app_keys
+
+router = web.RouteTableDef()
+
+
+@router.get("/health")
+async def get_health(request: web.Request) -> web.StreamResponse:
+    # For the supervisor and load balancers: answering at all means the event loop isn't stuck.
+    # Not ready while the indexes this process serves from are still building, so restarted workers don't take traffic early
+    config = request.app[app_keys.CONFIG]
+    database_read_pool = request.app[app_keys.DATABASE_READ_POOL]
+    headers = {"Cache-Control": "no-store"}
+
+    try:
+        async with database_read_pool.acquire() as database:
+            await database.execute("select 1")
+    except aiosqlite.Error as error:
+        return json_response({"status": "unhealthy", "pid": os.getpid(), "detail": f"the database can't be read: {error}"}, status=503, headers=headers)
+
+    building = []
+    if config.name_index.enabled and not request.app[app_keys.USER_NAME_INDEX].ready:
+        building.append("name_index")
+    if config.rank_index.enabled and not request.app[app_keys.RANK_INDEX].ready:
+        building.append("rank_index")
+    if len(building) != 0:
+        return json_response({"status": "starting", "pid": os.getpid(), "building": building}, status=503, headers=headers)
+
+    return json_response({"status": "ok", "pid": os.getpid()}, headers=headers)
@@ -0,0 +1,130 @@
+from aiohttp import web
+
+from ..enums import RequestPriority
+from ..client.base import BaseService
+from ..utils.metrics import PrometheusWriter
+from .. import app_keys
+
+router = web.RouteTableDef()
+
+
+def _priority_name(priority: int) -> str:
+    try:
+        return RequestPriority(priority).name.lower()
+    except ValueError:
+        return str(priority)
+
+
+def _write_api_metrics(writer: PrometheusWriter, app: web.Application) -> None:
+    request_metrics = app[app_keys.REQUEST_METRICS]
+    rate_limit_store = app[app_keys.RATE_LIMIT_STORE]
+
+    writer.family("vail_api_request_duration_seconds", "histogram", "Time spent handling API requests, by route")
+    for (method, route), histogram in request_metrics.durations.items():
+        writer.histogram("vail_api_request_duration_seconds", histogram, {"method": method, "route": route})
+    writer.family("vail_api_responses_total", "counter", "API responses sent, by route and status")
+    for (method, route, status), count in request_metrics.responses.items():
+        writer.sample("vail_api_responses_total", count, {"method": method, "route": route, "status": status})
+
+    writer.family("vail_api_rate_limit_clients", "gauge", "Clients the API rate limiter is tracking")
+    writer.sample("vail_api_rate_limit_clients", len(rate_limit_store))
+    writer.family("vail_api_rate_limit_early_evictions_total", "counter", "Clients forgotten by the API rate limiter while still limited")
+    writer.sample("vail_api_rate_limit_early_evictions_total", rate_limit_store.early_evictions)
+
+
+def _write_scraper_metrics(writer: PrometheusWriter, app: web.Application) -> None:
+    scraper = app[app_keys.SCRAPER]
+    services: dict[str, BaseService] = {
+        "accelbyte": app[app_keys.ACCEL_BYTE_CLIENT],
+        "epic_games": app[app_keys.EPIC_GAMES_CLIENT],
+    }
+
+    writer.family("vail_scraper_leaderboard_pass_duration_seconds", "histogram", "Time taken to walk the whole leaderboard once")
+    writer.histogram("vail_scraper_leaderboard_pass_duration_seconds", scraper.leaderboard_pass_duration)
+    writer.family("vail_scraper_leaderboard_pages_total", "counter", "Leaderboard pages fetched")
+    writer.sample("vail_scraper_leaderboard_pages_total", scraper.leaderboard_pages_fetched)
+    writer.family("vail_scraper_leaderboard_page_failures_total", "counter", "Leaderboard pages that failed to be fetched")
+    writer.sample("vail_scraper_leaderboard_page_failures_total", scraper.leaderboard_page_failures)
+    writer.family("vail_scraper_update_queue_depth", "gauge", "Users waiting to be updated")
+    writer.sample("vail_scraper_update_queue_depth", scraper.pending_updates)
+    writer.family("vail_scraper_users_updated_total", "counter", "Users whose stats were updated")
+    writer.sample("vail_scraper_users_updated_total", scraper.users_updated)
+    writer.family("vail_scraper_user_update_failures_total", "counter", "User updates that failed to fetch from upstream")
+    writer.sample("vail_scraper_user_update_failures_total", scraper.user_update_failures)
+
+    writer.family("vail_upstream_rate_limiter_wait_seconds", "histogram", "Time upstream requests waited for the rate limiter, by priority")
+    for service_name, service in services.items():
+        for priority, histogram in service.rate_limiter_wait.items():
+            writer.histogram("vail_upstream_rate_limiter_wait_seconds", histogram, {"service": service_name, "priority": _priority_name(priority)})
+    writer.family("vail_upstream_circuit_breaker_tripped", "gauge", "1 if the circuit breaker is refusing requests")
+    for service_name, service in services.items():
+        writer.sample("vail_upstream_circuit_breaker_tripped", int(service.circuit_breaker.tripped), {"service": service_name})
+    writer.family("vail_upstream_circuit_breaker_errors_total", "counter", "Errors counted by the circuit breaker")
+    for service_name, service in services.items():
+        writer.sample("vail_upstream_circuit_breaker_errors_total", service.circuit_breaker.errors, {"service": service_name})
+
+
+def _write_database_metrics(writer: PrometheusWriter, app: web.Application) -> None:
+    database = app[app_keys.DATABASE]
+    database_read_pool = app[app_keys.DATABASE_READ_POOL]
+    database_lock = app[app_keys.DATABASE_LOCK]
+    quest_db = app[app_keys.QUEST_DB]
+    meilisearch = app[app_keys.MEILISEARCH]
+    rank_index = app[app_keys.RANK_INDEX]
+
+    writer.family("vail_sqlite_query_duration_seconds", "histogram", "Time sqlite took to execute a statement, by connection")
+    writer.histogram("vail_sqlite_query_duration_seconds", database.query_duration, {"connection": "writer"})
+    if database_read_pool.query_duration is not database.query_duration:
+        writer.histogram("vail_sqlite_query_duration_seconds", database_read_pool.query_duration, {"connection": "read_pool"})
+    writer.family("vail_sqlite_read_pool_wait_seconds_total", "counter", "Time spent waiting for a read pool connection")
+    writer.sample("vail_sqlite_read_pool_wait_seconds_total", database_read_pool.wait_seconds)
+    writer.family("vail_sqlite_read_pool_idle_connections", "gauge", "Read pool connections not in use")
+    writer.sample("vail_sqlite_read_pool_idle_connections", database_read_pool.idle)
+
+    writer.family("vail_database_lock_wait_seconds", "histogram", "Time spent waiting for the database lock, by call site")
+    for site, stats in database_lock.stats.items():
+        writer.histogram("vail_database_lock_wait_seconds", stats.wait, {"site": site})
+    writer.family("vail_database_lock_hold_seconds", "histogram", "Time the database lock was held, by call site")
+    for site, stats in database_lock.stats.items():
+        writer.histogram("vail_database_lock_hold_seconds", stats.hold, {"site": site})
+    writer.family("vail_database_lock_timeouts_total", "counter", "Times waiting for the database lock timed out, by call site")
+    for site, stats in database_lock.stats.items():
+        writer.sample("vail_database_lock_timeouts_total", stats.timeouts, {"site": site})
+
+    writer.family("vail_questdb_query_duration_seconds", "histogram", "Time QuestDB took to answer a query over postgres")
+    writer.histogram("vail_questdb_query_duration_seconds", quest_db.query_duration)
+    writer.family("vail_questdb_query_errors_total", "counter", "QuestDB queries that failed")
+    writer.sample("vail_questdb_query_errors_total", quest_db.query_errors)
+    writer.family("vail_questdb_ingest_duration_seconds", "histogram", "Time QuestDB took to accept an ingest")
+    writer.histogram("vail_questdb_ingest_duration_seconds", quest_db.ingest_duration)
+
+    writer.family("vail_meilisearch_request_duration_seconds", "histogram", "Time Meilisearch took to answer, by operation")
+    writer.histogram("vail_meilisearch_request_duration_seconds", meilisearch.search_duration, {"operation": "search"})
+    writer.histogram("vail_meilisearch_request_duration_seconds", meilisearch.ingest_duration, {"operation": "ingest"})
+    writer.family("vail_meilisearch_documents_indexed_total", "counter", "Documents Meilisearch finished indexing")
+    writer.sample("vail_meilisearch_documents_indexed_total", meilisearch.documents_indexed)
+    writer.family("vail_meilisearch_pending_tasks", "gauge", "Indexing tasks Meilisearch hasn't finished yet")
+    writer.sample("vail_meilisearch_pending_tasks", meilisearch.pending_tasks)
+    writer.family("vail_meilisearch_failed_tasks_total", "counter", "Indexing tasks that failed")
+    writer.sample("vail_meilisearch_failed_tasks_total", meilisearch.failed_tasks)
+
+    writer.family("vail_rank_index_memory_bytes", "gauge", "Memory used by the rank index")
+    writer.sample("vail_rank_index_memory_bytes", rank_index.memory_usage)
+
+
+@router.get("/metrics")
+async def get_metrics(request: web.Request) -> web.StreamResponse:
+    config = request.app[app_keys.CONFIG]
+    if not config.metrics.enabled:
+        raise web.HTTPNotFound()
+
+    writer = PrometheusWriter()
+    _write_api_metrics(writer, request.app)
+    # API worker processes don't run the scraper, the scraper process has its own /metrics
+    if app_keys.SCRAPER in request.app:
+        _write_scraper_metrics(writer, request.app)
+    _write_database_metrics(writer, request.app)
+    return web.Response(
+        body=writer.render(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8", "Cache-Control": "no-store"},
+    )
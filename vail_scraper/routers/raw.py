@@ -1,8 +1,10 @@
 from aiohttp import web
-from slowstack.asynchronous.times_per import TimesPerRateLimiter
 
+from ..errors import APIErrorCode
 from ..utils.cors import api_cors
+from ..utils.http_cache import cache_control
 from ..utils.rate_limit import rate_limit_http
+from ..utils.json_response import json_response
 from .. import app_keys
 
 router = web.RouteTableDef()
@@ -10,15 +12,20 @@ router = web.RouteTableDef()
 
 @router.get("/db.sqlite")
 @api_cors
-@rate_limit_http(lambda: TimesPerRateLimiter(6, 60))
+@cache_control(300)
+@rate_limit_http(10)
 async def download_db(request: web.Request) -> web.StreamResponse:
     config = request.app[app_keys.CONFIG]
-    database_lock = request.app[app_keys.DATABASE_LOCK]
+    snapshotter = request.app[app_keys.DATABASE_SNAPSHOTTER]
 
-    if config.database.sqlite.url != ":memory:":
-        async with database_lock.exclusive():
-            response = web.FileResponse(config.database.sqlite.url)
-            await response.prepare(request)
-            return response
+    if config.database.sqlite.url == ":memory:":
+        return json_response({"detail": "in-memory db cannot be shared"}, status=500)
 
-    return web.json_response({"detail": "in-memory db cannot be shared"}, status=500)
+    if not snapshotter.ready:
+        return json_response({"code": APIErrorCode.SNAPSHOT_UNAVAILABLE, "detail": "the database snapshot is still being made, try again later"}, status=503)
+
+    # FileResponse handles ETag/Last-Modified, Range requests and serving the pre-compressed snapshot
+    response = web.FileResponse(snapshotter.path)
+    response.content_type = "application/vnd.sqlite3"
+    response.headers["Content-Disposition"] = 'attachment; filename="db.sqlite"'
+    return response
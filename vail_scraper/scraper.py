@@ -16,23 +16,35 @@ from .models.accelbyte import AccelBytePlayerInfo, AccelByteStatCode
 from .client.accelbyte import AccelByteClient
 from .client.epic_games import EpicGamesClient
 from .utils.circuit_breaker import CircuitBreaker
-from .utils.exclusive_lock import ExclusiveLock
+from .utils.rw_lock import ReadWriteLock
+from .utils.lru_cache import LRUCache
+from .utils.histogram import Histogram
 from .config import ScraperConfig
-from .errors import ExternalServiceError
+from .errors import ExternalServiceError, LockTimeoutError
 from .database.meilisearch import MeiliSearch
+from .database.rank_index import StatRankIndex
+from .database.name_index import UserNameIndex
 
 _logger = getLogger(__name__)
 
+# Seconds the updater waits for the database lock before giving up on a user for now
+DATABASE_LOCK_TIMEOUT: typing.Final[float] = 60
+# Seconds, a pass over the whole leaderboard takes somewhere between minutes and hours
+LEADERBOARD_PASS_BUCKETS: typing.Final[tuple[float, ...]] = (60, 300, 600, 1800, 3600, 7200, 14400, 28800)
+
 
 class VailScraper:
     def __init__(
         self,
         database: aiosqlite.Connection,
-        database_lock: ExclusiveLock,
+        database_lock: ReadWriteLock,
         quest_db: QuestDBWrapper,
         accel_byte_client: AccelByteClient,
         epic_games_client: EpicGamesClient,
         meilisearch: MeiliSearch,
+        rank_index: StatRankIndex,
+        user_name_cache: LRUCache[str, str],
+        user_name_index: UserNameIndex,
         config: ScraperConfig,
     ) -> None:
         self._rate_limiter: TimesPerRateLimiter = TimesPerRateLimiter(
@@ -40,17 +52,31 @@ class VailScraper:
         )
         self.circuit_breaker: CircuitBreaker = CircuitBreaker(5, 10)
         self._database: aiosqlite.Connection = database
-        self._database_lock: ExclusiveLock = database_lock
+        self._database_lock: ReadWriteLock = database_lock
         self._quest_db: QuestDBWrapper = quest_db
         self._accel_byte_client: AccelByteClient = accel_byte_client
         self._epic_games_client: EpicGamesClient = epic_games_client
         self._config: ScraperConfig = config
         self._meilisearch: MeiliSearch = meilisearch
+        self._rank_index: StatRankIndex = rank_index
+        self._user_name_cache: LRUCache[str, str] = user_name_cache
+        self._user_name_index: UserNameIndex = user_name_index
         self._discord_client: HTTPClient = HTTPClient()
 
         # Accel fast
         self._user_ids_pending_scrape: UniqueQueue[str] = UniqueQueue()
 
+        # Stats
+        self.leaderboard_pass_duration: Histogram = Histogram(LEADERBOARD_PASS_BUCKETS)
+        self.leaderboard_pages_fetched: int = 0
+        self.leaderboard_page_failures: int = 0
+        self.users_updated: int = 0
+        self.user_update_failures: int = 0
+
+    @property
+    def pending_updates(self) -> int:
+        return len(self._user_ids_pending_scrape)
+
     async def run(self) -> None:
         await self._discord_client.setup()
 
@@ -82,10 +108,14 @@ class VailScraper:
                 })
             raise
 
+    async def close(self) -> None:
+        await self._discord_client.close()
+
     async def _fast_scrape_accelbyte_discoverer(self) -> None:
         page_id = 0
         spotted_user_ids: list[str] = []
         total_outdated_user_ids: list[str] = []
+        pass_started_at = time.perf_counter()
         while True:
             # Check if we need to fetch more items
             if len(self._user_ids_pending_scrape) > 50:
@@ -96,11 +126,13 @@ class VailScraper:
                 leaderboard_page = await self._accel_byte_client.get_leaderboard_page(AccelByteStatCode.SCORE, page_id=page_id)
             except ExternalServiceError:
                 _logger.error("failed to get leaderboard page %s, skipping for now", page_id, exc_info=True)
+                self.leaderboard_page_failures += 1
                 page_id += 1
                 continue
 
             if len(leaderboard_page) == 0:
                 _logger.debug("finished checking @ page %s", page_id)
+                self.leaderboard_pass_duration.observe(time.perf_counter() - pass_started_at)
                 started_post_scrape = time.time()
 
                 # Find users not spotted (aka moved up ranking while we checked)
@@ -139,12 +171,26 @@ class VailScraper:
                 row = await result.fetchone()
                 assert row is not None
                 await self._quest_db.ingest("user_count", [{"count": row[0]}])
+
+                # Report game wide stats
+                result = await self._database.execute("select code, total, users from game_stats")
+                await self._quest_db.ingest("game_stats", [{"code": row[0], "total": row[1], "users": row[2]} for row in await result.fetchall()])
                 
                 finished_post_scrape = time.time()
                 _logger.debug("used %s seconds to do post-scrape", finished_post_scrape - started_post_scrape)
+                pass_started_at = time.perf_counter()
+                _logger.debug(
+                    "meilisearch: %s/%s documents indexed (%s bytes sent), %s tasks pending, %s failed",
+                    self._meilisearch.documents_indexed,
+                    self._meilisearch.documents_sent,
+                    self._meilisearch.bytes_sent,
+                    self._meilisearch.pending_tasks,
+                    self._meilisearch.failed_tasks,
+                )
 
                 continue
 
+            self.leaderboard_pages_fetched += 1
             user_id_to_score: dict[str, int] = {user.user_id:user.point for user in leaderboard_page}
             outdated_users: list[str] = []
             
@@ -192,6 +238,7 @@ class VailScraper:
                     user_id,
                     exc_info=True,
                 )
+                self.user_update_failures += 1
                 continue
             if user_info is None:
                 _logger.warn("user %s magically disappeared. Leaving it incase accelbyte did an oopsie", user_id)
@@ -204,47 +251,97 @@ class VailScraper:
                     user_id,
                     exc_info=True,
                 )
+                self.user_update_failures += 1
                 continue
             assert user_stats is not None
 
-            scraped_at = time.time()
-
             await self._quest_db.ingest_user_stats(
                 user_id, user_stats
             )
-            async with self._database_lock.shared():
-                await self._database.execute(
-                    "insert or replace into users (id, name) values (?, ?)",
-                    [user_id, user_info.display_name],
-                )
-                await self._database.executemany(
-                    "insert or replace into stats (code, user_id, value, updated_at) values (?, ?, ?, ?)",
-                    [
-                        (stat_code, user_id, value, scraped_at)
-                        for stat_code, value in user_stats.items()
-                    ],
-                )
-
-                # Removed stat codes
-                result = await self._database.execute(
-                    "select code from stats where user_id = ?",
-                    [user_id],
-                )
-                removed_stat_codes = []
-                for row in await result.fetchall():
-                    stat_code = row[0]
-                    if stat_code not in user_stats.keys():
-                        removed_stat_codes.append(stat_code)
-
-                await self._database.executemany(
-                    "delete from stats where user_id = ? and code = ?",
-                    [
-                        (user_id, removed_stat_code)
-                        for removed_stat_code in removed_stat_codes
-                    ],
-                )
+            try:
+                async with self._database_lock.shared("scraper.updater", DATABASE_LOCK_TIMEOUT):
+                    # Taken right before writing, so /api/v2/changes never sees a row committed long after its updated_at
+                    scraped_at = time.time()
+
+                    result = await self._database.execute(
+                        "select code, value from stats where user_id = ?",
+                        [user_id],
+                    )
+                    old_user_stats: dict[str, float] = {
+                        row[0]: row[1] for row in await result.fetchall()
+                    }
+
+                    await self._database.execute(
+                        "insert or replace into users (id, name, updated_at) values (?, ?, ?)",
+                        [user_id, user_info.display_name, scraped_at],
+                    )
+                    await self._database.executemany(
+                        "insert or replace into stats (code, user_id, value, updated_at) values (?, ?, ?, ?)",
+                        [
+                            (stat_code, user_id, value, scraped_at)
+                            for stat_code, value in user_stats.items()
+                        ],
+                    )
+
+                    # Removed stat codes
+                    removed_stat_codes = [
+                        stat_code
+                        for stat_code in old_user_stats.keys()
+                        if stat_code not in user_stats.keys()
+                    ]
+
+                    await self._database.executemany(
+                        "delete from stats where user_id = ? and code = ?",
+                        [
+                            (user_id, removed_stat_code)
+                            for removed_stat_code in removed_stat_codes
+                        ],
+                    )
+                    await self._database.executemany(
+                        "insert or replace into deleted_stats (code, user_id, deleted_at) values (?, ?, ?)",
+                        [
+                            (removed_stat_code, user_id, scraped_at)
+                            for removed_stat_code in removed_stat_codes
+                        ],
+                    )
+
+                    # Game wide totals
+                    game_stat_changes: list[tuple[str, float, int, float]] = []
+                    for stat_code in old_user_stats.keys() | user_stats.keys():
+                        old_value = old_user_stats.get(stat_code)
+                        new_value = user_stats.get(stat_code)
+                        if old_value == new_value:
+                            continue
+                        game_stat_changes.append(
+                            (
+                                stat_code,
+                                (new_value or 0) - (old_value or 0),
+                                (new_value is not None) - (old_value is not None),
+                                scraped_at,
+                            )
+                        )
+
+                    await self._database.executemany(
+                        """
+                        insert into game_stats (code, total, users, updated_at) values (?, ?, ?, ?)
+                        on conflict (code) do update set
+                            total = total + excluded.total,
+                            users = users + excluded.users,
+                            updated_at = excluded.updated_at
+                        """,
+                        game_stat_changes,
+                    )
+
+                    await self._database.commit()
+            except LockTimeoutError:
+                _logger.warning("timed out waiting for the database lock, retrying user %s later", user_id)
+                self._user_ids_pending_scrape.add(user_id)
+                continue
 
-                await self._database.commit()
+            self.users_updated += 1
+            self._rank_index.update(old_user_stats, user_stats)
+            self._user_name_cache.set(user_id, user_info.display_name)
+            self._user_name_index.upsert(user_id, user_info.display_name)
 
 
     async def _retry_get_player_info(self, user_id: str) -> AccelBytePlayerInfo | None:
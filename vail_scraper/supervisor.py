@@ -0,0 +1,234 @@
+import asyncio
+import contextlib
+from logging import getLogger
+import os
+import signal
+import sys
+import time
+import typing
+
+import aiohttp
+
+from .config import WorkersConfig
+
+_logger = getLogger(__name__)
+
+# Longest wait between restarts of a worker that keeps crashing
+_MAX_RESTART_DELAY: typing.Final[float] = 60
+# Time a worker gets to exit after its shutdown timeout, before it is killed
+_KILL_GRACE: typing.Final[float] = 5
+# Time between health checks while waiting for a new worker to come up
+_STARTUP_POLL_INTERVAL: typing.Final[float] = 0.5
+
+
+def _remove_socket(path: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+class WorkerProcess:
+    # A `python -m vail_scraper --role ...` child. Besides the shared port it listens on its own unix socket,
+    # which is how the supervisor health checks this process in particular
+    def __init__(self, name: str, role: typing.Literal["api", "scraper"], socket_path: str) -> None:
+        self.name: typing.Final[str] = name
+        self.role: typing.Final[typing.Literal["api", "scraper"]] = role
+        self.socket_path: typing.Final[str] = socket_path
+        self.process: asyncio.subprocess.Process | None = None
+        self.started_at: float = 0
+        # Set once it passed a health check, until then failed checks are it still starting up
+        self.healthy_once: bool = False
+        # When to start it again after it exited, None if it hasn't been noticed yet
+        self.restart_at: float | None = None
+
+        # Stats
+        self.restarts: int = 0
+        # Consecutive, reset by a passed health check
+        self.failed_health_checks: int = 0
+        self.crashes: int = 0
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self) -> None:
+        if self.process is not None:
+            self.restarts += 1
+        _remove_socket(self.socket_path)
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "vail_scraper", "--role", self.role, "--name", self.name, "--socket", self.socket_path
+        )
+        self.started_at = time.monotonic()
+        self.healthy_once = False
+        self.restart_at = None
+        self.failed_health_checks = 0
+        _logger.info("started %s (pid %s)", self.name, self.process.pid)
+
+    async def check_health(self, timeout: float) -> bool:
+        if not self.running or not os.path.exists(self.socket_path):
+            return False
+        assert self.process is not None
+
+        try:
+            async with aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(self.socket_path), timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as session:
+                async with session.get("http://worker/health") as response:
+                    if response.status != 200:
+                        return False
+                    data = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return False
+        # A socket left behind by a previous process could still be answering
+        return data.get("pid") == self.process.pid
+
+    async def wait_healthy(self, timeout: float, check_timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.running:
+            if await self.check_health(check_timeout):
+                self.healthy_once = True
+                return True
+            await asyncio.sleep(_STARTUP_POLL_INTERVAL)
+        return False
+
+    async def stop(self, timeout: float) -> None:
+        # SIGTERM makes aiohttp stop accepting and finish the requests it is handling, whatever is left after that is killed
+        if self.running:
+            assert self.process is not None
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout + _KILL_GRACE)
+            except asyncio.TimeoutError:
+                _logger.warning("%s didn't stop within %ss, killing it", self.name, timeout + _KILL_GRACE)
+                self.process.kill()
+                await self.process.wait()
+        _remove_socket(self.socket_path)
+
+
+class Supervisor:
+    # Runs api_workers API processes that share the port with SO_REUSEPORT, and exactly one scraper process.
+    # Workers that exit or fail their health checks are restarted, with a backoff for ones that keep crashing.
+    # SIGHUP restarts every worker: API workers one at a time with the new one up before the old one stops, so the
+    # API stays up throughout. The scraper is stopped before its replacement starts, there is never more than one.
+    # SIGTERM and SIGINT stop everything, letting the API workers finish the requests they are handling
+    def __init__(self, config: WorkersConfig) -> None:
+        self._config: typing.Final[WorkersConfig] = config
+        # Every worker gets its own socket, so an old and a new API worker can run side by side during a restart
+        self._generation: int = 0
+        self._scraper: WorkerProcess = self._new_worker("scraper", "scraper")
+        self._api_workers: list[WorkerProcess] = [self._new_worker(f"api-{index}", "api") for index in range(config.api_workers)]
+
+    def _new_worker(self, name: str, role: typing.Literal["api", "scraper"]) -> WorkerProcess:
+        self._generation += 1
+        return WorkerProcess(name, role, os.path.join(self._config.socket_directory, f"{name}.{self._generation}.sock"))
+
+    @property
+    def workers(self) -> list[WorkerProcess]:
+        return [self._scraper, *self._api_workers]
+
+    async def run(self) -> None:
+        os.makedirs(self._config.socket_directory, exist_ok=True)
+        stop_requested = asyncio.Event()
+        restart_requested = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, stop_requested.set)
+        loop.add_signal_handler(signal.SIGINT, stop_requested.set)
+        loop.add_signal_handler(signal.SIGHUP, restart_requested.set)
+
+        try:
+            # The scraper process does the migrations, so the API workers wait for it to be up
+            await self._scraper.start()
+            if not await self._wait_healthy(self._scraper, stop_requested):
+                if stop_requested.is_set():
+                    return
+                raise RuntimeError("the scraper process didn't come up, not starting the API workers")
+            for worker in self._api_workers:
+                await worker.start()
+            _logger.info("started %s API workers and the scraper", len(self._api_workers))
+
+            while not stop_requested.is_set():
+                if restart_requested.is_set():
+                    restart_requested.clear()
+                    await self._rolling_restart(stop_requested)
+                await asyncio.gather(*(self._check_worker(worker) for worker in self.workers))
+                # Signals are acted on right away instead of after the next health check interval
+                signalled = [asyncio.ensure_future(stop_requested.wait()), asyncio.ensure_future(restart_requested.wait())]
+                await asyncio.wait(signalled, timeout=self._config.health_check_interval, return_when=asyncio.FIRST_COMPLETED)
+                for future in signalled:
+                    future.cancel()
+        finally:
+            _logger.info("stopping all workers")
+            await asyncio.gather(*(worker.stop(self._config.shutdown_timeout) for worker in self.workers))
+
+    async def _wait_healthy(self, worker: WorkerProcess, stop_requested: asyncio.Event) -> bool:
+        # Gives up as soon as a stop is requested, so SIGTERM isn't held up by a worker that is slow to start
+        waiting = asyncio.ensure_future(worker.wait_healthy(self._config.startup_timeout, self._config.health_check_timeout))
+        stopping = asyncio.ensure_future(stop_requested.wait())
+        await asyncio.wait([waiting, stopping], return_when=asyncio.FIRST_COMPLETED)
+        stopping.cancel()
+        if not waiting.done():
+            waiting.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await waiting
+            return False
+        return waiting.result()
+
+    async def _check_worker(self, worker: WorkerProcess) -> None:
+        now = time.monotonic()
+        if not worker.running:
+            if worker.restart_at is None:
+                assert worker.process is not None
+                worker.crashes += 1
+                delay = min(2 ** (worker.crashes - 1), _MAX_RESTART_DELAY)
+                _logger.error("%s exited with %s, restarting it in %ss", worker.name, worker.process.returncode, delay)
+                worker.restart_at = now + delay
+            if now >= worker.restart_at:
+                await worker.start()
+            return
+
+        if await worker.check_health(self._config.health_check_timeout):
+            if not worker.healthy_once:
+                _logger.info("%s is up after %.1fs", worker.name, now - worker.started_at)
+            worker.healthy_once = True
+            worker.failed_health_checks = 0
+            worker.crashes = 0
+            return
+
+        if not worker.healthy_once:
+            if now - worker.started_at < self._config.startup_timeout:
+                return
+            _logger.error("%s didn't come up within %ss, restarting it", worker.name, self._config.startup_timeout)
+        else:
+            worker.failed_health_checks += 1
+            _logger.warning("%s failed %s health checks in a row", worker.name, worker.failed_health_checks)
+            if worker.failed_health_checks < self._config.unhealthy_after:
+                return
+            _logger.error("%s is unhealthy, restarting it", worker.name)
+        await worker.stop(self._config.shutdown_timeout)
+        await worker.start()
+
+    async def _rolling_restart(self, stop_requested: asyncio.Event) -> None:
+        _logger.info("restarting the workers")
+        for index, old_worker in enumerate(self._api_workers):
+            if stop_requested.is_set():
+                return
+            new_worker = self._new_worker(old_worker.name, "api")
+            await new_worker.start()
+            if not await self._wait_healthy(new_worker, stop_requested):
+                if not stop_requested.is_set():
+                    _logger.error("the new %s didn't come up, keeping the old workers", new_worker.name)
+                # Not in _api_workers yet, so stopping everything wouldn't stop it
+                await new_worker.stop(self._config.shutdown_timeout)
+                return
+            self._api_workers[index] = new_worker
+            await old_worker.stop(self._config.shutdown_timeout)
+
+        if stop_requested.is_set():
+            return
+        await self._scraper.stop(self._config.shutdown_timeout)
+        await self._scraper.start()
+        if not await self._wait_healthy(self._scraper, stop_requested):
+            if not stop_requested.is_set():
+                # Still checked every health_check_interval, and restarted once startup_timeout runs out
+                _logger.error("the scraper didn't come up after the restart")
+            return
+        _logger.info("restarted all workers")
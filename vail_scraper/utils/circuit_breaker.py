@@ -10,6 +10,10 @@ class CircuitBreaker:
         self.tripped: bool = False
         self._current_errors: int = 0
 
+        # Stats
+        self.errors: int = 0
+        self.trips: int = 0
+
     def __enter__(self) -> None:
         if self.tripped:
             raise CicuitTrippedError()
@@ -25,8 +29,10 @@ class CircuitBreaker:
                 event_loop = asyncio.get_running_loop()
                 event_loop.call_later(self.per, self._reset)
             self._current_errors += 1
+            self.errors += 1
             if self._current_errors == self.max_errors:
                 self.tripped = True
+                self.trips += 1
 
             raise exc
 
@@ -0,0 +1,118 @@
+import asyncio
+import gzip
+import typing
+import zlib
+
+from aiohttp import hdrs, web
+from aiohttp.helpers import ETag
+
+from .http_cache import weak_etag
+
+try:
+    import brotli  # type: ignore[import-not-found]
+except ImportError:
+    brotli = None
+
+# Below this the headers are about as big as what compression would save
+MIN_COMPRESS_SIZE: typing.Final[int] = 1024
+# Bodies bigger than this are compressed in a thread, so a big timeseries response doesn't stall every other request
+THREAD_COMPRESS_SIZE: typing.Final[int] = 64 * 1024
+_COMPRESSIBLE_CONTENT_TYPES: typing.Final[frozenset[str]] = frozenset(
+    ("application/json", "application/x-ndjson", "application/yaml", "text/yaml", "text/plain", "text/html")
+)
+
+
+# In order of preference. brotli is optional, install it to get br
+SUPPORTED_ENCODINGS: typing.Final[tuple[str, ...]] = ("br", "gzip", "deflate") if brotli is not None else ("gzip", "deflate")
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    # Picks our most preferred encoding out of the ones the client accepts (q > 0)
+    accepted: set[str] = set()
+    rejected: set[str] = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, parameters = part.partition(";")
+        name = name.strip()
+        quality = 1.0
+        parameter_name, _, parameter_value = parameters.partition("=")
+        if parameter_name.strip() == "q":
+            try:
+                quality = float(parameter_value)
+            except ValueError:
+                continue
+        (accepted if quality > 0 else rejected).add(name)
+
+    for encoding in SUPPORTED_ENCODINGS:
+        if encoding in accepted or ("*" in accepted and encoding not in rejected):
+            return encoding
+    return None
+
+
+def add_vary(response: web.StreamResponse, header: str) -> None:
+    # Adds to what a handler already put in Vary instead of replacing it
+    existing = response.headers.get(hdrs.VARY)
+    if existing is None:
+        response.headers[hdrs.VARY] = header
+    elif header.lower() not in (value.strip().lower() for value in existing.split(",")):
+        response.headers[hdrs.VARY] = f"{existing}, {header}"
+
+
+def compress(body: bytes, encoding: str, *, best: bool = False) -> bytes:
+    # best is for bodies that are compressed once and served many times, otherwise the levels favour speed
+    if encoding == "br":
+        assert brotli is not None
+        return brotli.compress(body, quality=11 if best else 4)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9 if best else 5, mtime=0)
+    if encoding == "deflate":
+        return zlib.compress(body, 9 if best else 5)
+    raise ValueError(f"unsupported encoding {encoding}")
+
+
+class PrecompressedBody:
+    # A static body compressed once up front in every supported encoding
+    def __init__(self, body: bytes, content_type: str) -> None:
+        self.content_type: str = content_type
+        # Same for every encoding, so it is taken from the uncompressed body
+        self.etag: ETag = weak_etag(body)
+        self.bodies: dict[str | None, bytes] = {None: body}
+        for encoding in SUPPORTED_ENCODINGS:
+            self.bodies[encoding] = compress(body, encoding, best=True)
+
+    def to_response(self, request: web.Request) -> web.Response:
+        encoding = negotiate_encoding(request.headers.get(hdrs.ACCEPT_ENCODING, ""))
+        response = web.Response(body=self.bodies[encoding], content_type=self.content_type)
+        response.etag = self.etag
+        add_vary(response, hdrs.ACCEPT_ENCODING)
+        if encoding is not None:
+            response.headers[hdrs.CONTENT_ENCODING] = encoding
+        return response
+
+
+@web.middleware
+async def compression_middleware(
+    request: web.Request,
+    handler: typing.Callable[[web.Request], typing.Awaitable[web.StreamResponse]],
+) -> web.StreamResponse:
+    response = await handler(request)
+
+    # Streamed responses compress themselves, see prepare_ndjson_response
+    if not isinstance(response, web.Response) or hdrs.CONTENT_ENCODING in response.headers:
+        return response
+    body = response.body
+    if not isinstance(body, bytes) or len(body) < MIN_COMPRESS_SIZE or response.content_type not in _COMPRESSIBLE_CONTENT_TYPES:
+        return response
+
+    add_vary(response, hdrs.ACCEPT_ENCODING)
+    encoding = negotiate_encoding(request.headers.get(hdrs.ACCEPT_ENCODING, ""))
+    if encoding is None:
+        return response
+
+    if len(body) >= THREAD_COMPRESS_SIZE:
+        compressed_body = await asyncio.get_running_loop().run_in_executor(None, compress, body, encoding)
+    else:
+        compressed_body = compress(body, encoding)
+
+    response.body = compressed_body
+    response.headers[hdrs.CONTENT_ENCODING] = encoding
+    return response
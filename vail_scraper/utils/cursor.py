@@ -0,0 +1,21 @@
+import base64
+import json
+import typing
+
+
+# Cursors are opaque to clients, they should only ever pass back what we gave them
+def encode_cursor(data: dict[str, typing.Any]) -> str:
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict[str, typing.Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except ValueError:
+        raise ValueError("malformed cursor") from None
+
+    if not isinstance(data, dict):
+        raise ValueError("malformed cursor")
+    return data
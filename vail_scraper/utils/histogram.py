@@ -0,0 +1,19 @@
+from bisect import bisect_left
+from typing import Final
+
+# Seconds, from a millisecond up to a minute
+DEFAULT_BUCKETS: Final[tuple[float, ...]] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets: Final[tuple[float, ...]] = buckets
+        # One count per bucket (values <= the bucket), plus one at the end for everything above the last bucket
+        self.counts: list[int] = [0] * (len(buckets) + 1)
+        self.sum: float = 0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
@@ -0,0 +1,78 @@
+from functools import wraps
+import hashlib
+import typing
+
+from aiohttp import hdrs, web
+from aiohttp.helpers import ETAG_ANY, ETag
+
+# Headers a 304 has to leave out, everything else is sent like it would have been on the 200
+_NOT_MODIFIED_EXCLUDED_HEADERS: typing.Final[frozenset[str]] = frozenset((hdrs.CONTENT_TYPE.lower(), hdrs.CONTENT_LENGTH.lower()))
+
+
+def weak_etag(body: bytes) -> ETag:
+    # Weak since the same content can be sent with different compression
+    return ETag(value=hashlib.blake2b(body, digest_size=16).hexdigest(), is_weak=True)
+
+
+def cache_control(max_age: int):
+    # How long clients and CDNs may reuse a successful response without asking again
+    def decorator(function: typing.Callable[[web.Request], typing.Awaitable[web.StreamResponse]]):
+        @wraps(function)
+        async def wrapper(request: web.Request) -> web.StreamResponse:
+            response = await function(request)
+            if response.status < 400 and hdrs.CACHE_CONTROL not in response.headers:
+                response.headers[hdrs.CACHE_CONTROL] = f"public, max-age={max_age}"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _is_not_modified(request: web.Request, response: web.Response) -> bool:
+    # If-None-Match wins over If-Modified-Since when both are sent
+    if_none_match = request.if_none_match
+    if if_none_match is not None:
+        etag = response.etag
+        return etag is not None and any(
+            client_etag.value == ETAG_ANY or client_etag.value == etag.value
+            for client_etag in if_none_match
+        )
+
+    if_modified_since = request.if_modified_since
+    last_modified = response.last_modified
+    if if_modified_since is not None and last_modified is not None:
+        return last_modified <= if_modified_since
+    return False
+
+
+@web.middleware
+async def conditional_request_middleware(
+    request: web.Request,
+    handler: typing.Callable[[web.Request], typing.Awaitable[web.StreamResponse]],
+) -> web.StreamResponse:
+    response = await handler(request)
+
+    # Streamed responses (exports, files) are left alone, FileResponse already handles this itself
+    if request.method not in (hdrs.METH_GET, hdrs.METH_HEAD) or response.status != 200 or not isinstance(response, web.Response):
+        return response
+    body = response.body
+    if not isinstance(body, bytes):
+        return response
+
+    if response.etag is None:
+        response.etag = weak_etag(body)
+    if hdrs.CACHE_CONTROL not in response.headers:
+        # Can still be stored, but has to be checked with us first. That is a cheap 304 if nothing changed
+        response.headers[hdrs.CACHE_CONTROL] = "no-cache"
+
+    if not _is_not_modified(request, response):
+        return response
+    return web.Response(
+        status=304,
+        headers={
+            name: value
+            for name, value in response.headers.items()
+            if name.lower() not in _NOT_MODIFIED_EXCLUDED_HEADERS
+        },
+    )
@@ -0,0 +1,40 @@
+import json
+import typing
+
+from aiohttp import web
+from aiohttp.helpers import ETag
+
+from .http_cache import weak_etag
+
+try:
+    import orjson  # type: ignore[import-not-found]
+except ImportError:
+    orjson = None
+
+
+def dumps(data: typing.Any) -> bytes:
+    # orjson is optional, install it for a much faster encoder that writes bytes directly
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Only the stdlib encoder handles some things, like integers over 64 bits
+            pass
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+# Use this instead of web.json_response so every route goes through the fast encoder
+def json_response(data: typing.Any, *, status: int = 200, headers: dict[str, str] | None = None) -> web.Response:
+    return web.Response(body=dumps(data), status=status, headers=headers, content_type="application/json", charset="utf-8")
+
+
+class EncodedJSON:
+    # A payload that is encoded once and then sent as is, for responses that are served many times between changes
+    def __init__(self, data: typing.Any) -> None:
+        self.body: bytes = dumps(data)
+        self.etag: ETag = weak_etag(self.body)
+
+    def to_response(self, *, status: int = 200, headers: dict[str, str] | None = None) -> web.Response:
+        response = web.Response(body=self.body, status=status, headers=headers, content_type="application/json", charset="utf-8")
+        response.etag = self.etag
+        return response
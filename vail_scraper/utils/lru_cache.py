@@ -0,0 +1,29 @@
+from collections import OrderedDict
+from typing import Generic, TypeVar
+
+KeyT = TypeVar("KeyT")
+ValueT = TypeVar("ValueT")
+
+class LRUCache(Generic[KeyT, ValueT]):
+    def __init__(self, max_size: int) -> None:
+        self.max_size: int = max_size
+        self._items: OrderedDict[KeyT, ValueT] = OrderedDict()
+
+    def get(self, key: KeyT) -> ValueT | None:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def set(self, key: KeyT, value: ValueT) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def __contains__(self, key: KeyT) -> bool:
+        # Doesn't count as a use
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,89 @@
+import time
+import typing
+
+from aiohttp import web
+
+from .histogram import Histogram
+
+
+class RequestMetrics:
+    def __init__(self) -> None:
+        # (method, route) -> latency
+        self.durations: dict[tuple[str, str], Histogram] = {}
+        # (method, route, status) -> responses
+        self.responses: dict[tuple[str, str, int], int] = {}
+
+    def observe(self, method: str, route: str, status: int, duration: float) -> None:
+        histogram = self.durations.get((method, route))
+        if histogram is None:
+            histogram = self.durations[(method, route)] = Histogram()
+        histogram.observe(duration)
+
+        key = (method, route, status)
+        self.responses[key] = self.responses.get(key, 0) + 1
+
+
+def get_route(request: web.Request) -> str:
+    # The route template instead of the path, so /api/v2/users/{user_id} is one series instead of one per user
+    route = request.match_info.route
+    if route.resource is None:
+        return "unmatched"
+    return route.resource.canonical
+
+
+def request_metrics_middleware(request_metrics: RequestMetrics):
+    @web.middleware
+    async def middleware(
+        request: web.Request,
+        handler: typing.Callable[[web.Request], typing.Awaitable[web.StreamResponse]],
+    ) -> web.StreamResponse:
+        started_at = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as error:
+            status = error.status
+            raise
+        finally:
+            request_metrics.observe(request.method, get_route(request), status, time.perf_counter() - started_at)
+
+    return middleware
+
+
+def _escape_label_value(value: typing.Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, typing.Any]) -> str:
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+class PrometheusWriter:
+    # Prometheus text exposition format. Call family first, then add every sample of that family
+    def __init__(self) -> None:
+        self._lines: list[str] = []
+
+    def family(self, name: str, metric_type: typing.Literal["counter", "gauge", "histogram"], description: str) -> None:
+        self._lines.append(f"# HELP {name} {description}")
+        self._lines.append(f"# TYPE {name} {metric_type}")
+
+    def sample(self, name: str, value: float, labels: dict[str, typing.Any] | None = None) -> None:
+        self._lines.append(f"{name}{_format_labels(labels or {})} {value}")
+
+    def histogram(self, name: str, histogram: Histogram, labels: dict[str, typing.Any] | None = None) -> None:
+        labels = labels or {}
+        # Histogram keeps per bucket counts, prometheus wants them cumulative
+        cumulative = 0
+        for bucket, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            self.sample(f"{name}_bucket", cumulative, {**labels, "le": bucket})
+        self.sample(f"{name}_bucket", histogram.count, {**labels, "le": "+Inf"})
+        self.sample(f"{name}_sum", histogram.sum, labels)
+        self.sample(f"{name}_count", histogram.count, labels)
+
+    def render(self) -> bytes:
+        return ("\n".join(self._lines) + "\n").encode()
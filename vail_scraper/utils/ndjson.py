@@ -0,0 +1,42 @@
+import typing
+
+from aiohttp.web import Request, StreamResponse
+
+from .json_response import dumps
+
+_FLUSH_SIZE: typing.Final[int] = 64 * 1024
+
+
+async def prepare_ndjson_response(request: Request) -> StreamResponse:
+    response = StreamResponse()
+    response.content_type = "application/x-ndjson"
+    # api_cors can't add headers to an already prepared response
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    # gzip/deflate if the client accepts it, compressed chunk by chunk as it is written
+    response.enable_compression()
+    await response.prepare(request)
+    return response
+
+
+class NDJSONWriter:
+    def __init__(self, response: StreamResponse) -> None:
+        self._response: StreamResponse = response
+        self._buffer: bytearray = bytearray()
+
+    async def write(self, item: typing.Any) -> None:
+        self._buffer += dumps(item)
+        self._buffer += b"\n"
+
+        # Writing waits for the client to drain, so memory stays bounded by the flush size
+        if len(self._buffer) >= _FLUSH_SIZE:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if len(self._buffer) == 0:
+            return
+        await self._response.write(bytes(self._buffer))
+        self._buffer.clear()
+
+    async def close(self) -> None:
+        await self.flush()
+        await self._response.write_eof()
@@ -1,32 +1,35 @@
+import math
 from typing import Any, Callable
-from aiohttp.web import Request, json_response
-from collections import defaultdict
-from slowstack.asynchronous.times_per import BaseRateLimiter
+from aiohttp.web import Request, Response
 from functools import wraps
 
-from slowstack.common.errors import RateLimitedError
-
+from vail_scraper import app_keys
 from vail_scraper.errors import APIErrorCode
+from vail_scraper.utils.json_response import EncodedJSON
+
+_RATE_LIMITED_BODY = EncodedJSON({"detail": "rate limited", "code": APIErrorCode.RATE_LIMITED})
+
+
+# For handlers whose cost depends on the request, so they can only charge it once the request is parsed.
+# Returns the 429 response to send if the client is rate limited
+def check_rate_limit(request: Request, cost: float) -> Response | None:
+    rate_limit_store = request.app[app_keys.RATE_LIMIT_STORE]
+    ip = request.remote or "127.0.0.1"
 
+    retry_after = rate_limit_store.acquire(ip, cost)
+    if retry_after != 0:
+        return _RATE_LIMITED_BODY.to_response(status=429, headers={"Retry-After": str(math.ceil(retry_after))})
+    return None
 
-def rate_limit_http(constructor: Callable[[], BaseRateLimiter]):
-    rate_limiters: defaultdict[str, BaseRateLimiter] = defaultdict(constructor)
 
+def rate_limit_http(cost: float):
     def wrapper(original_handler: Callable[[Request], Any]) -> Callable[[Request], Any]:
         @wraps(original_handler)
         async def handler(request: Request):
-            ip = request.remote or "127.0.0.1"
-
-            rate_limiter = rate_limiters[ip]
-
-            try:
-                async with rate_limiter.acquire(wait=False):
-                    return await original_handler(request)
-            except RateLimitedError:
-                return json_response(
-                    {"detail": "rate limited", "code": APIErrorCode.RATE_LIMITED},
-                    status=429,
-                )
+            rate_limited_response = check_rate_limit(request, cost)
+            if rate_limited_response is not None:
+                return rate_limited_response
+            return await original_handler(request)
 
         return handler
 
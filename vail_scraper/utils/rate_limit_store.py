@@ -0,0 +1,53 @@
+from collections import OrderedDict
+import time
+from typing import Final
+
+
+class RateLimitStore:
+    # One token bucket per client shared by every route, routes just take a different amount of tokens.
+    # Stored as the time the client's bucket will be full again (GCRA), so a client is a single float,
+    # and clients whose bucket is already full again don't need to be remembered at all.
+    # At most max_keys clients are kept, dropping the least recently seen ones first.
+    def __init__(self, capacity: float, refill_rate: float, max_keys: int) -> None:
+        self.capacity: Final[float] = capacity
+        self.refill_rate: Final[float] = refill_rate
+        self.max_keys: Final[int] = max_keys
+        self._full_at: OrderedDict[str, float] = OrderedDict()
+
+        # Stats
+        self.evictions: int = 0
+        # Clients that were forgotten while still limited, means max_keys is too low
+        self.early_evictions: int = 0
+
+    # Takes cost tokens from key's bucket. Returns 0 on success, otherwise how many seconds until it would succeed
+    def acquire(self, key: str, cost: float) -> float:
+        now = time.monotonic()
+        # A cost over the capacity could never be paid, it takes the whole bucket instead.
+        # Only happens when the capacity is split between API worker processes
+        cost = min(cost, self.capacity)
+        full_at = max(self._full_at.get(key, now), now)
+        new_full_at = full_at + cost / self.refill_rate
+
+        # How many seconds of refilling the bucket is missing after this
+        retry_after = new_full_at - now - self.capacity / self.refill_rate
+        if retry_after > 0:
+            return retry_after
+
+        self._full_at[key] = new_full_at
+        self._full_at.move_to_end(key)
+        self._evict(now)
+        return 0
+
+    def _evict(self, now: float) -> None:
+        # Least recently seen first, which are usually the ones that are full again anyway
+        while len(self._full_at) != 0:
+            key, full_at = next(iter(self._full_at.items()))
+            if full_at > now:
+                if len(self._full_at) <= self.max_keys:
+                    return
+                self.early_evictions += 1
+            del self._full_at[key]
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._full_at)
@@ -0,0 +1,97 @@
+from contextvars import ContextVar
+from logging import getLogger
+import time
+import typing
+
+from aiohttp import hdrs, web
+
+from .metrics import get_route
+
+_slow_query_logger = getLogger("vail_scraper.slow_queries")
+
+# Longest parameter repr and most parameters/rows put in the slow query log, so a big executemany doesn't flood it
+_MAX_LOGGED_PARAMETER_LENGTH: typing.Final[int] = 200
+_MAX_LOGGED_PARAMETERS: typing.Final[int] = 20
+
+
+class RequestTiming:
+    # Time spent per backend while handling one request
+    def __init__(self, route: str) -> None:
+        self.route: str = route
+        self.durations: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+
+    def add(self, backend: str, duration: float) -> None:
+        self.durations[backend] = self.durations.get(backend, 0) + duration
+        self.calls[backend] = self.calls.get(backend, 0) + 1
+
+    def to_server_timing(self, total: float) -> str:
+        metrics = [
+            f'{backend};dur={duration * 1000:.2f};desc="{self.calls[backend]} calls"'
+            for backend, duration in self.durations.items()
+        ]
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+_current_timing: ContextVar[RequestTiming | None] = ContextVar("request_timing", default=None)
+
+
+def record_span(backend: str, duration: float) -> None:
+    # Does nothing outside of a request, so the scraper can go through the same instrumented code
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.add(backend, duration)
+
+
+def _format_parameters(parameters: typing.Any) -> str:
+    if parameters is None:
+        return "[]"
+    if not isinstance(parameters, (list, tuple)):
+        # Iterators are used up by the time the query finished
+        return f"<{type(parameters).__name__}>"
+
+    formatted = []
+    for parameter in parameters[:_MAX_LOGGED_PARAMETERS]:
+        parameter_repr = repr(parameter)
+        if len(parameter_repr) > _MAX_LOGGED_PARAMETER_LENGTH:
+            parameter_repr = parameter_repr[:_MAX_LOGGED_PARAMETER_LENGTH] + "..."
+        formatted.append(parameter_repr)
+    if len(parameters) > _MAX_LOGGED_PARAMETERS:
+        formatted.append(f"... {len(parameters) - _MAX_LOGGED_PARAMETERS} more")
+    return "[" + ", ".join(formatted) + "]"
+
+
+def record_query(backend: str, duration: float, query: str, parameters: typing.Any, slow_query_threshold: float | None) -> None:
+    record_span(backend, duration)
+    if slow_query_threshold is None or duration < slow_query_threshold:
+        return
+
+    timing = _current_timing.get()
+    _slow_query_logger.warning(
+        "%s query took %.3fs (%s): %s parameters=%s",
+        backend,
+        duration,
+        "outside of a request" if timing is None else timing.route,
+        " ".join(query.split()),
+        _format_parameters(parameters),
+    )
+
+
+@web.middleware
+async def request_timing_middleware(
+    request: web.Request,
+    handler: typing.Callable[[web.Request], typing.Awaitable[web.StreamResponse]],
+) -> web.StreamResponse:
+    timing = RequestTiming(f"{request.method} {get_route(request)}")
+    token = _current_timing.set(timing)
+    started_at = time.perf_counter()
+    try:
+        response = await handler(request)
+    finally:
+        _current_timing.reset(token)
+
+    # Streamed responses have already sent their headers
+    if not response.prepared:
+        response.headers[hdrs.SERVER_TIMING] = timing.to_server_timing(time.perf_counter() - started_at)
+    return response
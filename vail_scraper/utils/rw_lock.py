@@ -0,0 +1,106 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import time
+from typing import AsyncGenerator
+
+from ..errors import LockTimeoutError
+from .histogram import Histogram
+
+
+class LockSiteStats:
+    def __init__(self) -> None:
+        self.wait: Histogram = Histogram()
+        self.hold: Histogram = Histogram()
+        self.timeouts: int = 0
+
+
+class ReadWriteLock:
+    # Waiters are served in the order they arrived, and new readers queue up behind a waiting writer instead of joining the current readers.
+    # That way a steady stream of readers can't starve writers. Consecutive readers at the front of the queue are let in together
+    def __init__(self) -> None:
+        self._readers: int = 0
+        self._writing: bool = False
+        self._waiters: deque[tuple[bool, asyncio.Future[None]]] = deque()
+        # Call site -> stats
+        self.stats: dict[str, LockSiteStats] = {}
+
+    @asynccontextmanager
+    async def shared(self, site: str, timeout: float | None = None) -> AsyncGenerator[None, None]:
+        async with self._acquire(site, False, timeout):
+            yield
+
+    @asynccontextmanager
+    async def exclusive(self, site: str, timeout: float | None = None) -> AsyncGenerator[None, None]:
+        async with self._acquire(site, True, timeout):
+            yield
+
+    @asynccontextmanager
+    async def _acquire(self, site: str, exclusive: bool, timeout: float | None) -> AsyncGenerator[None, None]:
+        stats = self.stats.get(site)
+        if stats is None:
+            stats = self.stats[site] = LockSiteStats()
+
+        started_at = time.perf_counter()
+        if len(self._waiters) == 0 and self._is_free(exclusive):
+            self._take(exclusive)
+        else:
+            future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            self._waiters.append((exclusive, future))
+            try:
+                await asyncio.wait_for(future, timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as error:
+                if future.done() and not future.cancelled():
+                    # Got the lock right as the wait was given up on
+                    self._release(exclusive)
+                else:
+                    future.cancel()
+                    # A writer that gave up at the front might have been holding back readers behind it
+                    self._wake_waiters()
+
+                if isinstance(error, asyncio.TimeoutError):
+                    stats.timeouts += 1
+                    raise LockTimeoutError(site, timeout or 0) from None
+                raise
+
+        acquired_at = time.perf_counter()
+        stats.wait.observe(acquired_at - started_at)
+        try:
+            yield
+        finally:
+            stats.hold.observe(time.perf_counter() - acquired_at)
+            self._release(exclusive)
+
+    def _is_free(self, exclusive: bool) -> bool:
+        if exclusive:
+            return not self._writing and self._readers == 0
+        return not self._writing
+
+    def _take(self, exclusive: bool) -> None:
+        if exclusive:
+            self._writing = True
+        else:
+            self._readers += 1
+
+    def _release(self, exclusive: bool) -> None:
+        if exclusive:
+            self._writing = False
+        else:
+            self._readers -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while len(self._waiters) != 0:
+            exclusive, future = self._waiters[0]
+            if future.done():
+                # Timed out or cancelled
+                self._waiters.popleft()
+                continue
+            if not self._is_free(exclusive):
+                return
+
+            self._waiters.popleft()
+            self._take(exclusive)
+            future.set_result(None)
+            if exclusive:
+                return
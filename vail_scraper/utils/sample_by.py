@@ -0,0 +1,33 @@
+import re
+
+from ..enums import SampleFill
+
+_RESOLUTION_PATTERN: re.Pattern[str] = re.compile(r"^([1-9][0-9]{0,3})([smhdwMy])$")
+
+
+# QuestDB style SAMPLE BY intervals (15m, 1h, 1d, 1w, ...). These get formatted into queries, so keep the pattern strict!
+def parse_resolution(raw_resolution: str) -> tuple[int, str]:
+    match = _RESOLUTION_PATTERN.match(raw_resolution)
+    if match is None:
+        raise ValueError(
+            "expected a number followed by one of s, m, h, d, w, M or y (for example 1d)"
+        )
+    return int(match.group(1)), match.group(2)
+
+
+def parse_fill(raw_fill: str, allowed: tuple[SampleFill, ...] = tuple(SampleFill)) -> SampleFill:
+    try:
+        fill = SampleFill(raw_fill)
+    except ValueError:
+        fill = None
+
+    if fill is None or fill not in allowed:
+        raise ValueError(f"expected one of {', '.join(allowed)}")
+    return fill
+
+
+def sample_by_clause(amount: int, unit: str, fill: SampleFill) -> str:
+    clause = f"sample by {amount}{unit}"
+    if fill != SampleFill.NONE:
+        clause += f" fill({fill})"
+    return clause + " align to calendar"